@@ -1,2 +1,29 @@
 name = 'pansys'
-from .interactive import Ansys
+
+# The classes are imported when they are first used, so that importing a
+# light module like pansys.client does not import pandas and pexpect.
+_EXPORTS = {
+    "Ansys": "interactive",
+    "ResultFile": "results",
+    "AnsysPool": "pool",
+    "AsyncAnsys": "asynchronous",
+    "AnsysBatch": "batch",
+    "Scheduler": "scheduler",
+    "AnsysClient": "client",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(attr):
+    if attr not in _EXPORTS:
+        raise AttributeError("module 'pansys' has no attribute {!r}"
+                             .format(attr))
+    from importlib import import_module
+    value = getattr(import_module("." + _EXPORTS[attr], __name__), attr)
+    globals()[attr] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
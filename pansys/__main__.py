@@ -0,0 +1,44 @@
+"""
+Command line of pansys
+
+    $ pansys serve --size 2 --startcommand ansys150
+
+Run ``pansys serve --help`` for all the options.
+
+"""
+import argparse
+import logging
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pansys",
+                                     description="Work with Ansys through "
+                                                 "python")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    serve = commands.add_parser(
+        "serve", help="Keep ansys sessions running for pansys.AnsysClient")
+    serve.add_argument("--socket", help="Path of the Unix socket. Default is "
+                       "$PANSYS_SOCKET or a file in the temporary folder.")
+    serve.add_argument("--size", type=int, default=1,
+                       help="Number of ansys sessions. Default is 1.")
+    serve.add_argument("--startcommand", help="Ansys start command")
+    serve.add_argument("--startfolder",
+                       help="Folder in which ansys is started. Only for a "
+                       "single session. Default is a new folder for each "
+                       "session, which is deleted at the end.")
+    serve.add_argument("--host", help="System on which ansys is started")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "serve":
+        # Sessions in the same folder would overwrite each other's files
+        if args.startfolder is not None and args.size > 1:
+            serve.error("--startfolder can not be used with --size above 1")
+        from .server import serve
+        serve(args.socket, args.size, startcommand=args.startcommand,
+              startfolder=args.startfolder, host=args.host,
+              cleanup=args.startfolder is None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Asynchronous ansys sessions
+
+Ansys session which can be used from :mod:`asyncio`. A single event loop can
+drive many sessions at the same time, for example solving in one session
+while post processing in another, without a thread per session.
+
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from functools import partial
+from uuid import uuid4
+
+import pexpect
+
+from .interactive import (_DEFAULTS, _EXPECT_LIST, _PROMPT_LIST, _QUESTION,
+                          _OutputBuffer, _Scanner, _compile_output_regex,
+                          _get_command, _parse_list, _remote_folder,
+                          _removing, _spawn, _start_command, _working_folder)
+from .remote import connection
+from .utility_functions import return_value
+
+
+class AsyncAnsys(object):
+    """Ansys session for asyncio
+
+    Asynchronous version of :class:`pansys.Ansys`. The commands are sent and
+    the output is read in the same way, but the methods are coroutines which
+    give control back to the event loop while ansys is working.
+
+        >>> async def main():
+        ...     ans = await AsyncAnsys.create()
+        ...     await ans.send("/prep7")
+        ...     await ans.send("n,1,0,0,0")
+        ...     print(await ans.get("node", "", "count"))
+        ...     await ans.exit()
+        ...
+        >>> asyncio.run(main())
+
+    Many sessions can be run at the same time with :func:`asyncio.gather`:
+
+        >>> async def main():
+        ...     a, b = await asyncio.gather(AsyncAnsys.create(),
+        ...                                 AsyncAnsys.create())
+        ...     await asyncio.gather(a.send("solve"), b.get_list("nlist"))
+
+    The session can also be used as an asynchronous context manager, which
+    exits ansys at the end of the block.
+
+        >>> async with await AsyncAnsys.create() as ans:
+        ...     await ans.send("/prep7")
+
+    Commands of a session are run one after the other. Coroutines which use
+    the same session at the same time wait for their turn.
+
+    .. note::
+        Creating the object starts the ansys process but does not wait for
+        it. Use :meth:`create`, or await :meth:`start` before sending any
+        command.
+
+    Args:
+        startcommand (str): Ansys start command. See :class:`pansys.Ansys`
+        startfolder (str): The folder in which ansys is started. See
+            :class:`pansys.Ansys`
+        cleanup (bool): If true will delete the ansys working directory after
+            the ansys has exited.
+        host (str): The system in which you want to start the Ansys session.
+            See :class:`pansys.Ansys`
+        ssh (str): Optional. The ssh command used to connect to ``host``.
+
+    """
+    def __init__(self, startcommand=None, startfolder=None,
+                 cleanup=False, host=None, ssh=None):
+        self._startcommand = _start_command(startcommand)
+        self.cleanup = cleanup
+        self.silent = True
+        self.messages = deque(maxlen=1000)
+        self.capture = "full"
+        self.capture_limit = 65536
+        self._buffer = _OutputBuffer()
+        self.expect_list = list(_EXPECT_LIST)
+        self.prompt_list = list(_PROMPT_LIST)
+        self._lock = asyncio.Lock()
+        self._started = False
+        self._wd, created = _working_folder(startfolder)
+        if not created:
+            self.cleanup = False
+        self._remote = None
+        self._shared = True
+        if host is not None:
+            self._remote = connection(host, ssh)
+            self._shared = _remote_folder(self._remote, self._wd)
+        self.process = _spawn(self._startcommand, self._wd, self._remote)
+        # A blank command is sent since ansys asks to press <CR> in the
+        # beginning of an interactive session
+        self.process.sendline()
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """Start an ansys session and wait till it is ready
+
+        Args:
+            *args: Arguments for :class:`AsyncAnsys`
+            **kwargs: Keyword arguments for :class:`AsyncAnsys`
+
+        Returns:
+            AsyncAnsys: The started session.
+        """
+        session = cls(*args, **kwargs)
+        await session.start()
+        return session
+
+    def __repr__(self):
+        return "<pansys.AsyncAnsys object started in {} with command {}>"\
+            .format(self._wd, self._startcommand)
+
+    def __del__(self):
+        # Exiting ansys without waiting, since there may be no event loop
+        try:
+            if self.process.isalive():
+                self.process.sendline("finish")
+                self.process.sendline("/exit,nosav")
+        except (AttributeError, OSError, pexpect.ExceptionPexpect):
+            pass
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.exit()
+
+    async def start(self):
+        """Wait till ansys is ready and set the defaults
+
+        Does nothing if the session was started already.
+
+        Returns:
+            None
+
+        """
+        async with self._lock:
+            if self._started:
+                return
+            # The prompt after the blank line sent at the start
+            prompted = await self._execute(None)
+            for command in _DEFAULTS.split("\n"):
+                if prompted and command.strip():
+                    prompted = await self._execute(command.strip())
+            if not prompted:
+                raise OSError("Ansys did not start! "
+                              "Check the command or start_folder.")
+            self._started = True
+            self._buffer = _OutputBuffer()
+            self._buffer.write("{} started in directory {}"
+                               .format(self._startcommand, self._wd))
+
+    async def exit(self):
+        """Exit the ansys session
+
+        See :meth:`pansys.Ansys.exit`.
+
+        Returns:
+            None
+
+        """
+        async with self._lock:
+            try:
+                if self.process.isalive():
+                    await self._execute("finish")
+                    await self._execute("/exit,nosav")
+            except (OSError, pexpect.ExceptionPexpect):
+                pass
+        if self.cleanup:
+            import shutil
+            shutil.rmtree(self._wd, ignore_errors=True)
+            if not self._shared:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._remote.rmtree,
+                                           self._wd)
+
+    @property
+    def alive(self):
+        """True if the ansys process is running"""
+        return self.process.isalive()
+
+    @property
+    def wd(self):
+        """Current working directory where Ansys is running."""
+        return self._wd
+
+    @property
+    def output(self):
+        """The output of the last executed Ansys command"""
+        return self._buffer.getvalue()
+
+    async def send(self, command_string, **kwargs):
+        """Sending a command to ansys
+
+        Coroutine version of :meth:`pansys.Ansys.send`. Multiline commands
+        are sent one line at a time, waiting for the ansys prompt after each
+        line. An error from ansys raises a ``RuntimeError``.
+
+            >>> await ans.send("/prep7")
+
+        Args:
+            command_string (str): Required. The string containing ansys command
+            silent (bool): Optional. If False, the output is printed, or
+                passed to ``output_function``.
+            output_function (function): Optional. A function which will
+                process the output from ansys line by line.
+            capture (str): Optional. How the output is kept for
+                :attr:`output`. See :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        async with self._lock:
+            await self._send(command_string, **kwargs)
+
+    async def _send(self, command_string, **kwargs):
+        """Same as :meth:`send`, for callers which hold the lock"""
+        for command in command_string.split("\n"):
+            await self._execute(command, **kwargs)
+
+    async def _execute(self, command, **kwargs):
+        """Sends a single line to ansys and reads the output till the prompt
+
+        Args:
+            command (str): A single line of ansys command. If None, nothing
+                is sent and only the output till the next prompt is read.
+            kwargs: Optional. See keyword args for :meth:`send`
+
+        Returns:
+            bool: True if the prompt was found, False if ansys exited before
+                it.
+
+        """
+        if command is not None:
+            self.process.sendline(command)
+        self._buffer = _OutputBuffer(kwargs.get("capture", self.capture),
+                                     self.capture_limit)
+        silent = kwargs.get("silent", self.silent)
+        ofunc = kwargs.get("output_function", print)
+        regex = _compile_output_regex(tuple(self.expect_list),
+                                      tuple(self.prompt_list))
+        scanner = _Scanner(regex, command, self.messages)
+        prompted = False
+        pending = self.process.buffer
+        self.process.buffer = ""
+        try:
+            while True:
+                end = pending.rfind("\n") + 1
+                if end:
+                    chunk, pending = pending[:end], pending[end:]
+                    self._buffer.write(chunk)
+                    if not silent:
+                        for line in chunk.splitlines():
+                            ofunc(line.strip())
+                    event = scanner.feed(chunk)
+                    if event is not None:
+                        if event == _QUESTION:
+                            logging.warning(chunk)
+                        prompted = True
+                        break
+                try:
+                    pending += await self._read()
+                except pexpect.EOF:
+                    # Ansys has exited, as with /exit
+                    self._buffer.write(pending)
+                    pending = ""
+                    break
+        finally:
+            self.process.buffer = pending + self.process.buffer
+        scanner.close()
+        if scanner.error is not None:
+            raise RuntimeError(scanner.error.text)
+        return prompted
+
+    async def _read(self):
+        """Waits till there is output from ansys and returns it
+
+        The file descriptor of the ansys process is watched by the event
+        loop, so that other coroutines can run while ansys is busy.
+
+        Returns:
+            str: The output which is available.
+        """
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.process.child_fd
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        return self.process.read_nonblocking(self.process.maxread, timeout=0)
+
+    async def get(self, entity, entnum, item1, it1num="", item2="",
+                  it2num=""):
+        """Wrapper for ansys ``*GET`` command
+
+        Coroutine version of :meth:`pansys.Ansys.get`.
+
+        Returns:
+            Output of ``*get``. Can be int, float, exponential or string.
+        """
+        async with self._lock:
+            await self._send("*del,mypar__")
+            await self._send(_get_command("mypar__", entity, entnum, item1,
+                                          it1num, item2, it2num))
+            await self._send("/com,%%mypar__%", capture="full")
+            mypar = self.output.split("\n")[1].strip()
+        if "mypar__" in mypar:
+            raise ValueError("The *get command did not yield any value")
+        return return_value(mypar)
+
+    async def get_output(self, command_string):
+        """Function to get ansys output as a file
+
+        Coroutine version of :meth:`pansys.Ansys.get_output`. The output is
+        always written to a new file, since other coroutines may be using
+        the session at the same time.
+
+        Args:
+            command_string (str): The command(s) to be executed for which the
+                output is sought.
+
+        Returns:
+            str: Path to a file which contains the output of the ansys command
+                call.
+        """
+        output_file = str(uuid4())
+        async with self._lock:
+            await self._send("/output,{}".format(output_file))
+            try:
+                await self._send(command_string)
+            finally:
+                await self._send("/output")
+        output_file = os.path.join(self._wd, output_file)
+        if not self._shared:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._remote.pull, output_file,
+                                       output_file)
+        return output_file
+
+    async def get_list(self, command_string, chunksize=None, compact=None,
+                       **kwargs):
+        """Extract any list from ansys
+
+        Coroutine version of :meth:`pansys.Ansys.get_list`. The output file
+        is parsed in a thread of the default executor of the event loop, so
+        that the other sessions are not held up by a long list.
+
+            >>> df = await ans.get_list("nlist")
+
+        Args:
+            command_string (str): The Ansys command which will output a column
+                data.
+            chunksize (int): Optional. See :meth:`pansys.Ansys.get_list`
+            compact (bool): Optional. See :meth:`pansys.Ansys.get_list`
+            **kwargs: Keyword arguments for :func:`pandas.read_table`
+
+        Returns:
+            pandas.Dataframe: A :class:`pandas.DataFrame` with the data that
+                ansys returned when ``command_string`` was passed. An iterator
+                of :class:`pandas.DataFrame` if ``chunksize`` is given.
+        """
+        command_string = command_string.lower()
+        f = await self.get_output(command_string)
+        loop = asyncio.get_running_loop()
+        try:
+            df = await loop.run_in_executor(None, partial(
+                _parse_list, f, command_string, chunksize, compact, **kwargs))
+        except BaseException:
+            if os.path.exists(f):
+                os.remove(f)
+            raise
+        if chunksize:
+            return _removing(df, f)
+        os.remove(f)
+        return df
@@ -0,0 +1,326 @@
+"""
+Batch ansys runs
+
+Ansys run in batch mode from an input file. For long decks this is much
+faster than an interactive session, since there is no terminal and no
+waiting for the prompt after every command.
+
+"""
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from uuid import uuid4
+
+from .interactive import (_DEFAULTS, QueueRun, _get_command, _parse_list,
+                          _removing, _start_command, _working_folder)
+from .utility_functions import return_value
+
+
+class AnsysBatch(object):
+    """Ansys batch run with the interface of :class:`pansys.Ansys`
+
+    The commands are not sent to ansys right away, but recorded in an input
+    deck. The deck is run with ansys in batch mode by :meth:`run`. Methods
+    which return a value, like :meth:`get` and :meth:`get_list`, return a
+    :class:`concurrent.futures.Future` instead, which gets its value from
+    the output once the deck has run.
+
+        >>> ans = AnsysBatch()
+        >>> ans.send("/prep7")
+        >>> ans.send("n,1,0,0,0")
+        >>> count = ans.get("node", "", "count")
+        >>> nodes = ans.get_list("nlist")
+        >>> ans.run()
+        >>> count.result()
+        1
+
+    Scripts written for :class:`pansys.Ansys` can be run with this class if
+    they do not need the value of a ``get`` before the end. The object can
+    also be used as a context manager, which runs the deck at the end of
+    the block:
+
+        >>> with AnsysBatch() as ans:
+        ...     ans.send("/prep7")
+        ...     count = ans.get("node", "", "count")
+        >>> count.result()
+
+    Every :meth:`run` starts a new ansys process, with an empty database.
+    The commands recorded after a run go to a new deck.
+
+    Args:
+        startcommand (str): Ansys start command. See :class:`pansys.Ansys`.
+            The batch mode options ``-b -i <deck> -o <output>`` are added
+            to it.
+        startfolder (str): The folder in which ansys is run. See
+            :class:`pansys.Ansys`
+        cleanup (bool): If true will delete the working directory in
+            :meth:`exit`.
+
+    """
+    def __init__(self, startcommand=None, startfolder=None, cleanup=False):
+        self._startcommand = _start_command(startcommand)
+        self.cleanup = cleanup
+        self._wd, created = _working_folder(startfolder)
+        if not created:
+            self.cleanup = False
+        self._lock = threading.RLock()
+        self._deck = []
+        self._queues = {}
+        self._results = []
+        # Deferred results of the deck, as (future, function) to resolve them
+        self.output_file = None
+        # The output file of the last run
+        self.returncode = None
+        # The exit code of ansys in the last run
+        self.runs = 0
+
+    def __repr__(self):
+        return "<pansys.AnsysBatch in {} with command {}>".format(
+            self._wd, self._startcommand)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        try:
+            if exc_type is None and self._deck:
+                self.run()
+        finally:
+            self.exit()
+
+    @property
+    def wd(self):
+        """Working directory where Ansys is run."""
+        return self._wd
+
+    @property
+    def output(self):
+        """The output of the last run"""
+        if self.output_file is None:
+            return ""
+        with open(self.output_file, "r", errors="replace") as f:
+            return f.read()
+
+    def send(self, command_string, **kwargs):
+        """Record commands in the deck
+
+        Args:
+            command_string (str): Required. The string containing ansys
+                command
+            kwargs: Accepted for compatibility with :meth:`pansys.Ansys.send`
+                and ignored.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self._deck += command_string.split("\n")
+
+    def queue(self, command_string, name="default"):
+        """Queue commands for delayed execution
+
+        See :meth:`pansys.Ansys.queue`. The queue is added to the deck by
+        :meth:`run_queue`.
+
+        Args:
+            command_string (str): Required. The command that you want to add
+                to the queue.
+            name (str): Optional. The name of the queue.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self._queues.setdefault(name, []).append(command_string)
+
+    def run_queue(self, name="default", wait=True, **kwargs):
+        """Add all the commands in the queue to the deck
+
+        Args:
+            name (str): Optional. The name of the queue.
+            wait (bool): Accepted for compatibility with
+                :meth:`pansys.Ansys.run_queue` and ignored.
+            kwargs: Accepted for compatibility and ignored.
+
+        Returns:
+            pansys.interactive.QueueRun: The number of lines. The time is
+                zero, since the lines are run later.
+        """
+        with self._lock:
+            lines = self._queues.pop(name, [])
+            for line in lines:
+                self.send(line)
+        return QueueRun(name, len(lines), sum(len(x) + 1 for x in lines),
+                        0.0)
+
+    def _defer(self, resolve):
+        """Returns a future which is resolved by ``resolve`` after the run"""
+        future = Future()
+        with self._lock:
+            self._results.append((future, resolve))
+        return future
+
+    def get(self, entity, entnum, item1, it1num="", item2="", it2num=""):
+        """Wrapper for ansys ``*GET`` command
+
+        The value is read from the output of the run. See
+        :meth:`pansys.Ansys.get`.
+
+        Returns:
+            concurrent.futures.Future: The future of the value, which can
+                be int, float, exponential or string. The future raises a
+                ``ValueError`` if the ``*get`` did not yield any value.
+        """
+        with self._lock:
+            name = "pansys_b{}__".format(len(self._results))
+            self.send("*del,{}".format(name))
+            self.send(_get_command(name, entity, entnum, item1, it1num,
+                                   item2, it2num))
+            self.send("/com,{}=%{}%".format(name.upper(), name))
+            query = (entity, entnum, item1, it1num, item2, it2num)
+            return self._defer(lambda output: _get_value(output, name,
+                                                         query))
+
+    def get_output(self, command_string):
+        """Function to get the output of commands as a file
+
+        Args:
+            command_string (str): The command(s) for which the output is
+                sought.
+
+        Returns:
+            concurrent.futures.Future: The future of the path to the file
+                which contains the output of the commands.
+        """
+        path = self._record_output(command_string)
+        return self._defer(lambda output: path)
+
+    def _record_output(self, command_string):
+        """Records commands with their output going to a new file
+
+        Returns:
+            str: The path of the file.
+        """
+        name = "pansys_{}".format(uuid4().hex)
+        self.send("/output,{},out\n{}\n/output".format(name, command_string))
+        return os.path.join(self._wd, name + ".out")
+
+    def get_list(self, command_string, chunksize=None, compact=None,
+                 **kwargs):
+        """Extract any list from ansys
+
+        The list is parsed from its output file after the run. See
+        :meth:`pansys.Ansys.get_list` for the arguments.
+
+        Returns:
+            concurrent.futures.Future: The future of the
+                :class:`pandas.DataFrame`, or of an iterator of them if
+                ``chunksize`` is given.
+        """
+        command_string = command_string.lower()
+        f = self._record_output(command_string)
+
+        def resolve(output):
+            if chunksize:
+                return _removing(_parse_list(f, command_string, chunksize,
+                                             compact, **kwargs), f)
+            try:
+                return _parse_list(f, command_string, chunksize, compact,
+                                   **kwargs)
+            finally:
+                os.remove(f)
+        return self._defer(resolve)
+
+    def run(self, timeout=None):
+        """Run the deck with ansys in batch mode
+
+        The deck is written to a file in the working directory and run with
+        the start command and the options ``-b -i <deck> -o <output>``. The
+        futures returned by the other methods get their values once ansys
+        has finished.
+
+        Args:
+            timeout (float): Optional. Maximum number of seconds to wait for
+                ansys.
+
+        Returns:
+            str: The path to the output file of the run.
+        """
+        with self._lock:
+            deck, self._deck = self._deck, []
+            results, self._results = self._results, []
+            self.runs += 1
+            name = "pansys_batch_{}".format(self.runs)
+            deck_file = os.path.join(self._wd, name + ".inp")
+            self.output_file = os.path.join(self._wd, name + ".out")
+            with open(deck_file, "w") as f:
+                for line in _DEFAULTS.split("\n"):
+                    if line.strip():
+                        f.write(line.strip() + "\n")
+                f.write("\n".join(deck) + "\n")
+                f.write("finish\n/exit,nosav\n")
+            args = shlex.split(self._startcommand) + [
+                "-b", "-i", deck_file, "-o", self.output_file]
+            start = time.perf_counter()
+            try:
+                self.returncode = subprocess.call(
+                    args, cwd=self._wd, stdin=subprocess.DEVNULL,
+                    timeout=timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                for future, _ in results:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+                if isinstance(e, subprocess.TimeoutExpired):
+                    raise
+                raise OSError("The command {} was not found".format(
+                    self._startcommand))
+            logging.info("Batch run of {} lines took {:.3f} s".format(
+                len(deck), time.perf_counter() - start))
+            output = self.output
+            for future, resolve in results:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(resolve(output))
+                except Exception as e:
+                    future.set_exception(e)
+            # Ansys exits with a non zero code after errors in batch mode
+            if self.returncode != 0:
+                raise RuntimeError("Ansys exited with code {}. See {}".format(
+                    self.returncode, self.output_file))
+            return self.output_file
+
+    def exit(self):
+        """Drop the deck and delete the working directory if ``cleanup``
+
+        Futures which were not run are cancelled.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            for future, _ in self._results:
+                future.cancel()
+            self._deck = []
+            self._results = []
+        if self.cleanup:
+            shutil.rmtree(self._wd, ignore_errors=True)
+
+
+def _get_value(output, name, query):
+    """Reads the value of a deferred ``*get`` from the output of a run"""
+    match = re.search(r"^\s*{}=(.*?)\s*$".format(name.upper()), output,
+                      re.MULTILINE)
+    if match is None or name in match.group(1).lower():
+        raise ValueError("The *get command {} did not yield any value"
+                         .format(query))
+    return return_value(match.group(1))
@@ -0,0 +1,238 @@
+"""
+Client for the pansys session server
+
+A thin client for the sessions kept warm by ``pansys serve``. See
+:mod:`pansys.server`. The client talks to the server over a Unix socket
+and only imports numpy and pandas when a result needs them, so that short
+lived tools start quickly.
+
+"""
+import json
+import os
+import socket
+import tempfile
+
+
+def default_socket():
+    """Returns the path of the socket of the server
+
+    The path is the value of the environment variable ``PANSYS_SOCKET``, or
+    a file in the temporary folder which is different for each user.
+
+    Returns:
+        str: The path of the socket.
+    """
+    return os.environ.get("PANSYS_SOCKET", os.path.join(
+        tempfile.gettempdir(), "pansys-{}.sock".format(os.getuid())))
+
+
+def encode(value):
+    """Converts a value to something which can be written as JSON
+
+    Arrays, tables, tuples and dictionaries with keys other than strings
+    are tagged with their type, so that :func:`decode` can make them again.
+    """
+    kind = type(value).__module__.split(".")[0]
+    if isinstance(value, tuple):
+        return {"__type__": "tuple", "items": [encode(x) for x in value]}
+    if isinstance(value, list):
+        return [encode(x) for x in value]
+    if isinstance(value, dict):
+        if all(isinstance(x, str) for x in value):
+            return {x: encode(y) for x, y in value.items()}
+        return {"__type__": "dict",
+                "items": [[encode(x), encode(y)] for x, y in value.items()]}
+    if kind == "numpy":
+        if hasattr(value, "shape") and value.shape:
+            return {"__type__": "array", "dtype": str(value.dtype),
+                    "data": encode(value.tolist())}
+        return value.item()
+    if kind == "pandas" and hasattr(value, "to_dict"):
+        return {"__type__": "frame",
+                "data": encode(value.to_dict(orient="split")),
+                "dtypes": [str(x) for x in value.dtypes]}
+    return value
+
+
+def decode(value):
+    """Makes the values converted by :func:`encode` again"""
+    if isinstance(value, list):
+        return [decode(x) for x in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get("__type__")
+    if kind == "tuple":
+        return tuple(decode(x) for x in value["items"])
+    if kind == "dict":
+        return {decode(x): decode(y) for x, y in value["items"]}
+    if kind == "array":
+        import numpy as np
+        return np.array(decode(value["data"]), dtype=value["dtype"])
+    if kind == "frame":
+        import pandas as pd
+        data = decode(value["data"])
+        df = pd.DataFrame(data["data"], index=data["index"],
+                          columns=data["columns"])
+        return df.astype(dict(zip(df.columns, value["dtypes"])))
+    return {x: decode(y) for x, y in value.items()}
+
+
+# Exceptions from the server which are raised as they are by the client
+_EXCEPTIONS = {x.__name__: x for x in (
+    RuntimeError, ValueError, OSError, TimeoutError, KeyError, TypeError,
+    AttributeError)}
+
+
+class AnsysClient(object):
+    """Ansys session from the pansys session server
+
+    Connects to a server started with ``pansys serve`` and takes one of its
+    warm ansys sessions for as long as the client is open. The methods are
+    the same as those of :class:`pansys.Ansys`.
+
+        >>> ans = AnsysClient()
+        >>> ans.send("/prep7")
+        >>> ans.get("node", "", "count")
+        0
+        >>> ans.close()
+
+    The session is reset when the client is closed, and goes back to the
+    server for the next client. The client can be used as a context manager,
+    which closes it at the end of the block.
+
+    Args:
+        path (str): Optional. The socket of the server. Default is given by
+            :func:`default_socket`.
+        timeout (float): Optional. Seconds to wait for the server to answer.
+            Default is to wait as long as required.
+
+    """
+    def __init__(self, path=None, timeout=None):
+        self.path = path or default_socket()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(self.path)
+        except OSError:
+            self._socket.close()
+            raise OSError("No pansys server at {}. Start one with "
+                          "'pansys serve'.".format(self.path))
+        self._file = self._socket.makefile("rwb")
+        self._queues = {}
+
+    def __repr__(self):
+        return "<pansys.AnsysClient of {}>".format(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _call(self, method, *args, **kwargs):
+        """Runs a method of the session on the server and returns its result
+        """
+        request = {"method": method, "args": encode(list(args)),
+                   "kwargs": encode(kwargs)}
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise OSError("The pansys server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise _EXCEPTIONS.get(response["error"], RuntimeError)(
+                response["message"])
+        return decode(response["result"])
+
+    def close(self):
+        """Give the session back to the server
+
+        Returns:
+            None
+
+        """
+        try:
+            self._file.close()
+        finally:
+            self._socket.close()
+
+    exit = close
+
+    @property
+    def output(self):
+        """The output of the last executed Ansys command"""
+        return self._call("output")
+
+    @property
+    def version(self):
+        """The version of ansys for the current active session."""
+        return self._call("version")
+
+    @property
+    def wd(self):
+        """Current working directory where Ansys is running."""
+        return self._call("wd")
+
+    def send(self, command_string, **kwargs):
+        """See :meth:`pansys.Ansys.send`. ``output_function`` is not
+        supported."""
+        return self._call("send", command_string, **kwargs)
+
+    def queue(self, command_string, name="default"):
+        """See :meth:`pansys.Ansys.queue`. The queue is kept by the client
+        and sent to the server in one go by :meth:`run_queue`."""
+        self._queues.setdefault(name, []).append(command_string)
+
+    def run_queue(self, name="default", **kwargs):
+        """See :meth:`pansys.Ansys.run_queue`. ``wait`` is not supported.
+
+        Returns:
+            tuple: The name of the queue, the number of lines, the number of
+                characters and the time taken, as in
+                :class:`pansys.interactive.QueueRun`.
+        """
+        lines = self._queues.pop(name, [])
+        if lines:
+            self._call("queue", "\n".join(lines), name)
+        run = self._call("run_queue", name, **kwargs)
+        # The lines were sent as a single command
+        return (run[0], len(lines)) + run[2:]
+
+    def reset(self):
+        """See :meth:`pansys.Ansys.reset`"""
+        return self._call("reset")
+
+    def get(self, entity, entnum, item1, it1num="", item2="", it2num=""):
+        """See :meth:`pansys.Ansys.get`"""
+        return self._call("get", entity, entnum, item1, it1num, item2,
+                          it2num)
+
+    def get_many(self, queries, **kwargs):
+        """See :meth:`pansys.Ansys.get_many`"""
+        return self._call("get_many", queries, **kwargs)
+
+    def get_array(self, entity, item1, it1num="", item2="", it2num="",
+                  count=None, **kwargs):
+        """See :meth:`pansys.Ansys.get_array`"""
+        return self._call("get_array", entity, item1, it1num, item2, it2num,
+                          count, **kwargs)
+
+    def get_parameters(self, names=None, **kwargs):
+        """See :meth:`pansys.Ansys.get_parameters`"""
+        return self._call("get_parameters", names, **kwargs)
+
+    def set_parameters(self, params, **kwargs):
+        """See :meth:`pansys.Ansys.set_parameters`"""
+        return self._call("set_parameters", params, **kwargs)
+
+    def get_output(self, command_string, persist=False):
+        """See :meth:`pansys.Ansys.get_output`. The server and the client
+        share the file system, so that the path can be opened directly."""
+        return self._call("get_output", command_string, persist)
+
+    def get_list(self, command_string, compact=None, **kwargs):
+        """See :meth:`pansys.Ansys.get_list`. ``chunksize`` is not
+        supported."""
+        return self._call("get_list", command_string, compact=compact,
+                          **kwargs)
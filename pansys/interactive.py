@@ -4,15 +4,469 @@ Interactive Ansys
 Maintained & Created by : Najeem Muhammed
 
 """
+import io
 import os
 import re
+import select
+import shlex
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
 from datetime import datetime
+from concurrent.futures import Future
+from functools import lru_cache, partial, wraps
+from queue import Queue
+from uuid import uuid4
 import pexpect
 import logging
 
+import numpy as np
 import pandas as pd
 
-from .utility_functions import return_value, calculate_skip_rows
+from .remote import connection
+from .results import ResultFile
+from .utility_functions import (return_value, calculate_skip_rows,
+                                read_list, read_list_stream, iter_list,
+                                compact_dtypes, read_parameters,
+                                write_parameters, LIST_DTYPES)
+
+
+def _get_command(name, entity, entnum, item1, it1num="", item2="",
+                 it2num=""):
+    """Returns the ``*get`` command to store a value in parameter ``name``"""
+    if not entnum:
+        entnum = 0
+    return "*get,{},{},{},{},{},{},{}".format(
+        name, entity, entnum, item1, it1num, item2, it2num)
+
+
+# Settings which are sent to ansys when a session is started
+_DEFAULTS = """
+            /PAGE,99999999,256,99999999,240
+            /HEADER,OFF,OFF,OFF,OFF,ON,OFF
+            /FORMAT,12,E,20,8
+            /RGB,INDEX,100,100,100,0
+            /RGB,INDEX,0,0,0,15
+        """
+
+# Prompts which mark the end of a command
+_EXPECT_LIST = ['BEGIN:',
+                'PREP7:',
+                'POST1:',
+                'SOLU_LS[1-9]+:',
+                'POST26:',
+                'AUX12:',
+                'AUX15:',
+                'AUX2:',
+                'AUX3:']
+# Prompts where ansys waits for an answer
+_PROMPT_LIST = ['\\[y\\/n\\]',
+                'SHOULD INPUT PROCESSING BE SUSPENDED\\?']
+
+
+@lru_cache(maxsize=16)
+def _compile_output_regex(expect_list, prompt_list):
+    """Compiled regular expression for the ansys prompts and messages
+
+    The prompts and questions are combined in to a single regular expression
+    so that each line of output is scanned only once.
+    """
+    return re.compile(
+        r"(?P<question>{})|(?P<prompt>{})|"
+        r"\*\*\* (?P<level>ERROR|WARNING|NOTE) \*\*\*".format(
+            "|".join("(?:{})".format(x) for x in prompt_list),
+            "|".join("(?:{})".format(x) for x in expect_list)))
+
+
+def _start_command(startcommand):
+    """Returns the command to start ansys"""
+    if startcommand is None:
+        if 'PANSYS_STARTCOMMAND' in os.environ.keys():
+            startcommand = os.environ['PANSYS_STARTCOMMAND']
+        else:
+            startcommand = 'ansys150'
+    return startcommand
+
+
+def _working_folder(startfolder, parent=None):
+    """Returns the working folder for a session
+
+    Args:
+        startfolder (str): An existing folder, or None to create a new one
+        parent (str): Optional. The folder in which a new folder is created.
+            Default is the current folder.
+
+    Returns:
+        tuple: The path to the folder and True if it was created.
+    """
+    if startfolder is not None:
+        if not os.path.exists(startfolder):
+            raise OSError("The folder {} doesn't exist".format(startfolder))
+        return startfolder, False
+    # If start folder is not existing, create a folder with current
+    # data and time as the name.
+    wd = os.path.join(parent or os.getcwd(), "pansys_" +
+                      datetime.now().strftime("%Y%m%d%H%M%S"))
+    # Sessions started in the same second get a numbered folder. The folder
+    # is created right away, since other threads may be picking one too.
+    count = 0
+    basename = wd
+    while True:
+        try:
+            os.makedirs(wd)
+        except FileExistsError:
+            count += 1
+            wd = "{}_{}".format(basename, count)
+        except OSError:
+            raise OSError("Could not create folder at given location."
+                          " Check if you have write access.")
+        else:
+            return wd, True
+
+
+def _spawn(startcommand, wd, remote=None):
+    """Starts the ansys process
+
+    timeout set to None so that the process will wait as long as required for
+    a command to finish. The working directory is passed to the child instead
+    of changing the directory of python, so that sessions can be started from
+    several threads.
+
+    Args:
+        startcommand (str): The command to start ansys
+        wd (str): The working folder
+        remote (pansys.remote.SSHConnection): Optional. The connection to the
+            system on which ansys is started.
+    """
+    try:
+        if remote is None:
+            return pexpect.spawn(startcommand,
+                                 maxread=10000,
+                                 searchwindowsize=100,
+                                 timeout=None,
+                                 encoding="utf-8",
+                                 cwd=wd)
+        args = remote.command("cd {} && {}".format(shlex.quote(wd),
+                                                   startcommand), tty=True)
+        return pexpect.spawn(args[0], args[1:],
+                             maxread=10000,
+                             searchwindowsize=100,
+                             timeout=None,
+                             encoding="utf-8",
+                             cwd=wd)
+    except pexpect.exceptions.ExceptionPexpect:
+        raise OSError("The command {} was not found".format(startcommand))
+
+
+def _remote_folder(remote, wd):
+    """Creates the working folder on a remote system
+
+    The folder is created with the same path as the local one. A file which
+    is written in the local folder is looked for in the remote folder to
+    find out if the folder is shared, eg. over NFS.
+
+    Args:
+        remote (pansys.remote.SSHConnection): The connection to the system
+        wd (str): The local working folder
+
+    Returns:
+        bool: True if the folder is shared by both the systems.
+    """
+    marker = os.path.join(wd, ".pansys_{}".format(uuid4().hex))
+    open(marker, "w").close()
+    try:
+        return remote.run("mkdir -p {0} && if test -e {1}; then echo shared;"
+                          " fi".format(shlex.quote(wd), shlex.quote(marker))
+                          ).strip() == "shared"
+    finally:
+        os.remove(marker)
+
+
+def _list_converter(command_string, compact=None, dtype=None):
+    """Returns the function which converts a list to compact types
+
+    See :meth:`pansys.Ansys.get_list` for the arguments.
+
+    Args:
+        dtype (dict): Optional. The ``dtype`` given for
+            :func:`pandas.read_table`, whose columns are not converted.
+
+    Returns:
+        function: The conversion function, or None if the list is not to be
+            converted.
+    """
+    keep = LIST_DTYPES.get(command_string.split(",")[0].strip()[:4])
+    if dtype is not None and not isinstance(dtype, dict):
+        # A type for all the columns
+        return None
+    if compact or (compact is None and keep is not None):
+        return partial(compact_dtypes, keep=keep or (), skip=dtype or ())
+    return None
+
+
+def _parse_list(f, command_string, chunksize=None, compact=None, **kwargs):
+    """Parses the output file of a list command
+
+    See :meth:`pansys.Ansys.get_list` for the arguments.
+    """
+    if not kwargs:
+        convert = _list_converter(command_string, compact)
+        if chunksize:
+            return (convert(x) if convert else x
+                    for x in iter_list(f, chunksize))
+        df = read_list(f)
+        return convert(df) if convert else df
+    if chunksize:
+        kwargs["chunksize"] = chunksize
+    if "delim_whitespace" not in kwargs and "sep" not in kwargs:
+        kwargs["sep"] = r"\s+"
+    if "skiprows" not in kwargs:
+        kwargs["skiprows"] = calculate_skip_rows(f, 5)
+    if "skip_blank_lines" not in kwargs:
+        kwargs["skip_blank_lines"] = True
+    convert = _list_converter(command_string, compact, kwargs.get("dtype"))
+    df = pd.read_table(f, **kwargs)
+    if convert and chunksize:
+        return (convert(x) for x in df)
+    return convert(df) if convert else df
+
+
+def _removing(chunks, path):
+    """Yields from ``chunks`` and deletes the file ``path`` at the end"""
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _int_width(values):
+    """Returns the width of the fixed format fields for integers"""
+    largest = int(np.abs(values).max()) if np.size(values) else 0
+    return max(9, len(str(largest)) + 1)
+
+
+def _write_table(f, table, fmt):
+    """Writes the rows of an array to a file with a printf style format
+
+    Faster than :func:`numpy.savetxt`, since the array is converted to
+    python numbers in one go.
+    """
+    fmt += "\n"
+    f.writelines(fmt % tuple(row) for row in table.tolist())
+
+
+# Commands which do not change the model, by the first four
+# letters as ansys abbreviates them.
+_READ_ONLY = frozenset([
+    "/com", "/out", "/pag", "/hea", "/for", "/rgb", "/sho", "/rep", "/nop",
+    "/gop", "/sta", "*get", "*vge", "*del", "*set", "*dim", "*vwr", "*cfo",
+    "*cfc", "*sta", "*lis", "nlis", "elis", "klis", "llis", "alis", "vlis",
+    "prns", "pres", "prrs", "prrf", "prit", "prva", "nplo", "eplo", "kplo",
+    "lplo", "aplo", "vplo", "gplo", "plns", "ples", "pldi", "pars",
+])
+
+
+def _read_only(command):
+    """True if ``command`` is known not to change the model
+
+    Commands which define parameters are read only too. See
+    :func:`_changes_session`.
+    """
+    command = command.strip().lower()
+    if not command or command.startswith("!"):
+        return True
+    # Assignment of a parameter
+    if re.match(r"[a-z_]\w*(\(.*\))?\s*=", command):
+        return True
+    return command.split(",")[0].strip()[:4] in _READ_ONLY
+
+
+# Read only commands which define a parameter, by the first four letters
+_DEFINES_PARAMETER = frozenset(["*get", "*vge", "*del", "*set", "*dim"])
+
+
+def _changes_session(command):
+    """True if ``command`` may change the model or a parameter
+
+    Such commands clear the cache of get results and are replayed when
+    restoring a snapshot. Parameters used internally, whose names end with
+    an underscore, do not count.
+    """
+    if not _read_only(command):
+        return True
+    command = command.strip().lower()
+    match = re.match(r"([a-z_]\w*)(\(.*\))?\s*=", command)
+    if match is not None:
+        name = match.group(1)
+    else:
+        fields = command.split(",")
+        if fields[0].strip()[:4] not in _DEFINES_PARAMETER or \
+                len(fields) < 2:
+            return False
+        name = fields[1].split("(")[0].strip()
+    return not name.endswith("_")
+
+
+def _synchronized(method):
+    """Decorator which runs a method of :class:`Ansys` under its lock"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _worker(jobs):
+    """Runs the jobs submitted to a session till None is received
+
+    The worker does not keep a reference to the session in between the jobs,
+    so that an idle worker does not keep the session alive.
+    """
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        future, fn, args, kwargs = job
+        del job
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        del future, fn, args, kwargs
+
+
+QueueRun = namedtuple("QueueRun", ["name", "lines", "size", "seconds"])
+QueueRun.__doc__ = """Number of lines, characters and the time taken in
+seconds for a run of a queue"""
+
+Snapshot = namedtuple("Snapshot", ["db", "parameters", "processor",
+                                   "journal"])
+Snapshot.__doc__ = """The database and parameter files of a session, the
+processor it was in and the commands sent after the files were written"""
+
+# Commands to enter the processors, by the routine number of *GET ACTIVE
+_PROCESSORS = {0: "finish", 17: "/prep7", 21: "/solu", 31: "/post1",
+               36: "/post26", 52: "/aux2", 53: "/aux3", 62: "/aux12",
+               65: "/aux15"}
+
+Message = namedtuple("Message", ["level", "text", "command"])
+Message.__doc__ = """A message (``ERROR``, ``WARNING`` or ``NOTE``) from ansys"""
+
+# Events returned by _Scanner.feed
+_PROMPT = 1
+_QUESTION = 2
+
+
+class _Scanner(object):
+    """Incremental scanner for the output of an ansys command
+
+    Each chunk of output is searched once with the compiled regular
+    expression from :attr:`pansys.Ansys._output_regex`. Only the lines of a
+    message block are looked at individually, till the blank line which ends
+    the block.
+
+    Args:
+        regex: The compiled regular expression for prompts and messages
+        command (str): The command which is being executed
+        log (collections.deque): Completed messages are appended here
+    """
+    def __init__(self, regex, command, log):
+        self.regex = regex
+        self.command = command
+        self.log = log
+        self.error = None
+        self._level = None
+        self._block = None
+
+    def feed(self, chunk):
+        """Scans a chunk of output
+
+        Returns:
+            int: ``_PROMPT`` if the chunk has an ansys prompt, ``_QUESTION``
+                if ansys is waiting for an answer, otherwise None.
+        """
+        if self._block is None:
+            match = self.regex.search(chunk)
+            if match is None:
+                return None
+            if not match.group("level"):
+                return _QUESTION if match.group("question") else _PROMPT
+            chunk = chunk[match.start():]
+        lines = chunk.split("\n")
+        # The last item is an incomplete line, or empty
+        for i, line in enumerate(lines[:-1] or lines):
+            line = line.strip()
+            match = self.regex.search(line) if line else None
+            if self._block is not None and (not line or match):
+                self._emit()
+            if match and match.group("level"):
+                self._level = match.group("level")
+                self._block = [line[match.start():]]
+            elif match:
+                return _QUESTION if match.group("question") else _PROMPT
+            elif line and self._block is not None:
+                self._block.append(line)
+        return None
+
+    def close(self):
+        """Flushes a message block which is not yet complete"""
+        if self._block is not None:
+            self._emit()
+
+    def _emit(self):
+        message = Message(self._level, "\n".join(self._block), self.command)
+        self._block = None
+        self.log.append(message)
+        if message.level == "ERROR":
+            if self.error is None:
+                self.error = message
+        elif message.level == "WARNING":
+            logging.warning(message.text)
+        else:
+            logging.info(message.text)
+
+
+class _OutputBuffer(object):
+    """Buffer for the output of the last ansys command
+
+    The output is kept as a list of chunks and joined only when it is asked
+    for, which avoids the cost of repeated string concatenation.
+
+    Args:
+        mode (str): ``full`` keeps everything, ``tail`` keeps only the last
+            ``limit`` characters and ``discard`` keeps nothing.
+        limit (int): Number of characters to be kept in ``tail`` mode.
+    """
+    def __init__(self, mode="full", limit=65536):
+        if mode not in ("full", "tail", "discard"):
+            raise ValueError("Unknown capture mode {}. Should be one of full,"
+                             " tail or discard".format(mode))
+        self.mode = mode
+        self.limit = limit
+        self._chunks = deque()
+        self._size = 0
+
+    def write(self, chunk):
+        if self.mode == "discard":
+            return
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self.mode == "tail":
+            # Dropping the oldest chunks which are not needed for the tail
+            while self._size - len(self._chunks[0]) >= self.limit:
+                self._size -= len(self._chunks.popleft())
+
+    def getvalue(self):
+        value = "".join(self._chunks)
+        if len(self._chunks) > 1:
+            self._chunks = deque([value])
+        if self.mode == "tail":
+            return value[-self.limit:]
+        return value
 
 
 class Ansys(object):
@@ -45,6 +499,18 @@ class Ansys(object):
     You can also change the folder where you want Ansys to start by setting the
     ``startfolder`` parameter.
 
+    The output of the last command is kept in memory and is available as
+    :attr:`pansys.Ansys.output`. For commands with very long outputs, you can
+    keep only the end of the output or nothing at all:
+
+        >>> ans.capture = "tail"
+        >>> ans.capture_limit = 10000
+        >>> ans.capture = "discard"
+
+    A session can be shared between threads, the commands are run one at a
+    time. Commands can also be run in the background with
+    :meth:`pansys.Ansys.submit`.
+
     Args:
         startcommand (str): Ansys start command. The linux command
             corresponding to the version of ansys you want to open. You can
@@ -65,91 +531,86 @@ class Ansys(object):
             itself. It is expected that you have set up ssh-keys in the remote
             system for this to work.
 
+            All the sessions on a system share one ssh connection. See
+            :class:`pansys.remote.SSHConnection`. If the working folder is
+            not shared with the remote system, it is created there with the
+            same path, and the files which ansys needs are copied to it.
+        ssh (str): Optional. The ssh command used to connect to ``host``.
+            Default is the value of the environment variable ``PANSYS_SSH``
+            or ``ssh``.
+
     """
     def __init__(self, startcommand=None, startfolder=None,
-                 cleanup=False, host=None):
-        if startcommand is None:
-            if 'PANSYS_STARTCOMMAND' in os.environ.keys():
-                startcommand = os.environ['PANSYS_STARTCOMMAND']
-            else:
-                startcommand = 'ansys150'
-        self._startcommand = startcommand
+                 cleanup=False, host=None, ssh=None):
+        self._startcommand = _start_command(startcommand)
         # The command that wil be used to open ansys
         self.cleanup = cleanup
         # If True delete the working directory after exiting ansys
         self.silent = True
         # If True, the commands will be in silent mode always
+        self.pipeline = False
+        # If True, multiline commands are written to ansys in one go
+        self.messages = deque(maxlen=1000)
+        # Log of the latest errors, warnings and notes from ansys
+        self.capture = "full"
+        # How the output of a command is kept. "full", "tail" or "discard"
+        self.capture_limit = 65536
+        # Number of characters kept at the end of the output in "tail" mode
+        self.fifo = False
+        # If True, get_list reads the output of ansys through a named pipe
+        self.queue_max_lines = None
+        # A queue is run when it has more lines than this
+        self.queue_max_bytes = None
+        # A queue is run when it has more characters than this
+        self.queue_runs = deque(maxlen=100)
+        # Timing of the latest runs of the queues
+        self.cache_size = 0
+        # Number of get results which are kept. 0 turns the cache off
+        self._get_cache = OrderedDict()
+        self._version = None
+        self._buffer = _OutputBuffer()
+        self._lock = threading.RLock()
+        # Only one thread talks to ansys at a time
+        self._jobs = None
+        # Queue of the background thread for submit, started when needed
+        self._jobs_lock = threading.Lock()
+        self._snapshot = None
+        # The snapshot from which the session is restored if ansys dies
+        self._journal = None
+        # Where the commands sent after the snapshot are recorded
 
         # List of ansys prompts which will mark the end of a command
-        self.expect_list = ['BEGIN:',
-                            'PREP7:',
-                            'POST1:',
-                            'SOLU_LS[1-9]+:',
-                            'POST26:',
-                            'AUX12:',
-                            'AUX15:',
-                            'AUX2:',
-                            'AUX3:']
-        self.prompt_list = [
-                        '\[y\/n\]',
-                        'SHOULD INPUT PROCESSING BE SUSPENDED\?',
-                        ]
+        self.expect_list = list(_EXPECT_LIST)
+        self.prompt_list = list(_PROMPT_LIST)
         # Checking and setting the ansys working directory
-        if startfolder is None:
-            # If start folder is not existing, create a folder with current
-            # data and time as the name.
-            self._wd = os.path.join(os.getcwd(), "pansys_" +
-                                    datetime.now().strftime("%Y%m%d%H%M%S"))
-            try:
-                os.makedirs(self._wd)
-            except:
-                OSError("Could not create folder at given location."
-                        " Check if you have write access.")
-        elif os.path.exists(startfolder):
-            self._wd = startfolder
+        self._wd, created = _working_folder(startfolder)
+        if not created:
             self.cleanup = False
-        else:
-            raise OSError("The folder {} doesn't exist".format(startfolder))
-
-        curdir = os.getcwd()
-        os.chdir(self._wd)
-        # Starting the ansys session. timeout set to None so that the process
-        # will wait as long as required for a command to finish
-        try:
-            if host is None:
-                self.process = pexpect.spawn(self._startcommand, 
-                                             maxread=10000, 
-                                             searchwindowsize=100,
-                                             timeout=None, 
-                                             encoding="utf-8")
-            else:
-                self.process = pexpect.spawn("ssh {} -t 'cd {} && {}'".format(
-                                         host, self._wd, self._startcommand),
-                                         maxread=10000, 
-                                         searchwindowsize=100,
-                                         timeout=None, 
-                                         encoding="utf-8")
-        except pexpect.exceptions.ExceptionPexpect:
-            raise OSError("The command {} was not found"
-                          .format(self._startcommand))
-        os.chdir(curdir)
+        self._remote = None
+        # Connection to the system of a remote session
+        self._shared = True
+        # False if the working folder is not shared with the remote system
+        if host is not None:
+            self._remote = connection(host, ssh)
+            self._shared = _remote_folder(self._remote, self._wd)
+        # Commands of the named queues of the queue method
+        self._queues = {}
+        self._queue_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        """Starts the ansys process and sets the defaults"""
+        self.process = _spawn(self._startcommand, self._wd, self._remote)
         # A blank command is sent since ansys asks to press <CR> in the
         # beginning of an interactive session
         self.process.sendline()
-        # Buffer file for queue method
-        self.__buffer_file = open(os.path.join(self.wd, 'input.inp'), 'w')
         # Setting some defaults
-        self.send("""
-            /PAGE,99999999,256,99999999,240
-            /HEADER,OFF,OFF,OFF,OFF,ON,OFF
-            /FORMAT,12,E,20,8
-            /RGB,INDEX,100,100,100,0
-            /RGB,INDEX,0,0,0,15
-        """)
+        self.send(_DEFAULTS)
         try:
             if self.process.expect(self.expect_list) == 0:
-                self._output = "{} started in directory {}"\
-                               .format(self._startcommand, self._wd)
+                self._buffer = _OutputBuffer()
+                self._buffer.write("{} started in directory {}"
+                                   .format(self._startcommand, self._wd))
         except pexpect.EOF:
             raise OSError("Ansys did not start! "
                           "Check the command or start_folder.")
@@ -161,18 +622,78 @@ class Ansys(object):
 
     def __del__(self):
         """Destructor function for ansys exiting"""
+        self.exit()
+
+    def exit(self):
+        """Exit the ansys session
+
+        Exits ansys without saving and deletes the working directory if
+        ``cleanup`` was set. This is done automatically when the object is
+        deleted, but can be called explicitly to free the license right
+        away. The session can not be used after this.
+
+        Returns:
+            None
+
+        """
+        # Ansys exiting now is not a crash
+        self._snapshot = None
+        self._journal = None
+        jobs = getattr(self, "_jobs", None)
+        if jobs is not None:
+            self._jobs = None
+            # Commands which were submitted but not started are cancelled
+            while not jobs.empty():
+                job = jobs.get_nowait()
+                if job is not None:
+                    job[0].cancel()
+            jobs.put(None)
         try:
-            self.send("""
-                finish
-                /exit,nosav
-                """)
-            self.__buffer_file.close()
-        except AttributeError:
+            if self.process.isalive():
+                self.send("""
+                    finish
+                    /exit,nosav
+                    """)
+        except (AttributeError, OSError, pexpect.ExceptionPexpect):
             pass
-        if self.cleanup:
+        if self.cleanup and hasattr(self, "_wd"):
             import shutil
             shutil.rmtree(self._wd, ignore_errors=True)
+            if not getattr(self, "_shared", True):
+                try:
+                    self._remote.rmtree(self._wd)
+                except OSError:
+                    logging.warning("Could not delete {} on {}".format(
+                        self._wd, self._remote.host))
+
+    @_synchronized
+    def reset(self):
+        """Reset the session to the state just after it was started
+
+        Clears the database with ``/clear``, goes back to the ``BEGIN``
+        level and sets the defaults which are set when the session is
+        started. The queue, the message log and the snapshot are dropped as
+        well.
+
+        Returns:
+            None
+
+        """
+        self._snapshot = None
+        self._journal = None
+        self.send("finish")
+        self.send("/clear,nostart")
+        self.send(_DEFAULTS)
+        with self._queue_lock:
+            self._queues.clear()
+        self.messages.clear()
+
+    @property
+    def alive(self):
+        """True if the ansys process is running"""
+        return self.process.isalive()
 
+    @_synchronized
     def send(self, command_string, **kwargs):
         """Sending a command to ansys
 
@@ -203,6 +724,25 @@ class Ansys(object):
         every occurance of a warning for the ansys command ``set,last``.
         For other lines, no action will be taken.
 
+        Errors, warnings and notes from ansys are collected in the
+        ``messages`` attribute of the session as
+        :class:`pansys.interactive.Message` tuples. An error raises a
+        ``RuntimeError`` once ansys is back at its prompt.
+
+        By default every line of a multiline command is sent separately and
+        pansys waits for the ansys prompt before sending the next line. For
+        long blocks of commands this ping-pong dominates the run time. With
+        ``pipeline=True`` the whole block is written to ansys in one go and
+        pansys only waits for a unique marker at the end of the block.
+
+        Example:
+            >>> ans.send("\n".join(commands), pipeline=True)
+
+        In pipeline mode, ansys continues with the remaining lines of the block
+        even if one of the lines fails. The first ``*** ERROR ***`` is raised
+        only after the whole block has been processed, along with the line
+        which caused it.
+
         Args:
             command_string (str): Required. The string containing ansys command
                 silent (bool): Optional. Boolean value which when set true will
@@ -211,6 +751,14 @@ class Ansys(object):
                 process the output from ansys. The output will be passed line
                 by line to this function. silent option should be set to False
                 for this to work.
+            capture (str): Optional. How the output is kept for
+                :attr:`pansys.Ansys.output`. ``full`` keeps everything,
+                ``tail`` keeps the last ``capture_limit`` characters and
+                ``discard`` keeps nothing. Default is the value of the
+                ``capture`` attribute of the session.
+            pipeline (bool): Optional. If True, a multiline
+                ``command_string`` is written to ansys in one go. Default is
+                the value of the ``pipeline`` attribute of the session.
 
         Returns:
             None
@@ -218,63 +766,339 @@ class Ansys(object):
         """
         # Commands are split in to separate commands and executed recursively
         commands = command_string.split("\n")
-        if len(commands) > 1:
+        if len(commands) > 1 and kwargs.pop("pipeline", self.pipeline):
+            self._send_pipelined(commands, **kwargs)
+        elif len(commands) > 1:
             for command in commands:
                 self.send(command, **kwargs)
         elif commands and len(commands) == 1:
-            # Sending the command to ansys
-            self.process.sendline(commands[0])
-            # self._output will contain the output of last executed command
-            self._output = ""
-            for chunk in self.process:
-                self._output += chunk
+            # self._buffer will contain the output of last executed command
+            self._buffer = _OutputBuffer(
+                kwargs.get("capture", self.capture), self.capture_limit)
+            for chunk in self._execute(commands[0]):
+                self._buffer.write(chunk)
                 # Checking if the command was executed silently or not
                 if not kwargs.get("silent", self.silent):
                     # Function to process output, default is print function
                     ofunc = kwargs.get("output_function", print)
                     ofunc(chunk.strip())
-                if any(re.findall(x, chunk) for x in self.prompt_list):
+            return
+
+    def submit(self, command_string, **kwargs):
+        """Send a command to ansys without waiting for it
+
+        The command is added to a queue, which is worked off in the given
+        order by a background thread of the session. The function returns
+        right away with a :class:`concurrent.futures.Future`, so that python
+        can go on with other work while ansys is busy.
+
+        Example:
+            >>> solved = ans.submit("solve")
+            >>> loads = prepare_next_loadcase()
+            >>> solved.result()
+
+        The result of the future is the output of the command, or the error
+        raised by :meth:`pansys.Ansys.send`. The session can still be used
+        directly, from any thread. Such calls wait till the command which is
+        running has finished.
+
+        Args:
+            command_string (str): Required. The string containing ansys
+                command
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            concurrent.futures.Future: The future output of the command.
+        """
+        return self._submit(self._send_output, command_string, **kwargs)
+
+    def _submit(self, fn, *args, **kwargs):
+        """Runs ``fn(*args, **kwargs)`` in the background thread
+
+        Returns:
+            concurrent.futures.Future: The future return value of ``fn``.
+        """
+        future = Future()
+        with self._jobs_lock:
+            if self._jobs is None:
+                self._jobs = Queue()
+                threading.Thread(target=_worker, args=(self._jobs,),
+                                 daemon=True).start()
+            self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    @_synchronized
+    def _send_output(self, command_string, **kwargs):
+        """Sends a command and returns its output"""
+        self.send(command_string, **kwargs)
+        return self.output
+
+    def iter_output(self, command_string):
+        """Iterate over the output of a command as it arrives
+
+        Generator which sends a command to ansys and yields the output line by
+        line while the command is running. Unlike :meth:`pansys.Ansys.send`,
+        the output is not kept in memory, which makes this suitable for long
+        running commands with a lot of output.
+
+        Example:
+
+            >>> for line in ans.iter_output("solve"):
+            ...     if "CONVERGENCE" in line:
+            ...         print(line)
+
+        The generator stops at the ansys prompt, in the same way as
+        :meth:`pansys.Ansys.send` does, and raises a ``RuntimeError`` if
+        ansys reports an error. If the loop is left early, the rest of the
+        output is read and discarded so that the session can be used again.
+
+        Args:
+            command_string (str): Required. The string containing ansys
+                command. Multiline commands are sent one line at a time.
+
+        Yields:
+            str: A line of output from ansys, without the line ending.
+        """
+        with self._lock:
+            self._buffer = _OutputBuffer("discard")
+            for command in command_string.split("\n"):
+                for chunk in self._execute(command):
+                    # A chunk from pexpect can have more than one line
+                    for line in chunk.splitlines():
+                        yield line
+
+    def _execute(self, command):
+        """Sends a single line to ansys and yields the output
+
+        Generator which yields the output of the command line by line till
+        the ansys prompt, including the prompt. A ``RuntimeError`` is raised
+        at the end if ansys reported an error. If the generator is closed
+        before the prompt, the remaining output is read and discarded.
+
+        Args:
+            command (str): A single line of ansys command
+
+        Yields:
+            str: A line of output from ansys
+        """
+        self._invalidate(command)
+        if self._journal is not None and _changes_session(command):
+            self._journal.append(command)
+        self.process.sendline(command)
+        scanner = _Scanner(self._output_regex, command, self.messages)
+        finished = False
+        try:
+            for chunk in self.process:
+                event = scanner.feed(chunk)
+                finished = event is not None
+                if event == _QUESTION:
                     logging.warning(chunk)
+                yield chunk
+                if finished:
                     break
-                if any(re.findall(x, chunk) for x in self.expect_list):
-                    break
-                if '*** ERROR ***' in chunk:
-                    # Each block of ansys output is separated by two sets of
-                    # newline characters
-                    msg = [x for x in chunk.split('\r\n\r\n')
-                           if '*** ERROR ***' in x][0]
-                    raise RuntimeError(msg)
-                if '*** WARNING ***' in chunk:
-                    msg = [x for x in chunk.split('\r\n\r\n')
-                           if '*** WARNING ***' in x][0]
-                    logging.warning(msg)
-                if '*** NOTE ***' in chunk: 
-                    msg = [x for x in chunk.split('\r\n\r\n')
-                           if '*** NOTE ***' in x][0]
-                    logging.info(msg)
+        finally:
+            if not finished:
+                # The consumer stopped early. Reading till the prompt
+                for chunk in self.process:
+                    if scanner.feed(chunk) is not None:
+                        finished = True
+                        break
+        scanner.close()
+        if not finished and not self.process.isalive():
+            self._died([command])
+        if scanner.error is not None:
+            raise RuntimeError(scanner.error.text)
+
+    def _died(self, commands):
+        """Restores the session from its snapshot after ansys died
+
+        Called when ansys exited while running ``commands``. If the session
+        has a snapshot, a new ansys process is started and brought to the
+        state before ``commands`` with :meth:`pansys.Ansys.restore`.
+
+        Raises:
+            OSError: Unless ``commands`` exit ansys, since they did not run.
+        """
+        if any(x.strip().lower().startswith("/exi") for x in commands):
+            return
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise OSError("Ansys died while running {}".format(commands[-1]))
+        journal = snapshot.journal
+        # The commands which killed ansys are not replayed
+        journaled = [x for x in commands if _changes_session(x)]
+        if journaled and journal[-len(journaled):] == journaled:
+            del journal[-len(journaled):]
+        logging.warning("Ansys died while running {}. Restoring the session "
+                        "from {}".format(commands[-1], snapshot.db))
+        self._snapshot = None
+        self._journal = None
+        self._start()
+        self.restore(snapshot)
+        # The journal of the snapshot goes on
+        self._snapshot = snapshot
+        self._journal = journal
+        raise OSError("Ansys died while running {}. The session was "
+                      "restored to the state before it.".format(commands[-1]))
+
+    def _invalidate(self, command):
+        """Clears the cache of get results if ``command`` changes anything"""
+        if self._get_cache and _changes_session(command):
+            self._get_cache.clear()
+
+    def _send_pipelined(self, commands, **kwargs):
+        """Sends a block of commands without waiting for the prompts
+
+        All the commands are written to ansys followed by a ``/com`` command
+        with a unique marker. The output is then read till the marker and the
+        prompt following it is seen. The prompts in between are only counted
+        to find out which line caused an error.
+
+        Args:
+            commands (list): The lines to be sent to ansys
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        commands = [x.strip() for x in commands if x.strip()]
+        if not commands:
+            # Nothing but blank lines, which have no output
+            self._buffer = _OutputBuffer(kwargs.get("capture", self.capture),
+                                         self.capture_limit)
             return
+        for command in commands:
+            self._invalidate(command)
+        if self._journal is not None:
+            self._journal.extend(x for x in commands if _changes_session(x))
+        marker = "PANSYS_{}".format(uuid4().hex.upper())
+        # The echo of the command is "/com,PANSYS_..." whereas the output of
+        # the command is the marker alone in a line.
+        marker_re = re.compile(r"^\s*{}\s*$".format(marker), re.IGNORECASE)
+        self._buffer = _OutputBuffer(kwargs.get("capture", self.capture),
+                                     self.capture_limit)
+        nprompts = 0
+        done = False
+        scanner = _Scanner(self._output_regex, commands[0], self.messages)
+        lines = self._pipeline(commands + ["/com,{}".format(marker)])
+        try:
+            for chunk in lines:
+                self._buffer.write(chunk)
+                if not kwargs.get("silent", self.silent):
+                    ofunc = kwargs.get("output_function", print)
+                    ofunc(chunk.strip())
+                event = scanner.feed(chunk)
+                if event == _QUESTION:
+                    logging.warning(chunk)
+                elif event == _PROMPT:
+                    if done:
+                        break
+                    nprompts += 1
+                    scanner.command = commands[min(nprompts,
+                                                   len(commands) - 1)]
+                elif marker in chunk.upper() and marker_re.match(chunk):
+                    done = True
+        except pexpect.EOF:
+            # Ansys exited, which is fine only after /exit
+            self._died(commands)
+        finally:
+            lines.close()
+        scanner.close()
+        if scanner.error is not None:
+            raise RuntimeError("{}\nThe error was caused by: {}".format(
+                scanner.error.text, scanner.error.command))
+
+    def _pipeline(self, commands):
+        """Writes commands to ansys while reading the output
+
+        Generator which writes the commands to ansys one line at a time and
+        yields the output from ansys line by line. Output is read in between
+        the writes, so that neither side blocks on a full terminal buffer.
+        Output which is not consumed when the generator is closed is handed
+        back to the pexpect buffer.
 
-    def queue(self, command_string):
+        Args:
+            commands (list): The lines to be written to ansys
+
+        Yields:
+            str: A line of output from ansys
+        """
+        commands = list(reversed(commands))
+        pending = self.process.buffer
+        self.process.buffer = ""
+        fd = self.process.child_fd
+        # pexpect waits a little before every send by default, which would
+        # defeat the purpose of pipelining.
+        delay = self.process.delaybeforesend
+        self.process.delaybeforesend = None
+        try:
+            while True:
+                while "\n" in pending:
+                    line, pending = pending.split("\n", 1)
+                    yield line + "\n"
+                readable, writable, _ = select.select(
+                    [fd], [fd] if commands else [], [])
+                if readable:
+                    pending += self.process.read_nonblocking(
+                        self.process.maxread, timeout=0)
+                elif writable:
+                    self.process.sendline(commands.pop())
+        finally:
+            self.process.delaybeforesend = delay
+            self.process.buffer = pending + self.process.buffer
+
+    @property
+    def _output_regex(self):
+        """Compiled regular expression for the ansys prompts and messages
+
+        The ``expect_list`` and ``prompt_list`` are combined in to a single
+        regular expression so that each line of output is scanned only once.
+        The expression is compiled again only if one of the lists changed.
+        """
+        return _compile_output_regex(tuple(self.expect_list),
+                                     tuple(self.prompt_list))
+
+    def queue(self, command_string, name="default"):
         """Queue commands for delayed execution
 
         When there is a large number of ansys commands that you want to pass,
         use this function to queue up them for execution. To execute the queue,
         use the :meth:`pansys.Ansys.run_queue` method.
 
+        The commands are kept in memory. There can be several queues, which
+        are told apart by their ``name``.
+
+            >>> ans.queue("n,1,0,0,0", name="nodes")
+            >>> ans.queue("e,1,2", name="elements")
+            >>> ans.run_queue("nodes")
+
+        A queue is run automatically once it has more lines than the
+        ``queue_max_lines`` attribute of the session, or more characters
+        than ``queue_max_bytes``. Both are None by default, which means that
+        the queue is only run with :meth:`pansys.Ansys.run_queue`.
+
         Args:
             command_string (str): Required. The command that you want to add
                 to the queue.
+            name (str): Optional. The name of the queue.
 
         Returns:
             None
 
         """
-
-        if self.__buffer_file.closed:
-            self.__buffer_file = open(self.__buffer_file.name, 'w')
-        self.__buffer_file.writelines(command_string + "\n")
-
-    def run_queue(self, **kwargs):
+        with self._queue_lock:
+            lines, size = self._queues.get(name, ([], 0))
+            lines.append(command_string + "\n")
+            size += len(lines[-1])
+            self._queues[name] = lines, size
+        if (self.queue_max_lines is not None and
+                len(lines) > self.queue_max_lines) or \
+                (self.queue_max_bytes is not None and
+                 size > self.queue_max_bytes):
+            self.run_queue(name)
+
+    def run_queue(self, name="default", wait=True, **kwargs):
         """Runs all the commands in the queue
 
         This method writes all the commands that are queued using the
@@ -283,29 +1107,62 @@ class Ansys(object):
         the :meth:`pansys.Ansys.send` method and hence will accept all keyword
         arguments of the same method.
 
+        The queue is emptied right away. With ``wait=False`` the commands are
+        run in the background, as with :meth:`pansys.Ansys.submit`, so that
+        the next batch of commands can be queued while ansys is working.
+
+            >>> run = ans.run_queue(wait=False)
+            >>> for i in range(1000):
+            ...     ans.queue("n,{},{}".format(i + 1000, i))
+            >>> run.result().seconds
+            0.52
+
         Args:
+            name (str): Optional. The name of the queue.
+            wait (bool): Optional. If False, return without waiting for
+                ansys to run the commands.
             kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
 
         Returns:
-            None
-
+            pansys.interactive.QueueRun: The number of lines and the time taken.
+                A :class:`concurrent.futures.Future` of it if ``wait`` is
+                False.
         """
-
-        if not self.__buffer_file.closed:
-            self.__buffer_file.close()
-        self.send('/input,input,inp', **kwargs) 
-        self.__buffer_file = open(self.__buffer_file.name, 'w')
-
-    def get_queue(self):
+        with self._queue_lock:
+            lines, size = self._queues.pop(name, ([], 0))
+        if wait:
+            return self._run_lines(name, lines, size, **kwargs)
+        return self._submit(self._run_lines, name, lines, size, **kwargs)
+
+    @_synchronized
+    def _run_lines(self, name, lines, size, **kwargs):
+        """Runs the lines of a queue from a file"""
+        start = time.perf_counter()
+        if lines:
+            with self._macro(**kwargs) as f:
+                f.writelines(lines)
+        run = QueueRun(name, len(lines), size, time.perf_counter() - start)
+        self.queue_runs.append(run)
+        logging.info("Queue {} with {} lines ran in {:.3f} s".format(
+            name, run.lines, run.seconds))
+        return run
+
+    def get_queue(self, name="default"):
         """Returns a generator with the commands in the current queue,
         submitted using the :meth:`pansys.Ansys.queue` method.
 
+        Args:
+            name (str): Optional. The name of the queue.
+
         Returns:
             object: A file object pointing to the command list
 
         """
-        return open(self.__buffer_file.name, 'r')
+        with self._queue_lock:
+            lines, _ = self._queues.get(name, ([], 0))
+            return io.StringIO("".join(lines))
 
+    @_synchronized
     def plot(self, command_string):
         """Plot anything in ansys
 
@@ -324,13 +1181,13 @@ class Ansys(object):
         # Enable JPEG output from ansys plot commands
         self.send("/SHOW,JPEG")
         if command_string:
-            self.send(command_string)
+            self.send(command_string, capture="full")
         else:
             # If not command string was passed, just replot the window
-            self.send("/replot")
+            self.send("/replot", capture="full")
         # Extract the image file name from ansys output
         image_name = re.search("WRITTEN TO FILE (\w*.jpg)",
-                               self._output).group(1)
+                               self.output).group(1)
         if image_name:
             image_file = os.path.join(self._wd, image_name)
             self.send("/SHOW,CLOSE")
@@ -338,6 +1195,7 @@ class Ansys(object):
         else:
             return None
 
+    @_synchronized
     def get(self, entity, entnum, item1, it1num="", item2="", it2num=""):
         """Wrapper for ansys ``*GET`` command
 
@@ -356,41 +1214,663 @@ class Ansys(object):
             All arguments are in the same order as per ansys ``*get``
             documentation.
 
+        The results can be cached by setting the ``cache_size`` attribute of
+        the session to the number of results to be kept. The least recently
+        used results are dropped first. The cache is cleared by any command
+        which may change the result of a ``*get``, like a change of the
+        processor or the selection. Only commands which are known to change
+        nothing, eg. ``/com``, ``*get`` or listings, keep the cache.
+        Queries of parameters are never cached.
+
+            >>> ans.cache_size = 100
+            >>> ans.get("node", "", "count")  # Sent to ansys
+            8
+            >>> ans.get("node", "", "count")  # From the cache
+            8
+
         Returns:
             Output of ``*get``. Can be int, float, exponential or string.
         """
-        if not entnum:
-            entnum = 0
+        key = tuple(str(x).strip().lower() for x in (entity, entnum, item1,
+                                                        it1num, item2, it2num))
+        # Parameters are changed by commands which are not looked at
+        cache = self.cache_size > 0 and key[0] != "parm"
+        if cache and key in self._get_cache:
+            self._get_cache.move_to_end(key)
+            return self._get_cache[key]
         self.send("*del,mypar__")
-        self.send("*get,mypar__,{},{},{},{},{},{}".format(
-                          entity, entnum, item1, it1num, item2, it2num))
-        self.send("/com,%%mypar__%")
-        mypar = self._output.split("\n")[1].strip()
+        self.send(_get_command("mypar__", entity, entnum, item1, it1num,
+                               item2, it2num))
+        self.send("/com,%%mypar__%", capture="full")
+        mypar = self.output.split("\n")[1].strip()
         if "mypar__" in mypar:
             raise ValueError("The *get command did not yield any value")
-        return return_value(mypar)
+        value = return_value(mypar)
+        if cache:
+            self._get_cache[key] = value
+            while len(self._get_cache) > self.cache_size:
+                self._get_cache.popitem(last=False)
+        return value
+
+    @_synchronized
+    def get_many(self, queries, **kwargs):
+        """Run several ``*GET`` commands in one go
+
+        Function to execute many unrelated ``*get`` commands with a single
+        round trip to ansys. Each query is a tuple with the arguments of
+        :meth:`pansys.Ansys.get`. The values are stored in separate
+        parameters in ansys and read back from the output of one pipelined
+        block of commands.
+
+        Example:
+
+            >>> ans.get_many([("node", "", "count"),
+            ...               ("node", "", "num", "max")])
+            {('node', '', 'count'): 11, ('node', '', 'num', 'max'): 11}
+
+        The queries can also be given as a dictionary, in which case the keys
+        of the dictionary are used as the keys of the result.
+
+            >>> ans.get_many({"ncount": ("node", "", "count"),
+            ...               "time": ("active", "", "set", "time")})
+            {'ncount': 11, 'time': 1.0}
+
+        Args:
+            queries (list or dict): The ``*get`` queries as tuples of
+                arguments in the same order as :meth:`pansys.Ansys.get`.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            dict: The output of each query, converted the same way as
+                :meth:`pansys.Ansys.get` does.
+        """
+        if not isinstance(queries, dict):
+            queries = {tuple(x): x for x in queries}
+        keys = list(queries)
+        if not keys:
+            return {}
+        commands = []
+        for i, key in enumerate(keys):
+            commands.append("*del,pansys_g{}__".format(i))
+            commands.append(_get_command("pansys_g{}__".format(i),
+                                         *queries[key]))
+        for i in range(len(keys)):
+            commands.append("/com,PANSYS_G{0}=%pansys_g{0}__%".format(i))
+        kwargs["pipeline"] = True
+        kwargs["capture"] = "full"
+        self.send("\n".join(commands), **kwargs)
+        # The echo of the commands start with "/com," and are not matched
+        values = dict(re.findall(r"^\s*PANSYS_G(\d+)=(.*?)\s*$",
+                                 self.output, re.MULTILINE))
+        result = {}
+        for i, key in enumerate(keys):
+            value = values.get(str(i), "pansys_g")
+            if "pansys_g" in value.lower():
+                raise ValueError("The *get command {} did not yield any value"
+                                 .format(queries[key]))
+            result[key] = return_value(value)
+        return result
+
+    @_synchronized
+    def get_array(self, entity, item1, it1num="", item2="", it2num="",
+                  count=None, **kwargs):
+        """Wrapper for ansys ``*VGET`` command
+
+        Function to extract an item for all the entities in one go as a
+        :class:`numpy.ndarray`. The array is filled in ansys with ``*VGET``
+        and written to a file with ``*VWRITE``, which is then read in
+        directly. This is much faster than calling :meth:`pansys.Ansys.get`
+        for every entity.
+
+        Example:
+
+            >>> x = ans.get_array("node", "loc", "x")
+            >>> ux = ans.get_array("node", "u", "x")
+
+        Element ``i`` of the returned array corresponds to the entity number
+        ``i+1``. Values of entities which are not defined or not
+        selected are as returned by ansys, which is usually zero. Use the
+        select status to filter them out.
+
+            >>> nsel = ans.get_array("node", "nsel")
+
+        Args:
+            entity (str): The entity keyword, eg. ``node``, ``elem``
+            item1 (str):
+            it1num (str):
+            item2 (str):
+            it2num (str):
+            count (int): Optional. The number of entities to extract. Default
+                is the maximum entity number as given by ansys.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        .. note::
+            All arguments other than ``count`` are in the same order as per
+            ansys ``*vget`` documentation.
+
+        Returns:
+            numpy.ndarray: Array of floats with one value per entity.
+        """
+        if count is None:
+            count = int(self.get(entity, 0, "num", "max"))
+        if count == 0:
+            # Ansys does not allow an array of size zero
+            return np.empty(0)
+        output_file = "pansys_{}".format(uuid4().hex)
+        commands = [
+            "*del,pansys_arr__",
+            "*dim,pansys_arr__,array,{}".format(count),
+            "*vget,pansys_arr__(1),{},1,{},{},{},{}".format(
+                entity, item1, it1num, item2, it2num),
+            "*cfopen,{},txt".format(output_file),
+            "*vwrite,pansys_arr__(1)",
+            "(E24.16)",
+            "*cfclos",
+        ]
+        output_file = os.path.join(self._wd, output_file + ".txt")
+        journal = self._journal
+        try:
+            # Internal commands, which are not replayed from a snapshot
+            self._journal = None
+            try:
+                self._run_macro(commands, **kwargs)
+            finally:
+                # Unless ansys died and the session was restored
+                if self._journal is None:
+                    self._journal = journal
+            self._pull(output_file, remove=True)
+            return np.loadtxt(output_file, ndmin=1)
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+
+    @_synchronized
+    def get_parameters(self, names=None, **kwargs):
+        """Get the values of many parameters in one go
+
+        Function to read all the parameters of the session with a single
+        command. The parameters are written to a file with ``PARSAV``, which
+        is then parsed in one pass. Arrays are returned as
+        :class:`numpy.ndarray`. See :func:`pansys.utility_functions.read_parameters`.
+
+        Example:
+
+            >>> ans.send("width=2.5")
+            >>> ans.send("*dim,loads,array,3")
+            >>> ans.get_parameters()
+            {'loads': array([0., 0., 0.]), 'width': 2.5}
+            >>> ans.get_parameters(["width"])
+            {'width': 2.5}
+
+        Parameters whose names start or end with an underscore are used by
+        ansys and pansys internally and are left out.
+
+        Args:
+            names (list): Optional. The names of the parameters to return.
+                Default is all the parameters.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            dict: The value of each parameter, by its name in lower case.
+        """
+        name = "pansys_{}".format(uuid4().hex)
+        path = os.path.join(self._wd, name + ".prm")
+        try:
+            self.send("parsav,all,{},prm".format(name), **kwargs)
+            self._pull(path, remove=True)
+            params = read_parameters(path)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        if names is not None:
+            names = set(x.lower() for x in names)
+            return {x: y for x, y in params.items() if x in names}
+        return {x: y for x, y in params.items()
+                if not x.startswith("_") and not x.endswith("_")}
+
+    def set_parameters(self, params, **kwargs):
+        """Set the values of many parameters in one go
+
+        Function to define many parameters, including arrays, with a single
+        command. The parameters are written to a file in the format of
+        ``PARSAV``, which is then read in by ansys. Existing arrays of the
+        same name are replaced.
+
+        Example:
+
+            >>> ans.set_parameters({"width": 2.5, "mat": "steel",
+            ...                     "loads": np.array([1.0, 2.0, 3.0])})
+
+        Args:
+            params (dict): The values by parameter name. Values can be
+                numbers, strings or arrays of up to 3 dimensions.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        if not params:
+            return
+        with self._macro(**kwargs) as f:
+            write_parameters(f, params)
+
+    @_synchronized
+    def snapshot(self, path=None, **kwargs):
+        """Take a snapshot of the session
+
+        Function to save the state of the session, so that it can be brought
+        back later, or in another session, with
+        :meth:`pansys.Ansys.restore`. The database is saved with ``SAVE``
+        and the parameters with ``PARSAV``. Every command sent after that
+        which changes the session is recorded in the journal of the
+        snapshot. Listings and the internal commands of functions like
+        :meth:`pansys.Ansys.get_list` are left out.
+
+        Example:
+
+            >>> ans.send("/prep7")
+            >>> ...  # A long preprocessing
+            >>> snap = ans.snapshot()
+            >>> ans.send("/solu")
+            >>> ans.send("solve")
+
+        If ansys dies while a command is running, a new ansys process is
+        started and restored from the last snapshot, replaying the journal up
+        to the command which was running. An ``OSError`` is then raised for
+        the command, which can be sent again.
+
+        A snapshot can also bring a new session, eg. from a
+        :class:`pansys.AnsysPool`, to the same state:
+
+            >>> with pool.session() as other:
+            ...     other.restore(snap)
+
+        Args:
+            path (str): Optional. Path of the snapshot files, without the
+                extension. Default is a new name in the working folder. Give
+                a path outside the working folder if the snapshot should be
+                kept after a session with ``cleanup`` has exited.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            pansys.interactive.Snapshot: The snapshot, with the paths of the
+                ``.db`` and ``.prm`` files.
+        """
+        if path is None:
+            path = os.path.join(self._wd, "pansys_{}".format(uuid4().hex))
+        path = os.path.abspath(path)
+        self._snapshot = None
+        self._journal = None
+        processor = _PROCESSORS.get(self.get("active", 0, "rout"), "finish")
+        self.send("save,{},db".format(path), **kwargs)
+        self.send("parsav,all,{},prm".format(path), **kwargs)
+        snapshot = Snapshot(path + ".db", path + ".prm", processor, [])
+        self._pull(snapshot.db)
+        self._pull(snapshot.parameters)
+        self._snapshot = snapshot
+        self._journal = snapshot.journal
+        return snapshot
+
+    @_synchronized
+    def restore(self, snapshot, **kwargs):
+        """Bring the session to the state of a snapshot
+
+        Resumes the database and the parameters of a snapshot taken with
+        :meth:`pansys.Ansys.snapshot`, enters the processor the session was
+        in and replays the journal of the snapshot. Errors in the journal
+        are ignored, as they were when the commands were first sent.
+
+        The session then records its own journal, starting from the one of
+        the snapshot, and is restored from it if ansys dies.
+
+        Args:
+            snapshot (pansys.interactive.Snapshot): The snapshot
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        self._snapshot = None
+        self._journal = None
+        path = os.path.splitext(snapshot.db)[0]
+        self._push(snapshot.db)
+        self._push(snapshot.parameters)
+        self.send("finish", **kwargs)
+        self.send("resume,{},db".format(path), **kwargs)
+        self.send("parres,change,{},prm".format(path), **kwargs)
+        self.send(snapshot.processor, **kwargs)
+        # Single lines are pipelined, up to the next macro
+        lines = []
+        for entry in snapshot.journal + [None]:
+            if entry is not None and "\n" not in entry:
+                lines.append(entry)
+                continue
+            try:
+                if lines:
+                    self.send("\n".join(lines), **dict(kwargs, pipeline=True))
+            except RuntimeError:
+                pass
+            lines = []
+            try:
+                if entry is not None:
+                    with self._macro(**kwargs) as f:
+                        f.write(entry)
+            except RuntimeError:
+                pass
+        self._snapshot = snapshot._replace(journal=list(snapshot.journal))
+        self._journal = self._snapshot.journal
+
+    def _run_macro(self, commands, **kwargs):
+        """Runs a list of commands from a file
+
+        Commands like ``*VWRITE`` which need a format line are not allowed to
+        be run interactively in all versions of ansys. Such commands are
+        written to a temporary file in the working directory and run with
+        the ``/input`` command.
+
+        Args:
+            commands (list): The lines to be run
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        with self._macro(**kwargs) as f:
+            f.write("\n".join(commands) + "\n")
+
+    @contextmanager
+    def _macro(self, **kwargs):
+        """Context manager for a temporary input file
+
+        The file is opened for writing in the working directory, and run
+        with the ``/input`` command at the end of the block. It is deleted
+        afterwards.
+
+        Args:
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Yields:
+            file: The file object to write the commands to.
+        """
+        macro = "pansys_{}".format(uuid4().hex)
+        macro_file = os.path.join(self._wd, macro + ".inp")
+        journal = self._journal
+        pushed = False
+        try:
+            with open(macro_file, "w") as f:
+                yield f
+            pushed = True
+            self._push(macro_file)
+            if journal is None:
+                self.send("/input,{},inp".format(macro), **kwargs)
+                return
+            # The file is deleted, so its contents are journaled instead
+            with open(macro_file, "r") as f:
+                text = f.read()
+            self._journal = None
+            try:
+                self.send("/input,{},inp".format(macro), **kwargs)
+            finally:
+                # Unless ansys died and the session was restored
+                if self._journal is None:
+                    self._journal = journal
+                    journal.append(text)
+        finally:
+            self._remove(macro_file, pushed)
+
+    @_synchronized
+    def put_nodes(self, ids, xyz, **kwargs):
+        """Create many nodes in one go
+
+        Function to create the nodes of a mesh from arrays. The nodes are
+        written to a file as an ``NBLOCK``, which ansys reads in one go. This
+        is much faster than sending an ``N`` command for every node.
+
+        Example:
+
+            >>> ans.send("/prep7")
+            >>> ans.put_nodes([1, 2, 3], [[0, 0, 0], [1, 0, 0], [2, 0, 0]])
+
+        Args:
+            ids (array_like): The node numbers
+            xyz (array_like): The coordinates of the nodes, with one row per
+                node. Missing ``Y`` and ``Z`` columns are taken as zero.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        .. note::
+            ``NBLOCK`` is a ``PREP7`` command.
+
+        Returns:
+            None
+
+        """
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        if len(ids) == 0:
+            return
+        xyz = np.asarray(xyz, dtype=np.float64).reshape(len(ids), -1)
+        if xyz.shape[1] > 3:
+            raise ValueError("The coordinates should have at most 3 columns")
+        table = np.zeros((len(ids), 6))
+        table[:, 0] = ids
+        table[:, 3:3 + xyz.shape[1]] = xyz
+        width = _int_width(ids)
+        with self._macro(**kwargs) as f:
+            f.write("nblock,3,,{},{}\n(3i{},3e21.13e3)\n".format(
+                ids.max(), len(ids), width))
+            _write_table(f, table,
+                         "%{0}d%{0}d%{0}d%21.13e%21.13e%21.13e".format(width))
+            f.write("n,r5.3,loc,-1,\n")
+
+    @_synchronized
+    def put_elements(self, ids, nodes, etype=1, mat=1, real=1, secnum=1,
+                     esys=0, **kwargs):
+        """Create many elements in one go
+
+        Function to create elements from arrays. The elements are written to
+        a file as an ``EBLOCK``, which ansys reads in one go. The element
+        attributes are the same for all the elements.
+
+        Example:
+
+            >>> ans.put_elements([1, 2], [[1, 2, 5, 4], [2, 3, 6, 5]],
+            ...                  etype=1, mat=2)
+
+        Args:
+            ids (array_like): The element numbers
+            nodes (array_like): The node numbers of the elements, with one
+                row per element in the order of the element type.
+            etype (int): Element type number
+            mat (int): Material number
+            real (int): Real constant set number
+            secnum (int): Section number
+            esys (int): Element coordinate system number
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        .. note::
+            ``EBLOCK`` is a ``PREP7`` command. The nodes should exist
+            already.
+
+        Returns:
+            None
+
+        """
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        if len(ids) == 0:
+            return
+        nodes = np.asarray(nodes, dtype=np.int64).reshape(len(ids), -1)
+        count = nodes.shape[1]
+        if count > 20:
+            raise ValueError("An element can have at most 20 nodes")
+        table = np.zeros((len(ids), 11 + count), dtype=np.int64)
+        table[:, :5] = [mat, etype, real, secnum, esys]
+        table[:, 8] = count
+        table[:, 10] = ids
+        table[:, 11:] = nodes
+        width = _int_width(table)
+        # The nodes after the 8th go to a second line
+        fmt = "%{}d".format(width)
+        fmt = fmt * (11 + min(count, 8)) + ("\n" + fmt * (count - 8)
+                                            if count > 8 else "")
+        with self._macro(**kwargs) as f:
+            f.write("eblock,19,solid,,{}\n(19i{})\n".format(len(ids), width))
+            _write_table(f, table, fmt)
+            f.write("-1\n")
+
+    def put_loads(self, ids, label, values, **kwargs):
+        """Apply nodal loads to many nodes in one go
+
+        Function to apply ``F`` loads from arrays. See
+        :meth:`pansys.Ansys.put_constraints`.
+
+        Example:
+
+            >>> ans.put_loads([10, 11], "fy", [-100.0, -50.0])
+
+        Args:
+            ids (array_like): The node numbers
+            label (str): The load label, eg. ``FX``, ``HEAT``
+            values (array_like): The load for each node, or a single value
+                for all the nodes.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        self._put_nodal("f", ids, label, values, **kwargs)
+
+    def put_constraints(self, ids, label, values=0.0, **kwargs):
+        """Apply constraints to many nodes in one go
+
+        Function to apply ``D`` constraints from arrays. The node numbers and
+        values are written to a file, which is read in to an array parameter
+        with ``*VREAD``. The constraints are then applied in a ``*DO`` loop
+        within ansys, instead of sending a command for every node.
+
+        Example:
+
+            >>> ans.put_constraints(fixed_nodes, "all")
+            >>> ans.put_constraints([5, 6], "ux", [0.1, 0.2])
+
+        Args:
+            ids (array_like): The node numbers
+            label (str): The degree of freedom label, eg. ``UX``, ``ALL``
+            values (array_like): The value for each node, or a single value
+                for all the nodes. Default is zero.
+            kwargs: Optional. See keyword args for :meth:`pansys.Ansys.send`
+
+        Returns:
+            None
+
+        """
+        self._put_nodal("d", ids, label, values, **kwargs)
+
+    @_synchronized
+    def _put_nodal(self, command, ids, label, values, **kwargs):
+        """Runs a nodal command like ``F`` or ``D`` for arrays of nodes"""
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        if len(ids) == 0:
+            return
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64),
+                                 ids.shape)
+        data = "pansys_{}".format(uuid4().hex)
+        data_file = os.path.join(self._wd, data + ".txt")
+        width = _int_width(ids)
+        with open(data_file, "w") as f:
+            _write_table(f, np.column_stack([ids, values]),
+                         "%{}d%24.16e".format(width))
+        try:
+            self._push(data_file)
+            with self._macro(**kwargs) as f:
+                f.write("\n".join([
+                    "*del,pansys_ld__,,nopr",
+                    "*dim,pansys_ld__,array,{},2".format(len(ids)),
+                    "*vread,pansys_ld__(1,1),{},txt,,jik,2,{}".format(
+                        data, len(ids)),
+                    "(f{}.0,e24.16)".format(width),
+                    "*do,pansys_i__,1,{}".format(len(ids)),
+                    "{},pansys_ld__(pansys_i__,1),{},pansys_ld__(pansys_i__,2)"
+                    .format(command, label),
+                    "*enddo",
+                    "*del,pansys_ld__,,nopr",
+                ]) + "\n")
+        finally:
+            self._remove(data_file, True)
+
+    def result_file(self, jobname="file"):
+        """Open the result file of the session
+
+        Function to read the binary result file in the working directory
+        directly, without going through ansys. See
+        :class:`pansys.results.ResultFile`.
+
+        Example:
+
+            >>> rst = ans.result_file()
+            >>> u = rst.nodal_solution(1)
+
+        Args:
+            jobname (str): The job name of the analysis. Default is ``file``.
+
+        Returns:
+            pansys.results.ResultFile: The result file ``jobname.rst``.
+        """
+        return ResultFile(os.path.join(self._wd, jobname + ".rst"))
 
     @property
     def version(self):
         """The version of ansys for the current active session."""
-        return self.get("active", "", "rev")
+        if self._version is None:
+            self._version = self.get("active", "", "rev")
+        return self._version
 
     @property
     def wd(self):
         """Current working directory where Ansys is running."""
         return self._wd
 
+    def _push(self, path):
+        """Copies a file of the working folder to the remote system"""
+        if not self._shared:
+            self._remote.push(path, path)
+
+    def _pull(self, path, remove=False):
+        """Copies a file of the working folder from the remote system"""
+        if not self._shared:
+            self._remote.pull(path, path, remove=remove)
+
+    def _remove(self, path, pushed=False):
+        """Deletes a temporary file of the working folder
+
+        Args:
+            path (str): Path of the file
+            pushed (bool): Optional. If True, the copy of the file on the
+                remote system is deleted too.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        if pushed and not self._shared:
+            self._remote.remove(path)
+
     @property
     def output(self):
         """The output of the last executed Ansys command"""
-        return self._output
+        return self._buffer.getvalue()
 
+    @_synchronized
     def get_output(self, command_string, persist=False):
         """Function to get ansys output as a file
 
         The function uses ``/output`` command in ansys to redirect the output
         to a file. The path to this file will be returned from the command.
 
+        For a session on a remote system, which does not share the working
+        folder, the file is copied to the local working folder. See
+        :meth:`pansys.remote.SSHConnection.pull`.
+
         Args:
             command_string (str): The command(s) to be executed for which the
                 output is sought.
@@ -404,17 +1884,105 @@ class Ansys(object):
                 call.
         """
         if persist:
-            from uuid import uuid4
             output_file = str(uuid4())
         else:
             output_file = "out.out"
+        output_file = os.path.join(self._wd, output_file)
+        self._redirect(command_string, output_file)
+        self._pull(output_file)
+        return output_file
+
+    def _redirect(self, command_string, output_file, ext=""):
+        """Runs a command with its output written to a file
 
-        self.send("/output,{}".format(output_file))
-        self.send(command_string)
-        self.send("/output")
-        return os.path.join(self._wd, output_file)
+        Args:
+            command_string (str): The command(s) to be executed
+            output_file (str): Path of the file in the working folder,
+                without the extension
+            ext (str): Optional. Extension of the file
+        """
+        self.send("/output,{},{}".format(os.path.basename(output_file), ext))
+        try:
+            self.send(command_string)
+        finally:
+            self.send("/output")
 
-    def get_list(self, command_string, **kwargs):
+    @contextmanager
+    def output_file(self, command_string):
+        """Context manager which gives the ansys output as a file
+
+        Same as :meth:`pansys.Ansys.get_output`, but the output is written to
+        a new file for every call, which is deleted at the end of the block.
+
+            >>> with ans.output_file("prnsol,u") as f:
+            ...     shutil.copy(f, "displacements.txt")
+
+        Args:
+            command_string (str): The command(s) to be executed for which the
+                output is sought.
+
+        Yields:
+            str: Path to a file which contains the output of the ansys command
+                call.
+        """
+        output_file = os.path.join(self._wd,
+                                   "pansys_{}".format(uuid4().hex))
+        try:
+            with self._lock:
+                self._redirect(command_string, output_file, "out")
+                output_file += ".out"
+                self._pull(output_file, remove=True)
+            yield output_file
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+
+    def _read_fifo(self, command_string):
+        """Runs a list command with the output going through a named pipe
+
+        The output is parsed by a thread while ansys writes it, so that it
+        never goes to the disk.
+
+        Args:
+            command_string (str): The list command
+
+        Returns:
+            pandas.DataFrame: The table in the output.
+        """
+        name = "pansys_{}".format(uuid4().hex)
+        path = os.path.join(self._wd, name + ".fifo")
+        os.mkfifo(path)
+        result = {}
+
+        def reader():
+            try:
+                with open(path, "rb") as fh:
+                    result["df"] = read_list_stream(fh)
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            self._redirect(command_string, os.path.join(self._wd, name),
+                           "fifo")
+        finally:
+            # If ansys did not open the pipe, the reader is still waiting
+            # for a writer to show up.
+            while thread.is_alive():
+                try:
+                    os.close(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+                except OSError:
+                    pass
+                thread.join(0.1)
+            os.remove(path)
+        if "error" in result:
+            raise result["error"]
+        return result["df"]
+
+    @_synchronized
+    def get_list(self, command_string, chunksize=None, compact=None,
+                 fifo=None, **kwargs):
         """Extract any list from ansys
 
         Function to get any ansys list as a :class:`pandas.DataFrame`.
@@ -430,26 +1998,75 @@ class Ansys(object):
             For example, instead of using ``a.get_list("elist")`` you should
             use ``a.get_list("elist,,,,1")`` For getting element list.
 
-        This function passess all keyword arguments directly to
-        :func:`pandas.read_table` function. The default values of
-        ``delim_whitespace`` is ``True`` and ``skiprows`` is 2.
+        The output is parsed in a single pass by
+        :func:`pansys.utility_functions.read_list`, which finds the column
+        names and skips titles and headers which are repeated at page breaks.
+
+        For very long lists, use ``chunksize`` to get an iterator over pieces
+        of the list instead of one big :class:`pandas.DataFrame`. The output
+        file is read progressively, so that only one piece is held in memory.
+
+            >>> for df in a.get_list("prnsol,s,comp", chunksize=100000):
+            ...     smax = max(smax, df.SEQV.max())
+
+        To save memory, the columns can be converted to compact types with
+        ``compact=True``: ``int32`` for integers, ``float32`` for floats and
+        ``category`` for text. By default, this is done for the lists of
+        ``NLIST``, ``ELIST``, ``PRNSOL`` and ``PRESOL``, keeping the nodal
+        coordinates in double precision. Use ``compact=False`` to get the
+        default pandas types for every list.
+
+        The output is written to a new file for every call, which is deleted
+        once it is parsed. For local sessions, the output can instead be
+        sent through a named pipe with ``fifo=True``, or by setting the
+        ``fifo`` attribute of the session. The list is then parsed while
+        ansys writes it and never touches the disk. This is not done if
+        ``chunksize`` or any keyword arguments are given.
+
+        If any keyword arguments are given, they are passed directly to the
+        :func:`pandas.read_table` function instead. The default separator is
+        whitespace and the default ``skiprows`` is calculated from the
+        output. The compact types still apply, except to the columns given
+        a ``dtype``.
 
         Args:
             command_string (str): The Ansys command which will output a column
                 data.
+            chunksize (int): Optional. If given, an iterator of
+                :class:`pandas.DataFrame` with at most ``chunksize`` rows each
+                is returned.
+            compact (bool): Optional. If True, convert the columns to compact
+                types. Default is to do so only for known list commands.
+            fifo (bool): Optional. If True, read the output through a named
+                pipe. Default is the value of the ``fifo`` attribute of the
+                session.
             **kwargs: All keyword arguments for the read_table function in
                 pandas is applicable for this function as well.
 
         Returns:
             pandas.Dataframe: A :class:`pandas.DataFrame` with the data that
-                ansys returned when ``command_string`` was passed.
+                ansys returned when ``command_string`` was passed. An iterator
+                of :class:`pandas.DataFrame` if ``chunksize`` is given.
         """
         command_string = command_string.lower()
-        f = self.get_output(command_string)
-        if "delim_whitespace" not in kwargs:
-            kwargs["delim_whitespace"] = True
-        if "skiprows" not in kwargs:
-            kwargs["skiprows"] = calculate_skip_rows(f, 5)
-        if "skip_blank_lines" not in kwargs:
-            kwargs["skip_blank_lines"] = True
-        return pd.read_table(os.path.join(self._wd, "out.out"), **kwargs)
+        if fifo is None:
+            fifo = self.fifo
+        if fifo and not chunksize and not kwargs and self._remote is None:
+            df = self._read_fifo(command_string)
+            convert = _list_converter(command_string, compact)
+            return convert(df) if convert else df
+        f = os.path.join(self._wd, "pansys_{}".format(uuid4().hex))
+        self._redirect(command_string, f, "out")
+        f += ".out"
+        try:
+            self._pull(f, remove=True)
+            df = _parse_list(f, command_string, chunksize, compact, **kwargs)
+        except BaseException:
+            # The file may not have been copied from a remote system
+            if os.path.exists(f):
+                os.remove(f)
+            raise
+        if chunksize:
+            return _removing(df, f)
+        os.remove(f)
+        return df
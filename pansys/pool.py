@@ -0,0 +1,312 @@
+"""
+Pool of ansys sessions
+
+Starting an ansys session takes time and a license. A pool keeps a number of
+sessions running and hands them out for reuse.
+
+"""
+import concurrent.futures
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from queue import Queue, Empty
+
+from .interactive import Ansys
+
+
+class AnsysPool(object):
+    """Pool of warm ansys sessions
+
+    All the sessions of the pool are started when the pool is created. A
+    session is taken from the pool with :meth:`session`, which gives it
+    back when the block is left.
+
+        >>> pool = AnsysPool(4, startcommand="ansys150")
+        >>> with pool.session() as ans:
+        ...     ans.send("/prep7")
+        ...     ans.get("node", "", "count")
+
+    A session which is given back is reset with :meth:`pansys.Ansys.reset`,
+    so that the next user gets a clean database at the ``BEGIN`` level.
+    Sessions which have crashed, or which could not be reset, are replaced
+    by newly started ones.
+
+    The pool can be used as a context manager, which exits all the sessions
+    at the end of the block.
+
+        >>> with AnsysPool(2) as pool:
+        ...     with pool.session() as ans:
+        ...         ans.send("/prep7")
+
+    The pool can run a function for many sets of parameters in parallel,
+    for example for a parameter sweep. The function gets a session and one
+    set of parameters:
+
+        >>> def run(ans, params):
+        ...     ans.send("/prep7")
+        ...     ...
+        ...     return ans.get("node", "", "count")
+        ...
+        >>> results = list(pool.map(run, [{"r": 1}, {"r": 2}, {"r": 3}]))
+
+    Sessions can be spread over several machines by giving a dictionary of
+    hosts and the number of sessions each one can run. Use ``None`` for the
+    local machine. If ``size`` is smaller than the total, the sessions are
+    shared out in proportion. The number of sessions is further limited to
+    the number of ``licenses`` available.
+
+        >>> pool = AnsysPool(host={None: 2, "node1": 8, "node2": 4},
+        ...                  licenses=10)
+
+    Args:
+        size (int): Number of sessions in the pool. Default is 1, or the
+            total number of sessions of all ``host``, if it is a dictionary.
+        startcommand (str): Ansys start command. See :class:`pansys.Ansys`
+        host (str or dict): The system in which the sessions are started. See
+            :class:`pansys.Ansys`. Can also be a dictionary with the number of
+            sessions for each system.
+        licenses (int): Optional. Maximum number of sessions, eg. the number
+            of ansys licenses available.
+        **kwargs: Other keyword arguments for :class:`pansys.Ansys`
+
+    """
+    def __init__(self, size=None, startcommand=None, host=None,
+                 licenses=None, **kwargs):
+        self._factory = partial(Ansys, startcommand=startcommand, **kwargs)
+        self._idle = Queue()
+        self._lock = threading.Lock()
+        self._sessions = []
+        self._hosts = {}
+        self.closed = False
+        hosts = _distribute(size, host, licenses)
+        # Sessions are started in parallel, since each one takes a while
+        with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+            futures = [executor.submit(self._start, x) for x in hosts]
+        error = None
+        for future, host in zip(futures, hosts):
+            try:
+                session = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            self._sessions.append(session)
+            self._hosts[session] = host
+            self._idle.put(session)
+        if error is not None:
+            # The sessions which did start are not left running
+            self.close()
+            raise error
+
+    def _start(self, host):
+        return self._factory(host=host)
+
+    def __repr__(self):
+        return "<pansys.AnsysPool with {} sessions, {} idle>".format(
+            len(self), self._idle.qsize())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def checkout(self, timeout=None):
+        """Take a session from the pool
+
+        Waits till a session is available. A session which is found to be
+        dead is replaced with a new one. The session should be given back
+        with :meth:`checkin` once it is not needed anymore.
+
+        Args:
+            timeout (float): Optional. Maximum number of seconds to wait for
+                a session. Default is to wait as long as required.
+
+        Returns:
+            pansys.Ansys: A session from the pool.
+        """
+        if self.closed:
+            raise RuntimeError("The pool is closed")
+        try:
+            session = self._idle.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError("No ansys session became available in {} "
+                               "seconds".format(timeout))
+        if not session.alive:
+            session = self._replace(session)
+        return session
+
+    def checkin(self, session):
+        """Give a session back to the pool
+
+        The session is reset before it is given to the next user. If the
+        session has crashed, or the reset fails, it is replaced.
+
+        Args:
+            session (pansys.Ansys): A session taken with :meth:`checkout`
+
+        Returns:
+            None
+
+        """
+        if self.closed:
+            session.exit()
+            return
+        try:
+            session.reset()
+            clean = session.alive
+        except Exception:
+            logging.warning("Resetting {} failed".format(session))
+            clean = False
+        if not clean:
+            session = self._replace(session)
+        with self._lock:
+            # The pool may have been closed during the reset
+            if not self.closed:
+                self._idle.put(session)
+                return
+        session.exit()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Context manager which takes a session from the pool and gives it
+        back at the end of the block
+
+        Args:
+            timeout (float): Optional. See :meth:`checkout`
+
+        Yields:
+            pansys.Ansys: A session from the pool.
+        """
+        session = self.checkout(timeout)
+        try:
+            yield session
+        finally:
+            self.checkin(session)
+
+    def _replace(self, session):
+        """Replaces a dead or not reset session with a new one"""
+        logging.warning("Replacing session {}".format(session))
+        session.exit()
+        host = self._hosts[session]
+        new = self._start(host)
+        with self._lock:
+            self._sessions[self._sessions.index(session)] = new
+            self._hosts[new] = host
+            del self._hosts[session]
+        return new
+
+    def _run(self, fn, params):
+        with self.session() as session:
+            return fn(session, params)
+
+    def map(self, fn, param_sets):
+        """Run a function for each set of parameters in parallel
+
+        Every session of the pool works on one set of parameters at a time.
+        The results are returned in the order of ``param_sets``, each one as
+        soon as it and all the results before it are available. Use
+        :meth:`as_completed` to get the results in the order they finish.
+
+        Args:
+            fn (function): Function which is called as ``fn(session,
+                params)`` with a session from the pool and an item of
+                ``param_sets``.
+            param_sets (iterable): The parameters for each run
+
+        Yields:
+            The return value of ``fn`` for each item of ``param_sets``. If
+            ``fn`` raised an exception, it is raised here. The runs which
+            have not started are cancelled when the iteration stops.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(self))
+        try:
+            futures = [executor.submit(self._run, fn, x) for x in param_sets]
+            for future in futures:
+                yield future.result()
+        finally:
+            # The runs which have not started are dropped if the caller
+            # stops early
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def as_completed(self, fn, param_sets):
+        """Run a function for each set of parameters in parallel
+
+        Same as :meth:`map`, but the results are returned as soon as they
+        are available, along with the parameters they belong to.
+
+            >>> for params, result in pool.as_completed(run, param_sets):
+            ...     print(params, result)
+
+        Args:
+            fn (function): Function which is called as ``fn(session,
+                params)``
+            param_sets (iterable): The parameters for each run
+
+        Yields:
+            tuple: The item of ``param_sets`` and the return value of ``fn``
+                for it. If ``fn`` raised an exception, it is raised here.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(self))
+        try:
+            futures = {executor.submit(self._run, fn, x): x
+                       for x in param_sets}
+            for future in concurrent.futures.as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def close(self):
+        """Exit all the sessions in the pool
+
+        Sessions which are checked out are exited when they are given back.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().exit()
+            except Empty:
+                break
+
+
+def _distribute(size, host, licenses):
+    """Returns the host of each session of a pool
+
+    Args:
+        size (int): Number of sessions, or None
+        host (str or dict): A host, or a dictionary with the number of
+            sessions for each host
+        licenses (int): Maximum number of sessions, or None
+
+    Returns:
+        list: The host for each session.
+    """
+    if not isinstance(host, dict):
+        host = {host: size or 1}
+    capacity = sum(host.values())
+    if size is None:
+        size = capacity
+    if licenses is not None:
+        size = min(size, licenses)
+    if size < 1:
+        raise ValueError("The pool should have at least one session")
+    # Sessions in proportion to the capacity, the remaining ones going to
+    # the hosts with the largest fractions.
+    shares = [(size * x / capacity, name) for name, x in host.items()]
+    counts = {name: int(x) for x, name in shares}
+    remaining = size - sum(counts.values())
+    for x, name in sorted(shares, key=lambda x: int(x[0]) - x[0])[:remaining]:
+        counts[name] += 1
+    hosts = []
+    for name in host:
+        hosts += [name] * counts[name]
+    return hosts
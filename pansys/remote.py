@@ -0,0 +1,315 @@
+"""
+Remote ansys sessions
+
+Ansys sessions on other systems are started over ssh. All the sessions and
+file transfers to a system share a single ssh connection, which is set up
+once with the ``ControlMaster`` feature of OpenSSH. Every further command
+only opens a new channel in the existing connection, instead of doing a
+full ssh handshake.
+
+"""
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import zlib
+from uuid import uuid4
+
+# Files larger than this are compressed while they are copied
+COMPRESS_THRESHOLD = 1 << 20
+# Size of the pieces in which files are copied
+CHUNK_SIZE = 1 << 20
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def connection(host, ssh=None):
+    """Returns the shared connection to a host
+
+    Args:
+        host (str): The system, as ``user@system`` or ``system``
+        ssh (str): Optional. The ssh command. See :class:`SSHConnection`
+
+    Returns:
+        SSHConnection: The connection, which is created on the first call
+            for a host.
+    """
+    ssh = _ssh_command(ssh)
+    with _connections_lock:
+        key = (host, ssh)
+        if key not in _connections:
+            _connections[key] = SSHConnection(host, ssh)
+        return _connections[key]
+
+
+def _ssh_command(ssh):
+    """Returns the ssh command to use"""
+    if ssh is None:
+        ssh = os.environ.get("PANSYS_SSH", "ssh")
+    return ssh
+
+
+class SSHConnection(object):
+    """Shared ssh connection to a system
+
+    The first use of the connection starts a master connection in the
+    background, which is kept open for ``persist`` seconds after the last
+    use. Commands are run through the master connection.
+
+        >>> con = SSHConnection("user@node1")
+        >>> con.mkdir("/scratch/job")
+        >>> con.push("model.inp", "/scratch/job/model.inp")
+        >>> con.run("ls /scratch/job")
+        'model.inp\\n'
+
+    Use :func:`pansys.remote.connection` to get the connection which is
+    shared by all the sessions on a system.
+
+    Args:
+        host (str): The system, as ``user@system`` or ``system``
+        ssh (str): Optional. The ssh command, which can include options, eg.
+            ``ssh -p 2222``. Default is the value of the environment variable
+            ``PANSYS_SSH`` or ``ssh``.
+        control_dir (str): Optional. Folder for the socket of the master
+            connection. Default is the temporary folder.
+        persist (int): Seconds the master connection is kept open when it
+            is not used. Default is 600.
+    """
+    def __init__(self, host, ssh=None, control_dir=None, persist=600):
+        self.host = host
+        self.ssh = _ssh_command(ssh)
+        self.persist = persist
+        # %C is a hash of the host, port and user, which keeps the path short
+        self.control_path = os.path.join(
+            control_dir or tempfile.gettempdir(), "pansys-ssh-%C")
+        self._lock = threading.Lock()
+        self._started = False
+
+    def __repr__(self):
+        return "<pansys.SSHConnection to {}>".format(self.host)
+
+    @property
+    def options(self):
+        """Options for ssh which make it use the master connection"""
+        return ["-o", "ControlMaster=auto",
+                "-o", "ControlPath={}".format(self.control_path),
+                "-o", "ControlPersist={}".format(self.persist)]
+
+    def command(self, remote_command, tty=False):
+        """Returns the ssh command line to run a command on the system
+
+        Args:
+            remote_command (str): The command to run on the system
+            tty (bool): If True, a terminal is requested, as required for an
+                interactive ansys session.
+
+        Returns:
+            list: The program and its arguments.
+        """
+        self.connect()
+        args = shlex.split(self.ssh) + self.options
+        if tty:
+            args.append("-t")
+        return args + [self.host, remote_command]
+
+    @property
+    def connected(self):
+        """True if the master connection is running"""
+        return subprocess.call(
+            shlex.split(self.ssh) + self.options + ["-O", "check", self.host],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+    def connect(self):
+        """Start the master connection, if it is not running
+
+        This is done once, before the first command. If the master
+        connection is closed later, eg. after ``persist`` seconds without
+        use, ssh starts a new one with the next command.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            if self._started or self.connected:
+                self._started = True
+                return
+            # -f puts ssh in the background once the connection is up
+            result = subprocess.run(
+                shlex.split(self.ssh) + self.options +
+                ["-M", "-N", "-f", self.host],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise OSError("Could not connect to {}: {}".format(
+                    self.host, result.stderr.decode(errors="replace")))
+            self._started = True
+
+    def close(self):
+        """Stop the master connection
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self._started = False
+            subprocess.call(
+                shlex.split(self.ssh) + self.options + ["-O", "exit",
+                                                        self.host],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def run(self, remote_command):
+        """Run a command on the system
+
+        Args:
+            remote_command (str): The command, which is run by the shell on
+                the system
+
+        Returns:
+            str: The output of the command.
+        """
+        result = subprocess.run(self.command(remote_command),
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise OSError("{} failed on {}: {}".format(
+                remote_command, self.host,
+                result.stderr.decode(errors="replace")))
+        return result.stdout.decode(errors="replace")
+
+    def push(self, local, remote):
+        """Copy a file to the system
+
+        The file is written under a temporary name and renamed at the end,
+        so that the file is never seen half written.
+
+        Args:
+            local (str): Path of the local file
+            remote (str): Path of the file on the system
+
+        Returns:
+            None
+
+        """
+        partial = "{}.{}".format(remote, uuid4().hex)
+        with open(local, "rb") as f:
+            self._stream("cat > {0} && mv {0} {1}".format(
+                shlex.quote(partial), shlex.quote(remote)), stdin=f)
+
+    def pull(self, remote, local, compress=None, remove=False):
+        """Copy a file from the system
+
+        The file is read in pieces of :data:`CHUNK_SIZE` bytes. Large files
+        are compressed with gzip on the system and decompressed while they
+        are written, which is much faster for the text output of ansys on a
+        slow network. The decision is taken on the system, so that it does
+        not cost an extra round trip.
+
+        Args:
+            remote (str): Path of the file on the system
+            local (str): Path of the local file
+            compress (bool): Optional. True to always compress the file and
+                False to never compress it. Default is to compress files
+                larger than :data:`COMPRESS_THRESHOLD` bytes.
+            remove (bool): Optional. If True, the file on the system is
+                deleted once it is copied.
+
+        Returns:
+            None
+
+        """
+        path = shlex.quote(remote)
+        plain = "printf R && cat {}".format(path)
+        packed = "printf Z && gzip -c -1 {}".format(path)
+        if compress is None:
+            command = "if [ $(wc -c < {}) -gt {} ]; then {}; else {}; fi"\
+                .format(path, COMPRESS_THRESHOLD, packed, plain)
+        else:
+            command = packed if compress else plain
+        if remove:
+            command = "{{ {}; }} && rm -f {}".format(command, path)
+        partial = "{}.{}".format(local, uuid4().hex)
+        process = subprocess.Popen(self.command(command),
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        try:
+            with open(partial, "wb") as f:
+                mode = process.stdout.read(1)
+                # 16 + MAX_WBITS is for the gzip header
+                decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) \
+                    if mode == b"Z" else None
+                while True:
+                    chunk = process.stdout.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(decoder.decompress(chunk) if decoder else chunk)
+                if decoder:
+                    f.write(decoder.flush())
+            error = process.stderr.read()
+            if process.wait() != 0:
+                raise OSError("Copying {} from {} failed: {}".format(
+                    remote, self.host, error.decode(errors="replace")))
+            os.replace(partial, local)
+        finally:
+            process.stdout.close()
+            process.stderr.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    def _stream(self, remote_command, stdin=subprocess.DEVNULL):
+        process = subprocess.Popen(self.command(remote_command),
+                                   stdin=stdin, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        _, error = process.communicate()
+        if process.returncode != 0:
+            raise OSError("{} failed on {}: {}".format(
+                remote_command, self.host, error.decode(errors="replace")))
+
+    def mkdir(self, path):
+        """Create a folder and its parents on the system
+
+        Args:
+            path (str): Path of the folder on the system
+
+        Returns:
+            None
+
+        """
+        self.run("mkdir -p {}".format(shlex.quote(path)))
+
+    def rmtree(self, path):
+        """Delete a folder and everything in it on the system
+
+        Args:
+            path (str): Path of the folder on the system
+
+        Returns:
+            None
+
+        """
+        self.run("rm -rf {}".format(shlex.quote(path)))
+
+    def remove(self, path):
+        """Delete a file on the system, if it exists
+
+        Args:
+            path (str): Path of the file on the system
+
+        Returns:
+            None
+
+        """
+        self.run("rm -f {}".format(shlex.quote(path)))
+
+    def exists(self, path):
+        """True if a file or folder exists on the system"""
+        try:
+            self.run("test -e {}".format(shlex.quote(path)))
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,228 @@
+"""
+Ansys result files
+
+Reader for ansys binary result files (``.rst``). The file is memory mapped
+with :class:`numpy.memmap` and the solution data is read only when it is
+asked for, so that results can be extracted without an ansys session and
+in parallel for many files.
+
+"""
+import numpy as np
+
+# Degree of freedom labels by their reference number in the result file
+DOF_LABELS = {
+    1: "UX", 2: "UY", 3: "UZ", 4: "ROTX", 5: "ROTY", 6: "ROTZ",
+    7: "AX", 8: "AY", 9: "AZ", 10: "VX", 11: "VY", 12: "VZ",
+    16: "WARP", 17: "CONC", 18: "HDSP", 19: "PRES", 20: "TEMP",
+    21: "VOLT", 22: "MAG", 23: "ENKE", 24: "ENDS", 25: "EMF", 26: "CURR",
+}
+
+# Items of the element solution index, in the order they are stored
+ELEMENT_ITEMS = ["EMS", "ENF", "ENS", "ENG", "EGR", "EEL", "EPL", "ECR",
+                 "ETH", "EUL", "EFX", "ELF", "EMN", "ECD", "ENL", "EHC",
+                 "EPT", "ESF", "EDI", "ETB", "ECT", "EXY", "EBA", "ESV",
+                 "MNL"]
+
+# Names of the first words of the result file header
+RESULT_HEADER = ["fun12", "maxn", "nnod", "resmax", "numdof", "maxe", "nelm",
+                 "kan", "nsets", "ptrend", "ptrDSIl", "ptrTIMl", "ptrLSPl",
+                 "ptrELMl", "ptrNODl", "ptrGEOl", "ptrCYCl", "CMSflg",
+                 "csEls", "units", "nSector", "csCord", "ptrEnd8l",
+                 "ptrEnd8h", "fsiflag", "pmeth", "noffst", "eoffst",
+                 "nTrans", "ptrTRANl", "PrecKey", "csNds", "cpxrst",
+                 "extopt", "nlgeom", "AvailData", "mmass", "kPerturb",
+                 "XfemKey", "rstsprs", "ptrDSIh", "ptrTIMh", "ptrLSPh",
+                 "ptrCYCh", "ptrELMh", "ptrNODh", "ptrGEOh"]
+
+# Names of the first words of the solution header of each result set
+SOLUTION_HEADER = ["pv3num", "nelm", "nnod", "mask", "itime", "iter",
+                   "ncumit", "nrf", "cs_LSC", "nmast", "ptrNSL", "ptrESL",
+                   "ptrRF", "ptrMST", "ptrBC", "rxtrap", "mode", "isym",
+                   "kcmplx", "numdof"]
+
+# Offset of the result file header, after the standard header record
+RESULT_HEADER_OFFSET = 103
+
+# Bits of the flag word of a record
+RECORD_INTEGER = 1 << 31
+RECORD_SINGLE = 1 << 30
+RECORD_BSPARSE = 1 << 29
+RECORD_WSPARSE = 1 << 28
+RECORD_ZLIB = 1 << 27
+
+
+class ResultFile(object):
+    """Ansys binary result file
+
+    Class to read the results from an ansys result file without an ansys
+    session.
+
+        >>> rst = ResultFile("file.rst")
+        >>> rst.nsets
+        2
+        >>> u = rst.nodal_solution(1)
+
+    The file consists of records, each of which starts with the length of
+    the record in 4 byte words and a word with flags, and ends with one more
+    word. Locations in the file are given as pointers in words. The
+    standard header is followed by the result file header, which has the
+    pointers to the tables of node and element numbers and to the solution
+    header of each result set.
+
+    Only the parts of the file which are accessed are read from disk. The
+    arrays returned are read only views of the memory mapped file.
+
+    The solution data is single precision if ``PrecKey`` of the result file
+    header is 1, or if the flags of its record say so. Sparse and
+    compressed records can not be read and raise a ``ValueError``.
+
+    .. note::
+        Pointers within a result set use only their lower word, which limits
+        a result set to the first 8 GB of the file.
+
+    Args:
+        filename (str): Path to the ``.rst`` file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._mm = np.memmap(filename, dtype=np.uint8, mode="r")
+        self.header = dict(zip(RESULT_HEADER,
+                               self._record(RESULT_HEADER_OFFSET).tolist()))
+        self._solution_headers = {}
+        self.dtype = np.float32 if self.header.get("PrecKey") == 1 \
+            else np.float64
+        # Type of the solution data
+
+    def __repr__(self):
+        return "<pansys.ResultFile {} with {} result sets>".format(
+            self.filename, self.nsets)
+
+    def _record(self, pointer, dtype=np.int32):
+        """Returns the data of the record at ``pointer`` words
+
+        The data is read as ``dtype``, or in single precision if the flags
+        of the record say so.
+        """
+        offset = int(pointer) * 4
+        nwords, flags = np.ndarray(2, "<u4", self._mm, offset).tolist()
+        if flags & (RECORD_BSPARSE | RECORD_WSPARSE | RECORD_ZLIB):
+            raise ValueError("The record at word {} of {} is sparse or "
+                             "compressed, which is not supported"
+                             .format(pointer, self.filename))
+        dtype = np.dtype(dtype)
+        if flags & RECORD_SINGLE:
+            dtype = np.dtype(np.int16 if dtype.kind == "i" else np.float32)
+        count = nwords * 4 // dtype.itemsize
+        return np.ndarray(count, dtype.newbyteorder("<"), self._mm,
+                          offset + 8)
+
+    def _pointer(self, name):
+        low = self.header["{}l".format(name)] & 0xFFFFFFFF
+        high = self.header.get("{}h".format(name), 0)
+        return low + (high << 32)
+
+    @property
+    def nsets(self):
+        """Number of result sets in the file"""
+        return self.header["nsets"]
+
+    @property
+    def nodes(self):
+        """Node numbers in the order of the nodal results"""
+        return self._record(self._pointer("ptrNOD"))[:self.header["nnod"]]
+
+    @property
+    def elements(self):
+        """Element numbers in the order of the element results"""
+        return self._record(self._pointer("ptrELM"))[:self.header["nelm"]]
+
+    @property
+    def dof(self):
+        """Labels of the degrees of freedom of each node"""
+        pointer = RESULT_HEADER_OFFSET + \
+            len(self._record(RESULT_HEADER_OFFSET)) + 3
+        refs = self._record(pointer)[:self.header["numdof"]]
+        return [DOF_LABELS.get(x, str(x)) for x in refs.tolist()]
+
+    @property
+    def time_values(self):
+        """Time values of the result sets"""
+        return self._record(self._pointer("ptrTIM"),
+                            np.float64)[:self.nsets]
+
+    def _set_pointer(self, rnum):
+        """Pointer to the solution header of result set ``rnum``"""
+        if not 1 <= rnum <= self.nsets:
+            raise ValueError("Result set {} is not in the file. There are {}"
+                             " result sets.".format(rnum, self.nsets))
+        table = self._record(self._pointer("ptrDSI"))
+        resmax = self.header["resmax"]
+        low = int(table[rnum - 1]) & 0xFFFFFFFF
+        high = int(table[resmax + rnum - 1]) if len(table) > resmax else 0
+        return low + (high << 32)
+
+    def solution_header(self, rnum):
+        """The solution header of a result set
+
+        Args:
+            rnum (int): Result set number, starting from 1
+
+        Returns:
+            dict: The first words of the solution header by name.
+        """
+        if rnum not in self._solution_headers:
+            record = self._record(self._set_pointer(rnum))
+            self._solution_headers[rnum] = dict(zip(SOLUTION_HEADER,
+                                                    record.tolist()))
+        return self._solution_headers[rnum]
+
+    def nodal_solution(self, rnum):
+        """Nodal degree of freedom solution of a result set
+
+        Args:
+            rnum (int): Result set number, starting from 1
+
+        Returns:
+            numpy.ndarray: Array with one row per node in the order of
+                :attr:`nodes` and one column per degree of freedom in the
+                order of :attr:`dof`.
+        """
+        header = self.solution_header(rnum)
+        pointer = self._set_pointer(rnum) + header["ptrNSL"]
+        data = self._record(pointer, self.dtype)
+        numdof = self.header["numdof"]
+        return data[:header["nnod"] * numdof].reshape(-1, numdof)
+
+    def element_solution(self, rnum, item="ENS"):
+        """Element solution of a result set
+
+        The element solution is stored per element, and the size of the
+        data depends on the element type. The data is returned as it is
+        stored in the file.
+
+        Args:
+            rnum (int): Result set number, starting from 1
+            item (str): The item of the element solution, one of
+                :data:`ELEMENT_ITEMS`. Default is ``ENS``, the element nodal
+                stresses.
+
+        Returns:
+            list: A :class:`numpy.ndarray` per element in the order of
+                :attr:`elements`, or None for elements without the item.
+        """
+        index = ELEMENT_ITEMS.index(item.upper())
+        header = self.solution_header(rnum)
+        ptr_sol = self._set_pointer(rnum)
+        table = self._record(ptr_sol + header["ptrESL"])[:header["nelm"]]
+        result = []
+        for pointer in table.tolist():
+            if pointer <= 0:
+                result.append(None)
+                continue
+            items = self._record(ptr_sol + pointer)
+            if index >= len(items) or items[index] <= 0:
+                result.append(None)
+                continue
+            result.append(self._record(ptr_sol + pointer + int(items[index]),
+                                       self.dtype))
+        return result
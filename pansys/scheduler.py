@@ -0,0 +1,419 @@
+"""
+Scheduler for ansys batch jobs
+
+Runs many independent input decks in batch mode, as many at a time as the
+ansys licenses and the cores of the machine allow. The jobs are kept in a
+state file, so that the scheduler can be stopped and started again without
+losing the queue.
+
+"""
+import json
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+
+from .interactive import _start_command, _working_folder
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Output of ansys when it could not get a license
+LICENSE_ERROR = re.compile(
+    r"license manager error|no licen[sc]e|"
+    r"licen[sc]e.{0,40}(?:not available|unavailable|denied|exhausted)",
+    re.IGNORECASE)
+
+
+class Job(object):
+    """An input deck run by the :class:`Scheduler`
+
+    Jobs are created by :meth:`Scheduler.submit`. The attributes are
+    updated by the scheduler while the job runs.
+
+    Args:
+        id (int): Number of the job in the scheduler
+        deck (str): Path to the input file
+        files (list): Paths to other files needed by the job
+        name (str): Optional. A name for the job. Default is the name of the
+            input file.
+        priority (int): Jobs with a higher priority are started first
+        licenses (int): Number of ansys licenses used by the job
+        cores (int): Number of cores used by the job
+        retries (int): Number of times the job is run again when it could
+            not get a license
+    """
+    _FIELDS = ("id", "deck", "files", "name", "priority", "licenses",
+               "cores", "retries", "state", "attempts", "submitted",
+               "started", "finished", "returncode", "wd", "output_file")
+
+    def __init__(self, id, deck, files=(), name=None, priority=0,
+                 licenses=1, cores=1, retries=3):
+        self.id = id
+        self.deck = os.path.abspath(deck)
+        self.files = [os.path.abspath(x) for x in files]
+        self.name = name or os.path.splitext(os.path.basename(deck))[0]
+        self.priority = priority
+        self.licenses = licenses
+        self.cores = cores
+        self.retries = retries
+        self.state = QUEUED
+        self.attempts = 0
+        # Number of times the job was started
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.returncode = None
+        self.wd = None
+        # The working folder of the job, created when it is first started
+        self.output_file = None
+        self._not_before = 0.0
+        # Time after which a job which is retried can be started
+        self._process = None
+
+    def __repr__(self):
+        return "<pansys.Job {} {} {}>".format(self.id, self.name, self.state)
+
+    @property
+    def wait_time(self):
+        """Seconds from the submission to the start of the last run"""
+        if self.started is None:
+            return None
+        return self.started - self.submitted
+
+    @property
+    def run_time(self):
+        """Seconds taken by the last run"""
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def to_dict(self):
+        """The attributes of the job which are kept in the state file"""
+        return {x: getattr(self, x) for x in self._FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Job with the attributes read from the state file"""
+        job = cls(data["id"], data["deck"])
+        for field in cls._FIELDS:
+            if field in data:
+                setattr(job, field, data[field])
+        return job
+
+
+class Scheduler(object):
+    """Runs ansys input decks in batch mode with limited concurrency
+
+    Jobs are started in the order of their priority, and in the order in
+    which they were submitted for the same priority. A job is only started
+    if the licenses and cores it needs are free. The jobs after it wait
+    till it has started, so that large jobs are not held up forever by
+    small ones.
+
+        >>> with Scheduler(licenses=4, cores=16) as scheduler:
+        ...     jobs = [scheduler.submit(x, cores=4) for x in decks]
+        ...     urgent = scheduler.submit("check.inp", priority=10)
+        ...     scheduler.wait()
+        >>> [x.state for x in jobs]
+        ['done', 'done', 'failed', ...]
+
+    Every job is run in a new folder in ``folder``, named in the same way
+    as the working folder of :class:`pansys.Ansys`. The input file and the
+    other files of the job are copied to it, and ansys is run there with
+    ``-b -i <deck> -o <output> -np <cores>``.
+
+    A job which failed because no license was available, as found from its
+    output with :data:`LICENSE_ERROR`, is run again after ``retry_delay``
+    seconds, up to the number of ``retries`` of the job.
+
+    The jobs are saved to ``state_file`` whenever one of them changes. A
+    scheduler started with the same file continues with the jobs which have
+    not finished. Jobs which were running when the scheduler was stopped are
+    run again.
+
+    Args:
+        startcommand (str): Ansys start command. See :class:`pansys.Ansys`
+        folder (str): Optional. Folder in which the job folders are created.
+            Default is the current folder.
+        licenses (int): Number of ansys licenses which can be used at a time
+        cores (int): Number of cores which can be used at a time. Default is
+            the number of cores of the machine.
+        state_file (str): Optional. Path to the state file. Default is
+            ``pansys_scheduler.json`` in ``folder``.
+        retry_delay (float): Seconds to wait before a job which could not get
+            a license is run again.
+
+    """
+    def __init__(self, startcommand=None, folder=None, licenses=1,
+                 cores=None, state_file=None, retry_delay=60.0):
+        self._startcommand = _start_command(startcommand)
+        self.folder = os.path.abspath(folder or os.getcwd())
+        self.licenses = licenses
+        self.cores = cores or os.cpu_count() or 1
+        self.state_file = state_file or os.path.join(
+            self.folder, "pansys_scheduler.json")
+        self.retry_delay = retry_delay
+        self.jobs = []
+        self.closed = False
+        self._condition = threading.Condition()
+        self._threads = []
+        self._load()
+        self._dispatcher = threading.Thread(target=self._dispatch,
+                                            daemon=True)
+        self._dispatcher.start()
+
+    def __repr__(self):
+        return "<pansys.Scheduler with {} jobs in {}>".format(
+            len(self.jobs), self.folder)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load(self):
+        """Reads the jobs from the state file, if there is one"""
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, "r") as f:
+            self.jobs = [Job.from_dict(x) for x in json.load(f)["jobs"]]
+        for job in self.jobs:
+            if job.state == RUNNING:
+                logging.warning("Running {} again".format(job))
+                job.state = QUEUED
+
+    def _save(self):
+        """Writes the jobs to the state file. Called with the lock held."""
+        partial = self.state_file + ".partial"
+        with open(partial, "w") as f:
+            json.dump({"jobs": [x.to_dict() for x in self.jobs]}, f,
+                      indent=1)
+        os.replace(partial, self.state_file)
+
+    def submit(self, deck, files=(), name=None, priority=0, licenses=1,
+               cores=1, retries=3):
+        """Add a job to the queue
+
+        Args:
+            deck (str): Path to the input file
+            files (list): Optional. Paths to other files needed by the job,
+                which are copied to its folder.
+            name (str): Optional. A name for the job.
+            priority (int): Optional. Jobs with a higher priority are
+                started first. Default is 0.
+            licenses (int): Optional. Number of licenses used by the job.
+            cores (int): Optional. Number of cores used by the job.
+            retries (int): Optional. Number of times the job is run again
+                when it could not get a license.
+
+        Returns:
+            pansys.scheduler.Job: The job.
+        """
+        if not os.path.exists(deck):
+            raise OSError("The input file {} doesn't exist".format(deck))
+        if licenses > self.licenses or cores > self.cores:
+            raise ValueError("The job needs more licenses or cores than the"
+                             " scheduler has")
+        with self._condition:
+            if self.closed:
+                raise RuntimeError("The scheduler is closed")
+            job = Job(max([x.id for x in self.jobs], default=0) + 1, deck,
+                      files, name, priority, licenses, cores, retries)
+            self.jobs.append(job)
+            self._save()
+            self._condition.notify_all()
+        return job
+
+    def cancel(self, job):
+        """Cancel a job
+
+        A queued job is not started anymore. A running job is stopped.
+
+        Args:
+            job (pansys.scheduler.Job): The job to cancel
+
+        Returns:
+            bool: False if the job had finished already.
+        """
+        with self._condition:
+            if job.state in FINISHED:
+                return False
+            if job.state == RUNNING and job._process is not None:
+                job._process.terminate()
+            job.state = CANCELLED
+            job.finished = time.time()
+            self._save()
+            self._condition.notify_all()
+        return True
+
+    def _free(self):
+        """Licenses and cores not used by the running jobs"""
+        running = [x for x in self.jobs if x.state == RUNNING]
+        return (self.licenses - sum(x.licenses for x in running),
+                self.cores - sum(x.cores for x in running))
+
+    def _next(self):
+        """Returns the next job to start and the seconds till it can start
+
+        The job is None if no job can be started now.
+        """
+        queued = sorted((x for x in self.jobs if x.state == QUEUED),
+                        key=lambda x: (-x.priority, x.submitted, x.id))
+        licenses, cores = self._free()
+        now = time.time()
+        delay = None
+        for job in queued:
+            if job._not_before > now:
+                # Jobs waiting to be retried do not hold up the others
+                wait = job._not_before - now
+                delay = wait if delay is None else min(delay, wait)
+                continue
+            if job.licenses <= licenses and job.cores <= cores:
+                return job, None
+            return None, delay
+        return None, delay
+
+    def _dispatch(self):
+        """Starts the jobs as the licenses and cores become free"""
+        with self._condition:
+            while not self.closed:
+                job, delay = self._next()
+                if job is None:
+                    self._condition.wait(delay)
+                    continue
+                job.state = RUNNING
+                job.attempts += 1
+                job.started = time.time()
+                if job.wd is None:
+                    job.wd, _ = _working_folder(None, self.folder)
+                self._save()
+                thread = threading.Thread(target=self._run, args=(job,),
+                                          daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def _run(self, job):
+        """Runs a job with ansys and records how it ended"""
+        output = ""
+        returncode = None
+        try:
+            for path in [job.deck] + job.files:
+                target = os.path.join(job.wd, os.path.basename(path))
+                if not os.path.exists(target):
+                    shutil.copy(path, target)
+            deck = os.path.basename(job.deck)
+            job.output_file = os.path.join(
+                job.wd, "{}_{}.out".format(job.name, job.attempts))
+            args = shlex.split(self._startcommand) + [
+                "-b", "-i", deck, "-o", job.output_file,
+                "-np", str(job.cores)]
+            with self._condition:
+                if job.state != RUNNING:
+                    return
+                job._process = subprocess.Popen(
+                    args, cwd=job.wd, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            returncode = job._process.wait()
+            if os.path.exists(job.output_file):
+                with open(job.output_file, "r", errors="replace") as f:
+                    output = f.read()
+        except OSError as e:
+            logging.error("Could not run {}: {}".format(job, e))
+        with self._condition:
+            job._process = None
+            job.returncode = returncode
+            job.finished = time.time()
+            if job.state == RUNNING:
+                if returncode == 0:
+                    job.state = DONE
+                elif LICENSE_ERROR.search(output) and \
+                        job.attempts <= job.retries:
+                    logging.warning("No license for {}, retrying in {} s"
+                                    .format(job, self.retry_delay))
+                    job.state = QUEUED
+                    job._not_before = time.time() + self.retry_delay
+                else:
+                    job.state = FAILED
+            logging.info("{} finished in {:.1f} s".format(job, job.run_time))
+            self._save()
+            self._condition.notify_all()
+
+    def wait(self, jobs=None, timeout=None):
+        """Wait till jobs have finished
+
+        Args:
+            jobs (list): Optional. The jobs to wait for. Default is all the
+                jobs.
+            timeout (float): Optional. Maximum number of seconds to wait.
+
+        Returns:
+            bool: True if the jobs have finished, False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: all(x.state in FINISHED
+                            for x in (jobs or self.jobs)), timeout)
+
+    def metrics(self):
+        """Numbers about the jobs of the scheduler
+
+        Returns:
+            dict: The number of jobs in each state, the throughput in jobs
+                finished per hour, and the mean and maximum time in seconds
+                the jobs waited in the queue and took to run.
+        """
+        with self._condition:
+            jobs = list(self.jobs)
+        result = {x: 0 for x in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in jobs:
+            result[job.state] += 1
+        waits = [x.wait_time for x in jobs if x.wait_time is not None]
+        runs = [x.run_time for x in jobs
+                if x.state in (DONE, FAILED) and x.run_time is not None]
+        done = [x for x in jobs if x.state == DONE]
+        throughput = 0.0
+        if done:
+            span = max(x.finished for x in done) - \
+                min(x.submitted for x in done)
+            throughput = len(done) * 3600.0 / span if span > 0 else 0.0
+        result.update({
+            "throughput": throughput,
+            "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+            "wait_max": max(waits, default=0.0),
+            "run_mean": sum(runs) / len(runs) if runs else 0.0,
+            "run_max": max(runs, default=0.0),
+        })
+        return result
+
+    def close(self, wait=True):
+        """Stop starting new jobs
+
+        Jobs which have not started stay in the state file, and are run by
+        the next scheduler which uses it.
+
+        Args:
+            wait (bool): Optional. If True, wait for the running jobs to
+                finish.
+
+        Returns:
+            None
+
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        self._dispatcher.join()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,155 @@
+"""
+Pansys session server
+
+Starting ansys takes much longer than most short scripts take to run. The
+server keeps a pool of warm ansys sessions and lends them to clients over a
+Unix socket. Start it with:
+
+    $ pansys serve --size 2 --startcommand ansys150
+
+and use :class:`pansys.client.AnsysClient` in place of :class:`pansys.Ansys`.
+
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+
+from .client import decode, default_socket, encode
+from .pool import AnsysPool
+
+# Methods of pansys.Ansys which the clients can call
+METHODS = frozenset([
+    "send", "queue", "run_queue", "reset", "get", "get_many", "get_array",
+    "get_parameters", "set_parameters", "get_output", "get_list",
+])
+# Properties of pansys.Ansys which the clients can read
+PROPERTIES = frozenset(["output", "version", "wd"])
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Serves one client with a session of the pool"""
+
+    def handle(self):
+        with self.server.pool.session() as session:
+            logging.info("Client connected to {}".format(session))
+            for line in self.rfile:
+                self.wfile.write(self.server.respond(session, line))
+                self.wfile.flush()
+
+
+class SessionServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """Server which lends the sessions of a pool to clients
+
+    Every client connection gets a session of its own till it is closed.
+    Clients which connect when all the sessions are in use wait for one to
+    be given back.
+
+        >>> server = SessionServer("/tmp/pansys.sock", AnsysPool(2))
+        >>> server.serve_forever()
+
+    Args:
+        path (str): Path of the Unix socket. A socket left over at the
+            path by a server which is not running anymore is replaced.
+        pool (pansys.AnsysPool): The sessions to lend
+
+    """
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.path = path
+        self.pool = pool
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                # Left over by a server which did not exit cleanly
+                os.remove(path)
+            else:
+                raise OSError("A server is running at {} already"
+                              .format(path))
+            finally:
+                probe.close()
+        # Only the user who started the server can connect. The socket is
+        # made with these permissions, so that nobody can connect before
+        # they are set.
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def respond(self, session, line):
+        """Runs the method of a request on a session
+
+        Args:
+            session (pansys.Ansys): The session of the client
+            line (bytes): The request, as JSON with the ``method`` and its
+                ``args`` and ``kwargs``
+
+        Returns:
+            bytes: The response line, as JSON with the ``result``, or the
+                ``error`` and its ``message``.
+        """
+        try:
+            request = json.loads(line)
+            method = request.get("method")
+            if method in PROPERTIES:
+                result = getattr(session, method)
+            elif method in METHODS:
+                result = getattr(session, method)(
+                    *decode(request.get("args", [])),
+                    **decode(request.get("kwargs", {})))
+            else:
+                raise AttributeError("{} is not a method of the server"
+                                     .format(method))
+            response = json.dumps({"result": encode(result)})
+        except Exception as e:
+            response = json.dumps({"error": type(e).__name__,
+                                   "message": str(e)})
+        return response.encode() + b"\n"
+
+    def close(self):
+        """Stop the server and exit the sessions
+
+        Returns:
+            None
+
+        """
+        self.shutdown()
+        self.server_close()
+        self.pool.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def serve(path=None, size=1, **kwargs):
+    """Run the session server till it is interrupted
+
+    Args:
+        path (str): Optional. Path of the Unix socket. Default is given by
+            :func:`pansys.client.default_socket`.
+        size (int): Optional. Number of sessions.
+        **kwargs: Keyword arguments for :class:`pansys.AnsysPool`
+
+    Returns:
+        None
+
+    """
+    path = path or default_socket()
+    server = SessionServer(path, AnsysPool(size, **kwargs))
+    logging.info("Serving {} sessions at {}".format(size, path))
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -1,2 +1,4 @@
 from .tests import *
 from .tests_ssh import *
+from .tests_fake import *
+from .tests_results import *
@@ -0,0 +1,163 @@
+"""Benchmarks against the fake APDL process in ``fake_apdl.py``.
+
+Run all the benchmarks with:
+
+    python -m pansys.tests.benchmarks
+
+"""
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from pansys import Ansys, AnsysBatch
+from pansys.interactive import _Scanner, _PROMPT, _QUESTION
+from pansys.utility_functions import calculate_skip_rows, read_list
+from .tests_fake import FAKE_APDL
+
+
+def timeit(function, *args, **kwargs):
+    """Returns the time taken in seconds for calling ``function``"""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_pipeline(nlines=500, delay=0.0):
+    """Compare a line by line ``send`` with a pipelined ``send``"""
+    a = Ansys(startcommand="{} --delay {}".format(FAKE_APDL, delay),
+              cleanup=True)
+    a.send("/prep7")
+    block = "\n".join("n,,{}".format(i) for i in range(nlines))
+    serial = timeit(a.send, block)
+    pipelined = timeit(a.send, block, pipeline=True)
+    print("send {} lines: {:.3f} s line by line, {:.3f} s pipelined"
+          .format(nlines, serial, pipelined))
+
+
+def _scan_findall(lines, expect_list, prompt_list):
+    """The scanning done in the ``send`` loop before it was compiled"""
+    for chunk in lines:
+        if any(re.findall(x, chunk) for x in prompt_list):
+            break
+        if any(re.findall(x, chunk) for x in expect_list):
+            break
+        if '*** WARNING ***' in chunk:
+            msg = [x for x in chunk.split('\r\n\r\n')
+                   if '*** WARNING ***' in x][0]
+            logging.warning(msg)
+
+
+def _scan_compiled(lines, regex):
+    scanner = _Scanner(regex, "", deque(maxlen=1000))
+    for chunk in lines:
+        if scanner.feed(chunk) in (_PROMPT, _QUESTION):
+            break
+    scanner.close()
+
+
+def bench_scanner(nlines=200000):
+    """Compare the output scanning of ``send`` in lines per second"""
+    a = Ansys(startcommand=FAKE_APDL, cleanup=True)
+    lines = [" {:8d}  0.1000000E+01  0.0000000E+00  0.2500000E+01\r\n"
+             .format(i) for i in range(nlines)]
+    lines[nlines // 2:nlines // 2] = [
+        "\r\n", " *** WARNING ***   CP =   0.000   TIME= 00:00:00\r\n",
+        " Some warning.\r\n", "\r\n"]
+    lines.append(" POST1:\r\n")
+    findall = timeit(_scan_findall, lines, a.expect_list, a.prompt_list)
+    compiled = timeit(_scan_compiled, lines, a._output_regex)
+    print("scan {} lines: {:.0f} lines/s with re.findall, {:.0f} lines/s "
+          "compiled".format(len(lines), len(lines) / findall,
+                            len(lines) / compiled))
+
+
+def write_nlist(f, nrows, page=None):
+    """Writes a file which looks like the output of ``NLIST``"""
+    header = ("\n LIST ALL SELECTED NODES.   DSYS=      0\n\n    NODE        X"
+              "                   Y                   Z                 "
+              "THXY     THYZ     THZX\n")
+    page = page or nrows
+    with open(f, "w") as fh:
+        for i in range(1, nrows + 1):
+            if (i - 1) % page == 0:
+                fh.write(header)
+            fh.write("{:9d}  {:20.13E}  {:20.13E}  {:20.13E}    0.00     0.00"
+                     "     0.00\n".format(i, i * 0.1, -i * 0.2, 3.0))
+
+
+def _read_table(f):
+    """The parsing done in ``get_list`` before ``read_list``"""
+    return pd.read_table(f, sep=r"\s+", skiprows=calculate_skip_rows(f, 5),
+                         skip_blank_lines=True)
+
+
+def bench_list_parser(nrows=1000000):
+    """Compare ``read_list`` with ``calculate_skip_rows`` + ``read_table``"""
+    fd, f = tempfile.mkstemp(suffix=".out")
+    os.close(fd)
+    try:
+        write_nlist(f, nrows)
+        old = timeit(_read_table, f)
+        new = timeit(read_list, f)
+        print("parse nlist with {} rows: {:.3f} s read_table, {:.3f} s "
+              "read_list".format(nrows, old, new))
+    finally:
+        os.remove(f)
+
+
+def bench_put_nodes(nnodes=20000):
+    """Compare ``queue`` + ``run_queue`` of ``N`` commands with
+    ``put_nodes``"""
+    a = Ansys(startcommand=FAKE_APDL, cleanup=True)
+    a.send("/prep7")
+    ids = np.arange(1, nnodes + 1)
+    xyz = np.random.rand(nnodes, 3)
+
+    def queued():
+        for i, (x, y, z) in zip(ids.tolist(), xyz.tolist()):
+            a.queue("n,{},{},{},{}".format(i, x, y, z))
+        a.run_queue()
+    old = timeit(queued)
+    new = timeit(a.put_nodes, ids, xyz)
+    print("create {} nodes: {:.3f} s queued, {:.3f} s put_nodes"
+          .format(nnodes, old, new))
+
+
+def bench_batch(nlines=200):
+    """Compare an interactive session with a batch run of the same deck"""
+    def run(a):
+        a.send("/prep7")
+        for i in range(nlines):
+            a.send("n,,{}".format(i))
+        return a.get("node", "", "count")
+
+    a = Ansys(startcommand=FAKE_APDL, cleanup=True)
+    interactive = timeit(run, a)
+    a.exit()
+    b = AnsysBatch(startcommand=FAKE_APDL, cleanup=True)
+
+    def batch():
+        run(b)
+        b.run()
+    batch = timeit(batch)
+    b.exit()
+    print("run {} lines: {:.3f} s interactive, {:.3f} s batch"
+          .format(nlines, interactive, batch))
+
+
+def main():
+    bench_pipeline()
+    bench_scanner()
+    bench_list_parser()
+    bench_put_nodes()
+    bench_batch()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,486 @@
+"""
+Fake APDL
+
+A small stand-in for an interactive ansys session. It understands a tiny
+subset of APDL, prints prompts and messages the way interactive ansys does
+and can be used to test and benchmark pansys without an ansys installation.
+
+    >>> import sys
+    >>> from pansys import Ansys
+    >>> a = Ansys(startcommand="{} fake_apdl.py".format(sys.executable))
+
+Start the script with ``--delay SECONDS`` to simulate the time ansys takes to
+process a single command.
+
+"""
+import os
+import pickle
+import re
+import sys
+import time
+
+PROMPTS = {
+    "begin": "BEGIN:",
+    "prep7": "PREP7:",
+    "solu": "SOLU_LS1:",
+    "post1": "POST1:",
+    "post26": "POST26:",
+}
+
+
+# Routine numbers of the processors as given by *GET ACTIVE ROUT
+ROUTINES = {"begin": 0, "prep7": 17, "solu": 21, "post1": 31, "post26": 36}
+
+
+def block(kind, text):
+    """Format an ansys message block"""
+    return "\n *** {} ***{}CP =       0.000   TIME= 00:00:00\n {}\n\n".format(
+        kind, " " * 27, text)
+
+
+class FakeAnsys(object):
+    """Interpreter for the small subset of APDL understood by the fake"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.processor = "begin"
+        self.params = {}
+        self.nodes = {}
+        self.elements = {}
+        self.loads = {}
+        self.constraints = {}
+        self.out = sys.stdout
+        self.cfile = None
+        self.page = 99999999
+        self.source = iter(())
+
+    def write(self, text):
+        self.out.write(text)
+
+    def prompt(self):
+        sys.stdout.write("\n {}\n".format(PROMPTS[self.processor]))
+        sys.stdout.flush()
+
+    def error(self, text):
+        self.write(block("ERROR", text))
+
+    def substitute(self, text):
+        """Forced parameter substitution of ``%name%`` strings"""
+        def repl(match):
+            name = match.group(1).lower()
+            if name not in self.params:
+                return match.group(0)
+            return self.format(self.params[name])
+        return re.sub(r"%+(\w+)%", repl, text)
+
+    @staticmethod
+    def format(value):
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def value(self, text):
+        text = text.strip()
+        if not text:
+            return 0.0
+        if text.startswith("'") and text.endswith("'"):
+            return text[1:-1]
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        match = re.match(r"(\w+)\((.*)\)$", text)
+        if match:
+            value = self.params[match.group(1).lower()]
+            for index in match.group(2).split(","):
+                if not isinstance(value, list):
+                    break
+                value = value[int(self.value(index)) - 1]
+            return value
+        return self.params.get(text.lower(), 0.0)
+
+    def run(self, line):
+        """Execute a single line of input"""
+        line = line.strip()
+        if not line:
+            return
+        if line.startswith("!"):
+            return
+        match = re.match(r"(\w+)\s*=(.*)$", line)
+        if match:
+            self.params[match.group(1).lower()] = self.value(match.group(2))
+            return
+        # Commas within brackets, as in a(i,1), do not separate arguments
+        args = [x.strip() for x in re.split(r",(?![^(]*\))", line)]
+        command = args[0].lower()
+        args = args[1:] + [""] * 10
+        if command in ("/header", "/format", "/rgb", "/nopr", "/go",
+                       "/gopr", "/show", "/replot", "/title"):
+            return
+        if command == "/page":
+            self.page = int(args[0] or 99999999)
+        elif command == "/output":
+            if self.out is not sys.stdout:
+                self.out.close()
+            self.out = sys.stdout
+            if args[0]:
+                self.out = open(".".join(x for x in args[:2] if x), "w")
+            return
+        elif command == "/com":
+            self.write(" {}\n".format(self.substitute(line.split(",", 1)[1]
+                                                      if "," in line
+                                                      else "")))
+        elif command in ("/prep7", "/post1", "/post26"):
+            self.processor = command[1:]
+        elif command == "/solu":
+            self.processor = "solu"
+        elif command == "finish":
+            self.processor = "begin"
+        elif command == "/clear":
+            self.__init__(self.delay)
+            self.source = sys.stdin
+        elif command == "/exit":
+            sys.exit(0)
+        elif command == "*del":
+            self.params.pop(args[0].lower(), None)
+        elif command == "*set":
+            self.set(args)
+        elif command == "save":
+            with open(".".join(x for x in args[:2] if x), "wb") as f:
+                pickle.dump(self.model(), f)
+        elif command == "resume":
+            with open(".".join(x for x in args[:2] if x), "rb") as f:
+                (self.params, self.nodes, self.elements, self.loads,
+                 self.constraints) = pickle.load(f)
+        elif command == "parsav":
+            self.parsav(".".join(x for x in args[1:3] if x))
+        elif command == "parres":
+            if args[0].lower() == "new":
+                self.params = {}
+            self.input(args[1], args[2])
+        elif command == "*get":
+            self.get(args)
+        elif command == "n":
+            number = int(args[0]) if args[0] else max(self.nodes, default=0) + 1
+            self.nodes[number] = tuple(float(x or 0) for x in args[1:4])
+        elif command == "e":
+            number = max(self.elements, default=0) + 1
+            self.elements[number] = tuple(int(x) for x in args[:8] if x)
+        elif command == "/input":
+            self.input(args[0], args[1])
+        elif command == "*dim":
+            shape = [int(self.value(x)) for x in args[2:5] if x]
+            if 0 in shape:
+                self.error("*DIM,{} has a dimension of zero.".format(
+                    args[0].upper()))
+                return
+            # Trailing dimensions of 1 are left out
+            while len(shape) > 1 and shape[-1] == 1:
+                shape.pop()
+            fill = "" if args[1].lower() in ("char", "string") else 0.0
+            self.params[args[0].lower()] = self.nested(shape, fill)
+        elif command == "*vread":
+            self.vread(args, next(self.source))
+        elif command == "*do":
+            self.do(args)
+        elif command == "nblock":
+            self.nblock(args, next(self.source))
+        elif command == "eblock":
+            self.eblock(next(self.source))
+        elif command in ("f", "d"):
+            target = self.loads if command == "f" else self.constraints
+            target[(int(self.value(args[0])), args[1].lower())] = \
+                self.value(args[2])
+        elif command == "*vget":
+            self.vget(args)
+        elif command == "*cfopen":
+            self.cfile = open(".".join(x for x in args[:2] if x), "w")
+        elif command == "*cfclos":
+            self.cfile.close()
+            self.cfile = None
+        elif command == "*vwrite":
+            self.vwrite(args, next(self.source))
+        elif command == "nlist":
+            self.listing(" LIST ALL SELECTED NODES.   DSYS=      0",
+                         "    NODE        X                   Y         "
+                         "          Z                 THXY     THYZ     THZX",
+                         ["{:9d}  {:20.13f}{:20.13f}{:20.13f}    0.00     "
+                          "0.00     0.00".format(k, *v)
+                          for k, v in sorted(self.nodes.items())])
+        elif command == "elist":
+            self.listing(" LIST ALL SELECTED ELEMENTS.  (LIST NODES)",
+                         "    ELEM MAT TYP REL ESY SEC        NODES",
+                         ["{:8d}   1   1   1   0   1 ".format(k) +
+                          "".join("{:6d}".format(x) for x in v)
+                          for k, v in sorted(self.elements.items())])
+        elif command == "fake":
+            self.fake(args)
+        else:
+            self.error("{} is not a recognized BEGIN command, abbreviation,"
+                       " or macro.  This command will be ignored."
+                       .format(line.split(",")[0].upper()))
+
+    def model(self):
+        """The data written to the database file by SAVE"""
+        return (self.params, self.nodes, self.elements, self.loads,
+                self.constraints)
+
+    def nested(self, shape, fill):
+        """Nested lists for an array parameter"""
+        if len(shape) == 1:
+            return [fill] * shape[0]
+        return [self.nested(shape[1:], fill) for i in range(shape[0])]
+
+    def set(self, args):
+        """*SET of a scalar, or of consecutive array elements"""
+        match = re.match(r"(\w+)(?:\((.*)\))?$", args[0])
+        name = match.group(1).lower()
+        values = [self.value(x) for x in args[1:] if x] or [0.0]
+        if match.group(2) is None:
+            self.params[name] = values[0]
+            return
+        indices = [int(self.value(x)) for x in match.group(2).split(",")]
+        for offset, value in enumerate(values):
+            target = self.params[name]
+            index = [indices[0] + offset] + indices[1:]
+            while isinstance(target[index[0] - 1], list):
+                target = target[index.pop(0) - 1]
+            target[index[0] - 1] = value
+
+    def parsav(self, fname):
+        """Writes the parameters to a file in the way PARSAV does"""
+        def items(value, index):
+            if not isinstance(value, list):
+                yield index, value
+                return
+            for i, x in enumerate(value):
+                for item in items(x, index + [i + 1]):
+                    yield item
+
+        def literal(value):
+            if isinstance(value, str):
+                return "'{}'".format(value)
+            return "{:22.15E}".format(value)
+
+        with open(fname, "w") as f:
+            f.write("/NOPR\n")
+            for name, value in sorted(self.params.items()):
+                if not isinstance(value, list):
+                    f.write("*SET,{:<32},{}\n".format(name.upper(),
+                                                     literal(value)))
+                    continue
+                elements = list(items(value, []))
+                shape = [max(x[0][i] for x in elements)
+                         for i in range(len(elements[0][0]))]
+                kind = "CHAR" if isinstance(elements[0][1], str) else "ARRAY"
+                f.write("*DIM,{},{},{},{},{}\n".format(
+                    name.upper(), kind, *(shape + [1, 1])[:3]))
+                for index, x in elements:
+                    f.write("*SET,{}({}),{}\n".format(
+                        name.upper(), ",".join(
+                            str(i) for i in (index + [1, 1])[:3]),
+                        literal(x)))
+            f.write("/GO\n")
+
+    def get(self, args):
+        name, entity, entnum, item1, it1num = [x.lower() for x in args[:5]]
+        entnum = int(float(self.value(entnum) if entnum else 0))
+        value = None
+        if entity == "active" and item1 == "rev":
+            value = 15.0
+        elif entity == "active" and item1 == "rout":
+            value = float(ROUTINES[self.processor])
+        elif entity == "node" and item1 == "count":
+            value = float(len(self.nodes))
+        elif entity == "node" and item1 == "num" and it1num == "max":
+            value = float(max(self.nodes, default=0))
+        elif entity == "node" and item1 == "loc" and entnum in self.nodes:
+            value = self.nodes[entnum]["xyz".index(it1num)]
+        elif entity == "elem" and item1 == "count":
+            value = float(len(self.elements))
+        elif entity == "node" and item1 in ("f", "d"):
+            target = self.loads if item1 == "f" else self.constraints
+            value = target.get((entnum, it1num))
+        if value is None:
+            self.error("*GET,{} failed.".format(name.upper()))
+        else:
+            self.params[name] = value
+
+    def listing(self, title, header, rows):
+        """Writes a table with the title and header repeated on every page"""
+        for i in range(0, max(len(rows), 1), self.page):
+            self.write("\n{}\n\n{}\n".format(title, header))
+            for row in rows[i:i + self.page]:
+                self.write(row + "\n")
+
+    def input(self, fname, ext):
+        """Run the commands in a file"""
+        source = self.source
+        with open(".".join(x for x in (fname, ext) if x)) as f:
+            self.source = iter(f.readlines())
+            for line in self.source:
+                self.run(line)
+        self.source = source
+
+    def vget(self, args):
+        name = re.match(r"(\w+)", args[0]).group(1).lower()
+        entity, entnum, item1, it1num = [x.lower() for x in args[1:5]]
+        array = self.params[name]
+        for i in range(len(array)):
+            number = int(float(entnum or 1)) + i
+            if entity == "node" and item1 == "loc":
+                value = self.nodes.get(number, (0.0, 0.0, 0.0))[
+                    "xyz".index(it1num)]
+            elif entity == "node" and item1 == "nsel":
+                value = 1.0 if number in self.nodes else 0.0
+            else:
+                value = 0.0
+            array[i] = value
+
+    def records(self, fmt):
+        """Reads fixed format records with a fortran format from the input
+
+        Yields:
+            list: The text of the fields of each line
+        """
+        widths = []
+        for item in fmt.strip().strip("()").lower().split(","):
+            match = re.match(r"(\d*)([a-z])(\d+)", item.strip())
+            widths += [int(match.group(3))] * int(match.group(1) or 1)
+        for line in self.source:
+            line = line.rstrip("\n")
+            fields = []
+            start = 0
+            for width in widths:
+                field = line[start:start + width]
+                if not field.strip():
+                    break
+                fields.append(field)
+                start += width
+            yield fields
+
+    def nblock(self, args, fmt):
+        # NBLOCK,NUMFIELD,Solkey,NDMAX,NDSEL
+        ndmax = int(args[2]) if len(args) > 2 and args[2] else None
+        for fields in self.records(fmt):
+            if fields[0].lower().startswith("n,r5.3"):
+                break
+            node = int(fields[0])
+            if ndmax is not None and node > ndmax:
+                self.error("Node {} is larger than the maximum node number "
+                           "{} of the NBLOCK.".format(node, ndmax))
+                continue
+            self.nodes[node] = tuple(
+                float(x) for x in (fields[3:6] + ["0", "0", "0"])[:3])
+
+    def eblock(self, fmt):
+        records = self.records(fmt)
+        for fields in records:
+            if fields[0].strip() == "-1":
+                break
+            count = int(fields[8])
+            nodes = fields[11:]
+            if count > 8:
+                nodes += next(records)
+            self.elements[int(fields[10])] = tuple(int(x) for x in nodes)
+
+    def vread(self, args, fmt):
+        name = re.match(r"(\w+)", args[0]).group(1).lower()
+        ncols, nrows = int(self.value(args[5])), int(self.value(args[6]))
+        array = self.params[name]
+        source = self.source
+        with open(".".join(x for x in args[1:3] if x)) as f:
+            self.source = iter(f.readlines())
+            for i, fields in zip(range(nrows), self.records(fmt)):
+                array[i] = [float(x) for x in fields[:ncols]]
+        self.source = source
+
+    def do(self, args):
+        """Runs the lines till the matching *enddo in a loop"""
+        body = []
+        depth = 1
+        for line in self.source:
+            command = line.strip().split(",")[0].lower()
+            depth += {"*do": 1, "*enddo": -1}.get(command, 0)
+            if depth == 0:
+                break
+            body.append(line)
+        name = args[0].lower()
+        start, end = self.value(args[1]), self.value(args[2])
+        step = self.value(args[3]) if args[3] else 1.0
+        value = start
+        source = self.source
+        while value <= end:
+            self.params[name] = value
+            self.source = iter(body)
+            for line in self.source:
+                self.run(line)
+            value += step
+        self.source = source
+
+    def vwrite(self, args, fmt):
+        names = [re.match(r"(\w+)", x).group(1).lower() for x in args if x]
+        columns = [self.params[x] for x in names]
+        out = self.cfile or self.out
+        for row in zip(*columns):
+            out.write("".join("{:24.16E}".format(x) for x in row) + "\n")
+
+    def fake(self, args):
+        """Testing helpers which do not exist in a real ansys session"""
+        kind = args[0].lower()
+        if kind in ("error", "warning", "note"):
+            self.write(block(kind.upper(), args[1] or "Fake message"))
+        elif kind == "spam":
+            for i in range(int(args[1])):
+                self.write(" {:8d}  SPAM LINE OF OUTPUT\n".format(i))
+        elif kind == "sleep":
+            time.sleep(float(args[1]))
+        elif kind == "exit":
+            sys.exit(int(args[1]))
+        elif kind == "crash":
+            os._exit(1)
+        elif kind == "license":
+            # Fails for want of a license the first time only
+            if not os.path.exists("fake_license"):
+                open("fake_license", "w").close()
+                self.write("\n ANSYS LICENSE MANAGER ERROR:\n\n"
+                           " No license available for ansys\n")
+                sys.exit(8)
+
+
+def batch(ansys, argv):
+    """Runs the input file given with -i, writing to the file given with -o"""
+    if "-o" in argv:
+        sys.stdout = open(argv[argv.index("-o") + 1], "w")
+        ansys.out = sys.stdout
+    source = sys.stdin
+    if "-i" in argv:
+        source = open(argv[argv.index("-i") + 1])
+    sys.stdout.write("\n Fake ANSYS Mechanical APDL batch run\n")
+    ansys.source = source
+    for line in source:
+        ansys.run(line)
+    sys.stdout.flush()
+
+
+def main(argv):
+    delay = 0.0
+    if "--delay" in argv:
+        delay = float(argv[argv.index("--delay") + 1])
+    ansys = FakeAnsys(delay)
+    if "-b" in argv:
+        batch(ansys, argv)
+        return
+    sys.stdout.write("\n Fake ANSYS Mechanical APDL\n"
+                     " Working directory: {}\n".format(os.getcwd()))
+    sys.stdout.flush()
+    ansys.source = sys.stdin
+    for line in sys.stdin:
+        if ansys.delay:
+            time.sleep(ansys.delay)
+        ansys.run(line)
+        ansys.prompt()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,53 @@
+"""
+Fake SSH
+
+Stand-in for the ssh command, which runs the remote command on the local
+system. It understands the options used by :mod:`pansys.remote` and keeps
+a file in place of the socket of the master connection.
+
+    >>> import sys
+    >>> from pansys import Ansys
+    >>> a = Ansys(host="node1", ssh="{} fake_ssh.py".format(sys.executable))
+
+Every call is appended to the file given by the environment variable
+``FAKE_SSH_LOG``, if it is set.
+
+"""
+import os
+import subprocess
+import sys
+
+
+def main(argv):
+    options = {}
+    flags = set()
+    args = list(argv)
+    while args and args[0].startswith("-"):
+        flag = args.pop(0)
+        if flag == "-o":
+            key, value = args.pop(0).split("=", 1)
+            options[key] = value
+        elif flag == "-O":
+            options["command"] = args.pop(0)
+        else:
+            flags.add(flag)
+    host = args.pop(0)
+    socket = options.get("ControlPath", "").replace("%C", host)
+    if os.environ.get("FAKE_SSH_LOG"):
+        with open(os.environ["FAKE_SSH_LOG"], "a") as f:
+            f.write("{}\n".format(" ".join(
+                sorted(flags) + [options.get("command", "")] + args)))
+    if options.get("command") == "check":
+        return 0 if os.path.exists(socket) else 255
+    if options.get("command") == "exit":
+        if os.path.exists(socket):
+            os.remove(socket)
+        return 0
+    if "-M" in flags:
+        open(socket, "w").close()
+        return 0
+    return subprocess.call(["sh", "-c", " ".join(args)])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,820 @@
+"""Tests which run against the fake APDL process in ``fake_apdl.py``.
+
+These tests do not need an ansys installation and can be run with:
+
+    python -m unittest pansys.tests.tests_fake
+
+"""
+import unittest
+from pansys import Ansys, AnsysBatch, AnsysPool, AsyncAnsys
+import asyncio
+import time
+import os
+import sys
+
+import numpy as np
+
+FAKE_APDL = "{} {}".format(sys.executable,
+                           os.path.join(os.path.dirname(
+                               os.path.abspath(__file__)), "fake_apdl.py"))
+FAKE_SSH = "{} {}".format(sys.executable,
+                          os.path.join(os.path.dirname(
+                              os.path.abspath(__file__)), "fake_ssh.py"))
+
+
+def fakeAnsys(**kwargs):
+    return Ansys(startcommand=FAKE_APDL, cleanup=True, **kwargs)
+
+
+class FakeTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        import shutil
+        import glob
+        for path in glob.glob("pansys_*"):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class TestFakeSend(FakeTestCase):
+
+    def test_version(self):
+        """Checking version of the fake ansys"""
+        a = fakeAnsys()
+        self.assertEqual(a.version, 15)
+
+    def test_pipeline(self):
+        """Check if a pipelined block executes all the lines"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        a.send("\n".join("n,,{}".format(i) for i in range(500)),
+               pipeline=True)
+        self.assertEqual(a.get("node", "", "count"), 500)
+        a.send("\n   \n", pipeline=True)
+        self.assertEqual(a.output, "")
+
+    def test_pipeline_error(self):
+        """Check if the first error in a pipelined block is raised along with
+        the line which caused it, and the session is usable afterwards"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        with self.assertRaises(RuntimeError) as cm:
+            a.send("n,,1\nbogus,1\nn,,2\nfoo", pipeline=True)
+        self.assertIn("BOGUS", str(cm.exception))
+        self.assertIn("caused by: bogus,1", str(cm.exception))
+        self.assertEqual(a.get("node", "", "count"), 2)
+
+    def test_died(self):
+        """Check if ansys dying in a command raises an OSError"""
+        a = fakeAnsys()
+        with self.assertRaises(OSError):
+            a.send("fake,crash")
+        self.assertFalse(a.alive)
+        b = fakeAnsys()
+        with self.assertRaises(OSError):
+            b.send("n,,1\nfake,crash\nn,,2", pipeline=True)
+        self.assertFalse(b.alive)
+
+    def test_error_keeps_session_in_sync(self):
+        """Check if an error is raised and the next command still gets its
+        own output"""
+        a = fakeAnsys()
+        with self.assertRaises(RuntimeError) as cm:
+            a.send("bogus")
+        self.assertIn("BOGUS is not a recognized", str(cm.exception))
+        self.assertEqual(a.get("active", "", "rev"), 15)
+
+    def test_messages(self):
+        """Check if warnings and notes are collected in the message log"""
+        a = fakeAnsys()
+        a.send("fake,warning,Something is odd")
+        a.send("fake,note,Just saying")
+        self.assertEqual([x.level for x in a.messages], ["WARNING", "NOTE"])
+        self.assertIn("Something is odd", a.messages[0].text)
+        self.assertEqual(a.messages[1].command, "fake,note,Just saying")
+
+    def test_capture(self):
+        """Check if the capture modes limit the output kept in memory"""
+        a = fakeAnsys()
+        a.send("fake,spam,1000")
+        self.assertIn("999  SPAM", a.output)
+        self.assertIn("     0  SPAM", a.output)
+        a.capture = "tail"
+        a.capture_limit = 500
+        a.send("fake,spam,1000")
+        self.assertEqual(len(a.output), 500)
+        self.assertNotIn("     0  SPAM", a.output)
+        self.assertIn("BEGIN:", a.output)
+        a.capture = "discard"
+        a.send("fake,spam,1000")
+        self.assertEqual(a.output, "")
+        self.assertEqual(a.get("active", "", "rev"), 15)
+        a.send("fake,spam,10", capture="full")
+        self.assertIn("9  SPAM", a.output)
+
+    def test_iter_output(self):
+        """Check if iter_output yields the lines of output as they arrive"""
+        a = fakeAnsys()
+        lines = [x for x in a.iter_output("fake,spam,100")
+                 if "SPAM" in x]
+        self.assertEqual(len(lines), 100)
+        self.assertFalse(lines[-1].endswith("\n"))
+        for line in a.iter_output("fake,spam,100"):
+            break
+        self.assertEqual(a.get("active", "", "rev"), 15)
+        with self.assertRaises(RuntimeError):
+            list(a.iter_output("bogus"))
+
+    def test_submit(self):
+        """Check if submitted commands run in order in the background"""
+        a = fakeAnsys()
+        start = time.time()
+        slow = a.submit("fake,sleep,1")
+        self.assertLess(time.time() - start, 0.5)
+        node = a.submit("/prep7\nn,1,1,2,3")
+        failed = a.submit("bogus")
+        self.assertIn("BOGUS", str(failed.exception()))
+        self.assertTrue(slow.done() and node.done())
+        self.assertEqual(a.get("node", "", "count"), 1)
+        self.assertIn("HELLO", a.submit("/com,HELLO").result())
+
+    def test_threads(self):
+        """Check if a session can be shared between threads"""
+        from concurrent.futures import ThreadPoolExecutor
+        a = fakeAnsys()
+        a.send("/prep7")
+        for i in range(1, 21):
+            a.send("n,{},{}".format(i, i))
+        with ThreadPoolExecutor(4) as executor:
+            values = list(executor.map(
+                lambda i: a.get("node", i, "loc", "x"), range(1, 21)))
+        self.assertEqual(values, list(range(1, 21)))
+
+    def test_queues(self):
+        """Check named queues, automatic runs and runs in the background"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        for i in range(1, 11):
+            a.queue("n,{},{}".format(i, i), name="nodes")
+        a.queue("fake,sleep,1", name="slow")
+        self.assertEqual(len(a.get_queue("nodes").readlines()), 10)
+        self.assertEqual(a.get("node", "", "count"), 0)
+        run = a.run_queue("nodes")
+        self.assertEqual((run.name, run.lines), ("nodes", 10))
+        self.assertEqual(a.get("node", "", "count"), 10)
+        start = time.time()
+        slow = a.run_queue("slow", wait=False)
+        self.assertLess(time.time() - start, 0.5)
+        a.queue_max_lines = 4
+        for i in range(11, 21):
+            a.queue("n,{},{}".format(i, i))
+        self.assertGreater(slow.result().seconds, 0.9)
+        self.assertEqual(a.get("node", "", "count"), 20)
+        self.assertEqual(len(a.get_queue().readlines()), 0)
+        self.assertEqual(sorted(x.lines for x in a.queue_runs), [1, 5, 5, 10])
+
+
+class TestFakeGet(FakeTestCase):
+
+    def test_get_cache(self):
+        """Check if get results are cached till something changes"""
+        a = fakeAnsys()
+        a.cache_size = 2
+        sent = []
+        send = a.send
+        a.send = lambda *args, **kwargs: (sent.append(args[0]),
+                                          send(*args, **kwargs))
+        a.send("/prep7")
+        self.assertEqual(a.get("node", "", "count"), 0)
+        self.assertEqual(a.get("node", "", "count"), 0)
+        self.assertEqual(len(sent), 4)
+        a.send("/com,nothing changes")
+        self.assertEqual(a.get("node", "", "count"), 0)
+        self.assertEqual(len(sent), 5)
+        a.send("n,1,5")
+        self.assertEqual(a.get("node", "", "count"), 1)
+        self.assertEqual(a.get("node", "", "num", "max"), 1)
+        self.assertEqual(a.get("node", 1, "loc", "x"), 5)
+        # The least recently used result was dropped
+        del sent[:]
+        a.get("node", 1, "loc", "x")
+        a.get("node", "", "count")
+        self.assertEqual(len(sent), 3)
+        a.version
+        a.version
+        self.assertEqual(len(sent), 6)
+        # Parameters in the arguments may change
+        a.send("n,2,7")
+        a.send("k=1")
+        self.assertEqual(a.get("node", "k", "loc", "x"), 5)
+        a.send("k=2")
+        self.assertEqual(a.get("node", "k", "loc", "x"), 7)
+        a.send("*set,k,1")
+        self.assertEqual(a.get("node", "k", "loc", "x"), 5)
+
+    def test_get_array(self):
+        """Check if get_array extracts the coordinates of all the nodes"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        self.assertEqual(len(a.get_array("node", "loc", "x")), 0)
+        for i in range(1, 11):
+            a.send("n,{},{},{}".format(i, i * 0.5, -i))
+        x = a.get_array("node", "loc", "x")
+        self.assertEqual(len(x), 10)
+        self.assertEqual(x[3], 2.0)
+        y = a.get_array("node", "loc", "y", count=5)
+        self.assertEqual(list(y), [-1, -2, -3, -4, -5])
+        self.assertEqual([x for x in os.listdir(a.wd) if x != "input.inp"],
+                         [])
+
+    def test_get_many(self):
+        """Check if get_many returns the same values as get"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        a.send("n,1,1.5\nn,7,2")
+        g = a.get_many([("node", "", "count"), ("node", 7, "loc", "x"),
+                        ("active", "", "rev")])
+        self.assertEqual(g, {("node", "", "count"): 2,
+                             ("node", 7, "loc", "x"): 2,
+                             ("active", "", "rev"): 15})
+        g = a.get_many({"x": ("node", 1, "loc", "x"),
+                        "nmax": ("node", "", "num", "max")})
+        self.assertEqual(g, {"x": 1.5, "nmax": 7})
+
+    def test_parameters(self):
+        """Check if parameters and arrays are exchanged in one go"""
+        a = fakeAnsys()
+        a.send("width=2.5")
+        a.send("*dim,loads,array,3")
+        a.send("*set,loads(2),7")
+        params = a.get_parameters()
+        self.assertEqual(params["width"], 2.5)
+        np.testing.assert_array_equal(params["loads"], [0, 7, 0])
+        self.assertNotIn("mypar__", params)
+        grid = np.arange(24.0).reshape(12, 2)
+        a.set_parameters({"width": 1e-05, "mat": "steel", "grid": grid,
+                          "names": np.array(["a", "bc"])})
+        params = a.get_parameters(["GRID", "mat", "names", "width"])
+        self.assertEqual(sorted(params), ["grid", "mat", "names", "width"])
+        self.assertEqual(params["width"], 1e-05)
+        self.assertEqual(params["mat"], "steel")
+        np.testing.assert_array_equal(params["grid"], grid)
+        self.assertEqual(list(params["names"]), ["a", "bc"])
+        with self.assertRaises(ValueError):
+            a.set_parameters({"1st": 1})
+
+    def test_snapshot(self):
+        """Check if a session is restored from a snapshot"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        a.put_nodes([1, 2], [[0, 0, 0], [1, 0, 0]])
+        a.set_parameters({"loads": np.array([1.0, 2.0])})
+        snap = a.snapshot()
+        a.send("n,3,5")
+        a.put_nodes([4], [[7, 0, 0]])
+        a.send("width=2")
+        # Listings and internal commands are not journaled
+        a.get("node", "", "count")
+        a.get_many([("node", "", "count")])
+        a.get_list("nlist")
+        a.get_array("node", "loc", "x")
+        a.get_parameters()
+        self.assertEqual(snap.journal[0], "n,3,5")
+        self.assertEqual(snap.journal[2:], ["width=2"])
+        with self.assertRaises(RuntimeError):
+            a.send("bogus")
+        process = a.process
+        with self.assertRaises(OSError):
+            a.send("fake,crash")
+        # A new ansys was started and brought to the same state
+        self.assertIsNot(a.process, process)
+        self.assertEqual(a.get("node", "", "count"), 4)
+        self.assertEqual(a.get("node", 4, "loc", "x"), 7)
+        self.assertEqual(a.get_parameters(["width"]), {"width": 2.0})
+        self.assertIn("PREP7", a.output)
+        self.assertNotIn("fake,crash", snap.journal)
+        # The snapshot brings another session to the same state
+        b = fakeAnsys()
+        b.restore(snap)
+        self.assertEqual(b.get("node", "", "count"), 4)
+        params = b.get_parameters(["loads", "width"])
+        np.testing.assert_array_equal(params["loads"], [1, 2])
+        self.assertEqual(params["width"], 2)
+        # The other session has a journal of its own
+        size = len(snap.journal)
+        b.send("n,10")
+        self.assertEqual(len(snap.journal), size)
+        b.exit()
+
+
+class TestFakeGetList(FakeTestCase):
+
+    def createModel(self, nnodes=10):
+        a = fakeAnsys()
+        a.send("/prep7")
+        a.send("\n".join("n,,{},{}".format(i, -i)
+                         for i in range(1, nnodes + 1)), pipeline=True)
+        a.send("\n".join("e,1,{}".format(i) for i in range(2, nnodes + 1)),
+               pipeline=True)
+        return a
+
+    def test_nlist_elist(self):
+        """Check if get_list("nlist") and get_list("elist") are working"""
+        a = self.createModel()
+        n = a.get_list("nlist")
+        self.assertEqual(n.NODE.max(), 10)
+        self.assertEqual(n.X.max(), 10)
+        self.assertEqual(n.NODE.dtype.kind, "i")
+        e = a.get_list("elist")
+        self.assertEqual(e.ELEM.max(), 9)
+        self.assertEqual(list(e.columns[-2:]), ["NODES", "NODES_2"])
+
+    def test_page_breaks(self):
+        """Check if headers repeated at page breaks are skipped"""
+        a = self.createModel(100)
+        a.send("/page,7")
+        n = a.get_list("nlist")
+        self.assertEqual(len(n), 100)
+        self.assertEqual(list(n.NODE), list(range(1, 101)))
+        self.assertEqual(n.Y.min(), -100)
+
+    def test_output_files(self):
+        """Check if the output files of get_list are removed"""
+        import glob
+        a = self.createModel(100)
+        a.get_list("nlist")
+        chunks = a.get_list("nlist", chunksize=30)
+        self.assertEqual(len(next(chunks)), 30)
+        self.assertEqual(len(glob.glob(os.path.join(a.wd, "*.out"))), 1)
+        self.assertEqual(sum(len(x) for x in chunks), 70)
+        with a.output_file("nlist") as f:
+            with open(f) as fh:
+                self.assertIn("LIST ALL SELECTED NODES", fh.read())
+        self.assertFalse(os.path.exists(f))
+        self.assertEqual(glob.glob(os.path.join(a.wd, "pansys_*")), [])
+
+    def test_fifo(self):
+        """Check if lists are read through a named pipe"""
+        import glob
+        a = self.createModel(1000)
+        a.send("/page,50")
+        n = a.get_list("nlist", fifo=True)
+        self.assertEqual(list(n.NODE), list(range(1, 1001)))
+        self.assertEqual(str(n.NODE.dtype), "int32")
+        a.fifo = True
+        self.assertEqual(len(a.get_list("elist")), 999)
+        self.assertEqual(glob.glob(os.path.join(a.wd, "pansys_*")), [])
+
+    def test_compact(self):
+        """Check if known lists get compact column types by default"""
+        a = self.createModel()
+        n = a.get_list("nlist")
+        self.assertEqual(str(n.NODE.dtype), "int32")
+        self.assertEqual(str(n.X.dtype), "float64")
+        self.assertEqual(str(n.THXY.dtype), "float32")
+        e = a.get_list("elist")
+        self.assertTrue(all(str(x) == "int32" for x in e.dtypes))
+        n = a.get_list("nlist", compact=False)
+        self.assertEqual(str(n.NODE.dtype), "int64")
+        self.assertEqual(str(n.THXY.dtype), "float64")
+        n = a.get_list("nlist", skiprows=3, compact=True)
+        self.assertEqual(str(n.NODE.dtype), "int32")
+        # The defaults apply with other read_table arguments too
+        n = a.get_list("nlist", skiprows=3, usecols=["NODE", "X", "THXY"])
+        self.assertEqual(str(n.NODE.dtype), "int32")
+        self.assertEqual(str(n.X.dtype), "float64")
+        self.assertEqual(str(n.THXY.dtype), "float32")
+        n = a.get_list("nlist", skiprows=3, dtype={"NODE": np.int64})
+        self.assertEqual(str(n.NODE.dtype), "int64")
+        self.assertEqual(str(n.THXY.dtype), "float32")
+
+    def test_chunksize(self):
+        """Check if get_list returns the list in pieces with chunksize"""
+        a = self.createModel(100)
+        a.send("/page,7")
+        chunks = list(a.get_list("nlist", chunksize=30, compact=False))
+        self.assertEqual([len(x) for x in chunks], [30, 30, 30, 10])
+        self.assertEqual(chunks[1].index[0], 30)
+        self.assertEqual(chunks[3].NODE.max(), 100)
+        import pandas as pd
+        pd.testing.assert_frame_equal(pd.concat(chunks),
+                                      a.get_list("nlist", compact=False))
+
+    def test_mixed_column(self):
+        """Check if a column is only made integer if all rows are whole"""
+        from pansys.utility_functions import ListParser
+        parser = ListParser()
+        blocks = parser.feed(b" NODE VAL\n 1 1\n 2 1.5\n 3 2.7\n")
+        df = parser.frame(blocks + parser.close())
+        self.assertEqual(df.NODE.dtype.kind, "i")
+        self.assertEqual(df.VAL.dtype.kind, "f")
+        self.assertEqual(list(df.VAL), [1, 1.5, 2.7])
+
+
+class TestFakeModel(FakeTestCase):
+
+    def test_put_nodes(self):
+        """Check if nodes are created from arrays"""
+        import numpy as np
+        a = fakeAnsys()
+        a.send("/prep7")
+        xyz = np.random.rand(500, 3) * 2000 - 1000
+        a.put_nodes(np.arange(1, 501), xyz)
+        self.assertEqual(a.get("node", "", "count"), 500)
+        for i, x in enumerate("xyz"):
+            self.assertTrue(np.allclose(a.get_array("node", "loc", x),
+                                        xyz[:, i]))
+        a.put_nodes([100000000], [[1, 2]])
+        self.assertEqual(a.get("node", 100000000, "loc", "y"), 2)
+        a.put_nodes([1000, 7, 2000], [[1], [2], [3]])
+        self.assertEqual(a.get("node", "", "count"), 503)
+        self.assertEqual(a.get("node", 2000, "loc", "x"), 3)
+
+    def test_put_elements(self):
+        """Check if elements with up to 20 nodes are created"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        a.put_nodes(range(1, 21), [[i, 0, 0] for i in range(1, 21)])
+        a.put_elements([1, 2], [[1, 2, 3, 4], [2, 3, 4, 5]])
+        a.put_elements([3], [list(range(1, 21))], etype=2)
+        e = a.get_list("elist")
+        self.assertEqual(list(e.ELEM), [1, 2, 3])
+        self.assertEqual(list(e.iloc[1, 6:10]), [2, 3, 4, 5])
+        self.assertEqual(e.iloc[2, -1], 20)
+
+    def test_put_loads(self):
+        """Check if loads and constraints are applied from arrays"""
+        a = fakeAnsys()
+        a.send("/prep7")
+        a.put_nodes(range(1, 11), [[i] for i in range(1, 11)])
+        a.put_loads([1, 2, 3], "fx", [1.5, -2.0, 3e5])
+        a.put_constraints(range(4, 11), "ux")
+        a.put_constraints([10], "uy", 0.25)
+        self.assertEqual(a.get("node", 3, "f", "fx"), 3e5)
+        self.assertEqual(a.get("node", 2, "f", "fx"), -2)
+        self.assertEqual(a.get("node", 7, "d", "ux"), 0)
+        self.assertEqual(a.get("node", 10, "d", "uy"), 0.25)
+
+
+class TestFakeBatch(FakeTestCase):
+
+    def test_batch(self):
+        """Check if a recorded deck is run in batch mode"""
+        with AnsysBatch(startcommand=FAKE_APDL, cleanup=True) as a:
+            a.send("/prep7")
+            for i in range(1, 101):
+                a.queue("n,{},{}".format(i, i * 2))
+            self.assertEqual(a.run_queue().lines, 100)
+            count = a.get("node", "", "count")
+            missing = a.get("node", 500, "loc", "x")
+            nodes = a.get_list("nlist")
+            self.assertFalse(count.done())
+            self.assertTrue(a.run().endswith(".out"))
+            self.assertEqual(count.result(), 100)
+            self.assertEqual(nodes.result().X.max(), 200)
+            with self.assertRaises(ValueError):
+                missing.result()
+            # A new run starts with an empty database
+            count = a.get("node", "", "count")
+        self.assertEqual(count.result(), 0)
+        self.assertFalse(os.path.exists(a.wd))
+
+
+class TestFakeScheduler(FakeTestCase):
+
+    def setUp(self):
+        import tempfile
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.folder, ignore_errors=True)
+        super(TestFakeScheduler, self).tearDown()
+
+    def deck(self, name, commands):
+        path = os.path.join(self.folder, name + ".inp")
+        with open(path, "w") as f:
+            f.write(commands + "\nfinish\n/exit\n")
+        return path
+
+    def test_scheduler(self):
+        """Check if jobs are run by priority and retried without license"""
+        from pansys.scheduler import Scheduler
+        scheduler = Scheduler(FAKE_APDL, self.folder, retry_delay=0.1)
+        first = scheduler.submit(self.deck("first", "fake,sleep,0.5"))
+        low = scheduler.submit(self.deck("low", "/prep7\nn,1"))
+        high = scheduler.submit(self.deck("high", "/prep7"), priority=5)
+        license = scheduler.submit(self.deck("license", "fake,license"))
+        failed = scheduler.submit(self.deck("failed", "fake,exit,3"))
+        with self.assertRaises(ValueError):
+            scheduler.submit(low.deck, licenses=2)
+        self.assertTrue(scheduler.wait(timeout=60))
+        scheduler.close()
+        self.assertEqual([x.state for x in (first, low, high, license)],
+                         ["done"] * 4)
+        self.assertLess(high.started, low.started)
+        self.assertEqual(license.attempts, 2)
+        self.assertEqual((failed.state, failed.returncode), ("failed", 3))
+        self.assertTrue(os.path.exists(os.path.join(low.wd, "low.inp")))
+        metrics = scheduler.metrics()
+        self.assertEqual((metrics["done"], metrics["failed"]), (4, 1))
+        self.assertGreater(metrics["wait_max"], 0.4)
+        # A new scheduler continues from the state file
+        import json
+        with open(scheduler.state_file) as f:
+            state = json.load(f)
+        state["jobs"][1]["state"] = "running"
+        with open(scheduler.state_file, "w") as f:
+            json.dump(state, f)
+        with Scheduler(FAKE_APDL, self.folder) as scheduler:
+            self.assertEqual(len(scheduler.jobs), 5)
+            self.assertTrue(scheduler.wait(timeout=60))
+            self.assertEqual(scheduler.jobs[1].attempts, 2)
+
+
+class TestFakePool(FakeTestCase):
+
+    def test_checkout_checkin(self):
+        """Check if sessions are reused and reset when given back"""
+        with AnsysPool(2, startcommand=FAKE_APDL, cleanup=True) as pool:
+            self.assertEqual(len(pool), 2)
+            with pool.session() as a:
+                a.send("/prep7")
+                a.send("n,,1")
+                b = pool.checkout()
+                self.assertIsNot(a, b)
+                pool.checkin(b)
+            with pool.session() as c:
+                with pool.session() as d:
+                    self.assertEqual({a, b}, {c, d})
+                    self.assertEqual(c.get("node", "", "count"), 0)
+                    self.assertEqual(d.get("node", "", "count"), 0)
+
+    def test_replace_crashed(self):
+        """Check if a crashed session is replaced"""
+        with AnsysPool(1, startcommand=FAKE_APDL, cleanup=True) as pool:
+            with pool.session() as a:
+                a.process.terminate(force=True)
+            with pool.session(timeout=10) as b:
+                self.assertIsNot(a, b)
+                self.assertEqual(b.version, 15)
+
+    def test_replace_not_reset(self):
+        """Check if a session which could not be reset is replaced"""
+        def reset():
+            raise RuntimeError("Reset failed")
+        with AnsysPool(1, startcommand=FAKE_APDL, cleanup=True) as pool:
+            with pool.session() as a:
+                a.send("/prep7")
+                a.send("n,,1")
+                a.reset = reset
+            with pool.session(timeout=10) as b:
+                self.assertIsNot(a, b)
+                self.assertEqual(b.get("node", "", "count"), 0)
+
+    def test_map(self):
+        """Check if a sweep returns the results in order"""
+        def run(ans, count):
+            ans.send("/prep7")
+            for i in range(count):
+                ans.send("n,,{}".format(i))
+            return ans.get("node", "", "count")
+        with AnsysPool(2, startcommand=FAKE_APDL, cleanup=True) as pool:
+            self.assertEqual(list(pool.map(run, [3, 1, 4, 2])), [3, 1, 4, 2])
+            done = dict(pool.as_completed(run, [5, 2]))
+            self.assertEqual(done, {5: 5, 2: 2})
+            # The rest of an abandoned sweep is not run
+            started = []
+            results = pool.map(lambda ans, x: started.append(x), range(20))
+            next(results)
+            results.close()
+            self.assertLess(len(started), 20)
+
+    def test_failed_start(self):
+        """Check if the started sessions are exited when one fails"""
+        started = []
+
+        class Pool(AnsysPool):
+            def _start(self, host):
+                if host == "bad":
+                    raise OSError("Ansys did not start!")
+                started.append(AnsysPool._start(self, host))
+                return started[-1]
+        with self.assertRaises(OSError):
+            Pool(startcommand=FAKE_APDL, cleanup=True,
+                 host={None: 2, "bad": 1})
+        self.assertEqual(len(started), 2)
+        self.assertFalse(any(x.alive for x in started))
+
+    def test_working_folders(self):
+        """Check if sessions started at once get folders of their own"""
+        import shutil
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from pansys.interactive import _working_folder
+        parent = tempfile.mkdtemp()
+        try:
+            with ThreadPoolExecutor(16) as executor:
+                folders = list(executor.map(
+                    lambda i: _working_folder(None, parent)[0], range(64)))
+            self.assertEqual(len(set(folders)), 64)
+        finally:
+            shutil.rmtree(parent)
+
+    def test_distribute(self):
+        """Check the sessions for each host"""
+        from pansys.pool import _distribute
+        self.assertEqual(_distribute(None, None, None), [None])
+        self.assertEqual(_distribute(3, "a", 2), ["a", "a"])
+        hosts = _distribute(None, {None: 2, "a": 8, "b": 4}, 7)
+        self.assertEqual(len(hosts), 7)
+        self.assertEqual([hosts.count(x) for x in (None, "a", "b")],
+                         [1, 4, 2])
+
+
+class TestFakeServer(FakeTestCase):
+
+    def test_client(self):
+        """Check if clients use the warm sessions of the server"""
+        import tempfile
+        import threading
+        from pansys import AnsysClient
+        from pansys.server import SessionServer
+        path = os.path.join(tempfile.mkdtemp(), "pansys.sock")
+        server = SessionServer(path, AnsysPool(1, startcommand=FAKE_APDL,
+                                               cleanup=True))
+        threading.Thread(target=server.serve_forever).start()
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        try:
+            with AnsysClient(path) as a:
+                a.send("/prep7")
+                for i in range(1, 11):
+                    a.queue("n,{},{}".format(i, i))
+                self.assertEqual(a.run_queue()[1], 10)
+                self.assertEqual(a.get("node", "", "count"), 10)
+                self.assertEqual(a.get_many([("node", "", "count")]),
+                                 {("node", "", "count"): 10})
+                np.testing.assert_array_equal(
+                    a.get_array("node", "loc", "x"), np.arange(1, 11))
+                df = a.get_list("nlist")
+                self.assertEqual(df.X.max(), 10)
+                self.assertEqual(df.NODE.dtype, np.int32)
+                with self.assertRaises(RuntimeError):
+                    a.send("bogus")
+                with self.assertRaises(AttributeError):
+                    a._call("exit")
+            # The next client gets the session after a reset
+            with AnsysClient(path) as a:
+                self.assertEqual(a.get("node", "", "count"), 0)
+            with self.assertRaises(OSError):
+                SessionServer(path, None)
+        finally:
+            server.close()
+        self.assertFalse(os.path.exists(path))
+        os.rmdir(os.path.dirname(path))
+
+    def test_serve_options(self):
+        """Check if sessions of a server can not share a start folder"""
+        import contextlib
+        import io
+        from pansys.__main__ import main
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(["serve", "--size", "2", "--startfolder", "."])
+
+    def test_light_import(self):
+        """Check if the client does not import pandas and pexpect"""
+        import subprocess
+        code = ("import sys, pansys; pansys.AnsysClient; "
+                "print('pandas' in sys.modules or 'pexpect' in sys.modules)")
+        self.assertEqual(subprocess.check_output(
+            [sys.executable, "-c", code]).strip(), b"False")
+
+
+class TestFakeAsync(FakeTestCase):
+
+    def test_send_get(self):
+        """Check send, get and get_list of an asynchronous session"""
+        async def run():
+            async with await AsyncAnsys.create(FAKE_APDL,
+                                               cleanup=True) as a:
+                await a.send("/prep7\nn,1,1,2,3\nn,2,4,5,6")
+                self.assertEqual(await a.get("node", "", "count"), 2)
+                files = sorted(os.listdir(a.wd))
+                df = await a.get_list("nlist")
+                self.assertEqual(list(df.NODE), [1, 2])
+                chunks = await a.get_list("nlist", chunksize=1)
+                self.assertEqual([len(x) for x in chunks], [1, 1])
+                self.assertEqual(sorted(os.listdir(a.wd)), files)
+                with self.assertRaises(RuntimeError):
+                    await a.send("bogus")
+                self.assertEqual(await a.get("active", "", "rev"), 15)
+        asyncio.run(run())
+
+    def test_wrong_command(self):
+        """Checking if a wrong command will raise an OSError"""
+        async def run():
+            for command in ("ansys1212121", "true", "ls"):
+                with self.assertRaises(OSError):
+                    await AsyncAnsys.create(startcommand=command)
+        asyncio.run(run())
+
+    def test_concurrent(self):
+        """Check if two sessions work at the same time"""
+        async def run():
+            a, b = await asyncio.gather(
+                AsyncAnsys.create(FAKE_APDL, cleanup=True),
+                AsyncAnsys.create(FAKE_APDL, cleanup=True))
+            start = time.time()
+            await asyncio.gather(a.send("fake,sleep,1"),
+                                 b.send("fake,sleep,1"))
+            self.assertLess(time.time() - start, 1.8)
+            await asyncio.gather(a.exit(), b.exit())
+            self.assertFalse(a.alive or b.alive)
+        asyncio.run(run())
+
+
+class TestFakeRemote(FakeTestCase):
+
+    def setUp(self):
+        import tempfile
+        from uuid import uuid4
+        self.tmp = tempfile.mkdtemp()
+        self.host = "node-{}".format(uuid4().hex[:8])
+        self.log = os.path.join(self.tmp, "ssh.log")
+        os.environ["FAKE_SSH_LOG"] = self.log
+
+    def tearDown(self):
+        import shutil
+        from pansys.remote import connection
+        connection(self.host, FAKE_SSH).close()
+        del os.environ["FAKE_SSH_LOG"]
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        super(TestFakeRemote, self).tearDown()
+
+    def test_shared_connection(self):
+        """Check if the sessions on a host share one master connection"""
+        with AnsysPool(2, startcommand=FAKE_APDL, host=self.host,
+                       ssh=FAKE_SSH, cleanup=True) as pool:
+            with pool.session() as a:
+                self.assertEqual(a.version, 15)
+                # The local folder is visible to the fake remote system
+                self.assertTrue(a._shared)
+        with open(self.log) as f:
+            calls = f.read().splitlines()
+        self.assertEqual(len([x for x in calls if x.startswith("-M")]), 1)
+
+    def test_not_shared(self):
+        """Check if the output files are copied from the remote system"""
+        a = Ansys(startcommand=FAKE_APDL, host=self.host, ssh=FAKE_SSH,
+                  cleanup=True)
+        # The fake remote system shares the folder, which is not looked at
+        # when copying files back and forth.
+        a._shared = False
+        a.send("/prep7\nn,1,1,2,3\nn,2,4,5,6")
+        self.assertEqual(list(a.get_list("nlist").NODE), [1, 2])
+        self.assertEqual(list(a.get_array("node", "loc", "y")), [2.0, 5.0])
+        a.put_loads([1, 2], "fx", 1.5)
+        import glob
+        self.assertEqual(glob.glob(os.path.join(a.wd, "pansys_*")), [])
+        with open(self.log) as f:
+            calls = f.read()
+        self.assertIn("cat", calls)
+        # The copies pushed to the remote system are deleted there too
+        self.assertIn("rm -f", calls)
+        a.exit()
+        self.assertFalse(os.path.exists(a.wd))
+
+    def test_files(self):
+        """Check the file operations of a connection"""
+        from pansys.remote import connection
+        con = connection(self.host, FAKE_SSH)
+        folder = os.path.join(self.tmp, "remote folder")
+        con.mkdir(folder)
+        self.assertTrue(con.exists(folder))
+        local = os.path.join(self.tmp, "local.txt")
+        with open(local, "w") as f:
+            f.write("pansys\n" * 1000)
+        con.push(local, os.path.join(folder, "a.txt"))
+        self.assertEqual(con.run("wc -l < '{}/a.txt'".format(folder)).strip(),
+                         "1000")
+        con.pull(os.path.join(folder, "a.txt"), local + ".back")
+        with open(local + ".back") as f:
+            self.assertEqual(f.read(), "pansys\n" * 1000)
+        big = os.path.join(folder, "big.txt")
+        with open(big, "w") as f:
+            for i in range(200000):
+                f.write("{:9d} {:20.13f}\n".format(i, i * 0.5))
+        for compress in (None, True, False):
+            con.pull(big, local, compress=compress)
+            with open(local) as f, open(big) as g:
+                self.assertEqual(f.read(), g.read())
+        con.remove(big)
+        self.assertFalse(con.exists(big))
+        con.rmtree(folder)
+        self.assertFalse(con.exists(folder))
+        with self.assertRaises(OSError):
+            con.run("false")
+
+
+if __name__ == "__main__":
+    unittest.main()
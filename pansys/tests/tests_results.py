@@ -0,0 +1,145 @@
+import unittest
+from pansys import ResultFile
+import numpy as np
+import os
+import tempfile
+
+
+def record(data, dtype="<i4", flags=0):
+    """Returns the bytes of a record in an ansys binary file"""
+    data = np.asarray(data, dtype=dtype).tobytes()
+    nwords = len(data) // 4
+    return np.array([nwords, flags], "<u4").tobytes() + data + \
+        np.array([nwords], "<i4").tobytes()
+
+
+def writeResultFile(filename, nodes, elements, solutions, times,
+                    dtype="<f8", flags=0, preckey=0):
+    """Writes a minimal result file with nodal and element solutions
+
+    ``solutions`` is a list with a tuple of the nodal solution array and a
+    list of element nodal stress arrays for each result set. The solution
+    records are written as ``dtype`` with the record ``flags``.
+    """
+    nnod, numdof = solutions[0][0].shape
+    nsets = len(solutions)
+    parts = [record(np.zeros(100))]
+
+    def pointer():
+        return sum(len(x) for x in parts) // 4
+
+    header = np.zeros(80, "<i4")
+    parts.append(None)
+    parts[1] = record(header)
+    parts.append(record(np.arange(1, numdof + 1)))
+    ptr_nod = pointer()
+    parts.append(record(nodes))
+    ptr_elm = pointer()
+    parts.append(record(elements))
+    ptr_tim = pointer()
+    parts.append(record(times, "<f8"))
+    set_pointers = []
+    for nodal, ens in solutions:
+        ptr_sol = pointer()
+        set_pointers.append(ptr_sol)
+        sol_header = np.zeros(100, "<i4")
+        sol_header[1:3] = len(elements), nnod
+        size = len(record(sol_header)) // 4
+        sol_header[10] = size
+        nodal_record = record(nodal.ravel(), dtype, flags)
+        sol_header[11] = size + len(nodal_record) // 4
+        parts.append(record(sol_header))
+        parts.append(nodal_record)
+        offset = sol_header[11] + len(elements) + 3
+        index = []
+        element_parts = []
+        for stress in ens:
+            index.append(offset)
+            items = np.zeros(25, "<i4")
+            items[2] = 28
+            element_parts.append(record(items))
+            element_parts.append(record(stress, dtype, flags))
+            offset += sum(len(x) for x in element_parts[-2:]) // 4
+        parts.append(record(index))
+        parts += element_parts
+    ptr_dsi = pointer()
+    parts.append(record(set_pointers + [0] * len(set_pointers)))
+    header[[1, 2, 3, 4, 5, 6, 8]] = (max(nodes), nnod, nsets, numdof,
+                                     max(elements), len(elements), nsets)
+    header[[10, 11, 13, 14]] = ptr_dsi, ptr_tim, ptr_elm, ptr_nod
+    header[30] = preckey
+    parts[1] = record(header)
+    with open(filename, "wb") as f:
+        f.write(b"".join(parts))
+
+
+class TestResultFile(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix=".rst")
+        os.close(fd)
+        self.nodal = [np.arange(12.0).reshape(4, 3),
+                      -np.arange(12.0).reshape(4, 3)]
+        self.ens = [np.arange(6.0), np.arange(6.0) + 10]
+        writeResultFile(self.filename, [1, 2, 5, 6], [3, 4],
+                        [(self.nodal[0], self.ens), (self.nodal[1], [])],
+                        [0.5, 1.0])
+
+    def test_headers(self):
+        """Check if the tables in the result file header are read"""
+        rst = ResultFile(self.filename)
+        self.assertEqual(rst.nsets, 2)
+        self.assertEqual(list(rst.nodes), [1, 2, 5, 6])
+        self.assertEqual(list(rst.elements), [3, 4])
+        self.assertEqual(rst.dof, ["UX", "UY", "UZ"])
+        self.assertEqual(list(rst.time_values), [0.5, 1.0])
+
+    def test_nodal_solution(self):
+        """Check if the nodal solution of each result set is read"""
+        rst = ResultFile(self.filename)
+        np.testing.assert_array_equal(rst.nodal_solution(1), self.nodal[0])
+        np.testing.assert_array_equal(rst.nodal_solution(2), self.nodal[1])
+        with self.assertRaises(ValueError):
+            rst.nodal_solution(3)
+
+    def test_element_solution(self):
+        """Check if the element nodal stresses are read"""
+        rst = ResultFile(self.filename)
+        ens = rst.element_solution(1)
+        np.testing.assert_array_equal(ens[1], self.ens[1])
+        self.assertEqual(rst.element_solution(1, "EPL"), [None, None])
+
+    def writeFile(self, **kwargs):
+        writeResultFile(self.filename, [1, 2, 5, 6], [3, 4],
+                        [(self.nodal[0], self.ens)], [0.5], **kwargs)
+        return ResultFile(self.filename)
+
+    def test_single_precision(self):
+        """Check if single precision solutions are read"""
+        from pansys.results import RECORD_SINGLE
+        for kwargs in ({"preckey": 1}, {"flags": RECORD_SINGLE}):
+            rst = self.writeFile(dtype="<f4", **kwargs)
+            nodal = rst.nodal_solution(1)
+            self.assertEqual(nodal.dtype, np.float32)
+            np.testing.assert_array_equal(nodal, self.nodal[0])
+            np.testing.assert_array_equal(rst.element_solution(1)[1],
+                                          self.ens[1])
+            del rst, nodal
+
+    def test_compressed(self):
+        """Check if sparse and compressed records raise a ValueError"""
+        from pansys.results import RECORD_BSPARSE, RECORD_ZLIB
+        for flags in (RECORD_BSPARSE, RECORD_ZLIB):
+            rst = self.writeFile(flags=flags)
+            with self.assertRaises(ValueError):
+                rst.nodal_solution(1)
+            with self.assertRaises(ValueError):
+                rst.element_solution(1)
+            del rst
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
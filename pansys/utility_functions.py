@@ -1,3 +1,13 @@
+import io
+import mmap
+import os
+import re
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+
 def return_value(instring):
     """Function to convert a string to corresponding number format"""
     from ast import literal_eval
@@ -38,3 +48,453 @@ def calculate_skip_rows(f, count_of_unique):
         for i in reversed(range(count_of_unique)):
             if len(set(line_stats[-i:])) == 1:
                 return len(line_stats) - i
+
+
+# A line of a listing which starts with something other than a number
+_TEXT_LINE = re.compile(rb"\n[ \t]*[^-+.\d\s][^\n]*")
+_INTEGER = re.compile(r"[-+]?\d+$")
+_TOUCHING = re.compile(rb"(\d)-")
+_NON_BLANK = re.compile(rb"\S")
+
+
+def _is_number(token):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+class ListParser(object):
+    """One pass parser for the column output of ansys list commands
+
+    The output of commands like ``NLIST``, ``ELIST`` or ``PRNSOL`` consists of
+    a few lines of text, a line with the column names and the rows of
+    numbers. Titles and column names may be repeated in the middle of the
+    table at every page break. The parser looks at the lines of text only;
+    the rows of numbers between them are parsed in bulk by numpy.
+
+    The last line of text before the first block of numbers is taken as the
+    column names. Blocks of numbers which come after the same column names
+    again are appended to the table. If a different set of column names is
+    found after the table has started, the rest of the output is ignored.
+
+    Data can be fed in pieces with :meth:`feed`, each piece returning the
+    rows which are complete.
+
+        >>> parser = ListParser()
+        >>> blocks = parser.feed(data) + parser.close()
+        >>> df = parser.frame(blocks)
+
+    """
+    def __init__(self):
+        self.columns = None
+        # Names of the columns, once known
+        self.integer = None
+        # Which of the columns may be integers, found from the first row
+        self.finished = False
+        # True if a second table was found
+        self._header = None
+        self._pending = b""
+
+    def feed(self, data):
+        """Parses a piece of the output
+
+        Args:
+            data (bytes): Output of the list command. Can be any bytes like
+                object, eg. a :class:`mmap.mmap`.
+
+        Returns:
+            list: 2D :class:`numpy.ndarray` blocks of the rows found.
+        """
+        if self._pending:
+            data = self._pending + bytes(data)
+        # Only complete lines are parsed, the rest is kept for later
+        end = data.rfind(b"\n") + 1
+        self._pending = bytes(data[end:])
+        return self._parse(data, end)
+
+    def close(self):
+        """Parses any incomplete line left over at the end of the output
+
+        Returns:
+            list: 2D :class:`numpy.ndarray` blocks of the rows found.
+        """
+        data = self._pending + b"\n"
+        self._pending = b""
+        return self._parse(data, len(data))
+
+    def _parse(self, data, end):
+        blocks = []
+        start = 0
+        first = data.find(b"\n", 0, end)
+        if first >= 0 and _TEXT_LINE.match(b"\n" + bytes(data[:first])):
+            self._text(data[:first])
+            start = first
+        for match in _TEXT_LINE.finditer(data, start, end):
+            if self.finished:
+                return blocks
+            self._block(data, start, match.start(), blocks)
+            self._text(match.group())
+            start = match.end()
+        if not self.finished:
+            self._block(data, start, end, blocks)
+        return blocks
+
+    def _text(self, line):
+        tokens = line.decode("ascii", "replace").split()
+        if tokens and not any(_is_number(x) for x in tokens):
+            self._header = tokens
+
+    def _block(self, data, start, end, blocks):
+        segment = data[start:end]
+        first = _NON_BLANK.search(segment)
+        if first is None:
+            return
+        if self._header is not None:
+            if self.columns is None:
+                self.columns = self._header
+            elif self._header != self.columns:
+                self.finished = True
+                return
+            self._header = None
+        if self.integer is None:
+            row_end = segment.find(b"\n", first.start())
+            row = segment[first.start():row_end if row_end >= 0 else None]
+            self.integer = [bool(_INTEGER.match(x))
+                            for x in row.decode("ascii").split()]
+        blocks.append(_parse_numbers(segment))
+
+    def frame(self, blocks, start=0):
+        """Makes a :class:`pandas.DataFrame` out of the parsed blocks
+
+        Args:
+            blocks (list): Blocks returned by :meth:`feed` and :meth:`close`
+            start (int): The index of the first row
+
+        Returns:
+            pandas.DataFrame: The table with integer columns as integers.
+        """
+        if not blocks:
+            return pd.DataFrame(columns=self.columns)
+        ncols = max(x.shape[1] for x in blocks)
+        array = np.vstack([_pad(x, ncols) for x in blocks])
+        data = {}
+        for i, name in enumerate(_column_names(self.columns, ncols)):
+            column = array[:, i]
+            # Only whole numbers, a later row may have a fraction
+            if i < len(self.integer) and self.integer[i] and \
+                    not np.isnan(column).any() and \
+                    np.array_equal(column, np.round(column)):
+                column = column.astype(np.int64)
+            data[name] = column
+        index = pd.RangeIndex(start, start + len(array))
+        return pd.DataFrame(data, index=index)
+
+
+def _parse_numbers(segment):
+    """Parses a block of rows with numbers in to a 2D array"""
+    try:
+        return np.loadtxt(io.BytesIO(segment), ndmin=2)
+    except ValueError:
+        pass
+    # Negative numbers in fixed width columns may touch the previous number
+    try:
+        return np.loadtxt(io.BytesIO(_TOUCHING.sub(rb"\1 -", segment)),
+                          ndmin=2)
+    except ValueError:
+        pass
+    # Rows with different number of columns or values which are not numbers
+    rows = []
+    for line in segment.splitlines():
+        values = []
+        for token in line.split():
+            try:
+                values.append(float(token))
+            except ValueError:
+                values.append(np.nan)
+        if values:
+            rows.append(values)
+    ncols = max(len(x) for x in rows)
+    return np.array([x + [np.nan] * (ncols - len(x)) for x in rows])
+
+
+def _pad(array, ncols):
+    if array.shape[1] == ncols:
+        return array
+    padding = np.full((array.shape[0], ncols - array.shape[1]), np.nan)
+    return np.hstack([array, padding])
+
+
+def _column_names(columns, ncols):
+    """Names for ``ncols`` columns from the column names in the header"""
+    if not columns:
+        return list(range(ncols))
+    names = list(columns[:ncols])
+    # Extra columns, eg. the node numbers of ELIST, get numbered names
+    for i in range(len(names), ncols):
+        names.append("{}_{}".format(columns[-1], i - len(columns) + 2))
+    return names
+
+
+def read_list(f):
+    """Function to read the output of an ansys list command
+
+    Reads a column based output file in to a :class:`pandas.DataFrame` in a
+    single pass using :class:`ListParser`. The file is memory mapped, so that
+    large files are not read in to memory as a whole.
+
+    Args:
+        f (str): The file with the output of the list command
+
+    Returns:
+        pandas.DataFrame: The table in the file.
+    """
+    parser = ListParser()
+    with open(f, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return parser.frame([])
+        with closing(mmap.mmap(fh.fileno(), 0,
+                               access=mmap.ACCESS_READ)) as mm:
+            blocks = parser.feed(mm)
+            blocks += parser.close()
+    return parser.frame(blocks)
+
+
+def read_list_stream(fh, blocksize=65536):
+    """Function to read the output of an ansys list command from a stream
+
+    Same as :func:`read_list`, for a file object which can only be read
+    from the start to the end, like a named pipe. The table is parsed while
+    the data arrives. The stream is always read to the end, so that the
+    writer is never blocked.
+
+    Args:
+        fh (file): Binary file object with the output of the list command
+        blocksize (int): Number of bytes read at a time
+
+    Returns:
+        pandas.DataFrame: The table in the stream.
+    """
+    parser = ListParser()
+    blocks = []
+    while True:
+        data = fh.read(blocksize)
+        if not data:
+            break
+        if not parser.finished:
+            blocks += parser.feed(data)
+    blocks += parser.close()
+    return parser.frame(blocks)
+
+
+# Known list commands, by the first four letters as ansys abbreviates them,
+# with the columns which need double precision.
+LIST_DTYPES = {
+    "nlis": ("X", "Y", "Z"),
+    "elis": (),
+    "prns": (),
+    "pres": (),
+}
+
+
+def compact_dtypes(df, keep=(), skip=()):
+    """Function to reduce the memory used by a table
+
+    Integer columns are converted to ``int32`` if the values fit, float
+    columns to ``float32`` and text columns to ``category``. The conversion
+    is done in place.
+
+    Args:
+        df (pandas.DataFrame): The table to be converted
+        keep (list): Float columns which should be kept in double precision
+        skip (list): Columns which are not converted at all
+
+    Returns:
+        pandas.DataFrame: The same table with compact column types.
+    """
+    info = np.iinfo(np.int32)
+    for name in df.columns:
+        if name in skip:
+            continue
+        column = df[name]
+        kind = column.dtype.kind
+        if kind == "i":
+            if len(column) == 0 or (column.min() >= info.min and
+                                    column.max() <= info.max):
+                df[name] = column.astype(np.int32)
+        elif kind == "f" and name not in keep:
+            df[name] = column.astype(np.float32)
+        elif kind in "OSU" or str(column.dtype) == "str":
+            df[name] = column.astype("category")
+    return df
+
+
+_PARAMETER_NAME = re.compile(r"[A-Za-z]\w{0,31}$")
+_PARAMETER_SET = re.compile(r"\s*\*SET\s*,\s*(\w+)\s*(?:\(([^)]*)\))?\s*,(.*)$",
+                            re.IGNORECASE)
+_PARAMETER_DIM = re.compile(r"\s*\*DIM\s*,\s*(\w+)\s*,\s*(\w*)\s*,(.*)$",
+                            re.IGNORECASE)
+_PARAMETER_VALUE = re.compile(r"\s*('[^']*'|[^,]*)\s*(?:,|$)")
+
+
+def _parameter_value(token):
+    """Converts a value of a ``*SET`` command to a string or float"""
+    token = token.strip()
+    if token.startswith("'"):
+        return token[1:-1].rstrip()
+    return float(token.replace("D", "E").replace("d", "e"))
+
+
+def read_parameters(f):
+    """Function to read a file of parameters written by ansys ``PARSAV``
+
+    The file has a ``*SET`` command for every scalar parameter and array
+    element, and a ``*DIM`` command before the elements of an array. It is
+    read in a single pass. Arrays are returned as :class:`numpy.ndarray`,
+    with the dimensions of size 1 at the end left out, so that a vector is
+    1D. ``CHAR`` arrays are arrays of strings. ``TABLE`` arrays keep the
+    row and column 0, which hold the index values.
+
+    Args:
+        f (str): The file written by ``PARSAV``
+
+    Returns:
+        dict: The value of each parameter, by its name in lower case.
+    """
+    params = {}
+    offsets = {}
+    with open(f, "r") as fh:
+        for line in fh:
+            match = _PARAMETER_DIM.match(line)
+            if match:
+                name, kind = match.group(1).lower(), match.group(2).upper()
+                shape = [int(float(x)) if x.strip() else 1
+                         for x in (match.group(3).split(",") + ["", ""])[:3]]
+                if kind == "TABLE":
+                    shape = [x + 1 for x in shape]
+                while len(shape) > 1 and shape[-1] == 1:
+                    shape.pop()
+                if kind in ("CHAR", "STRING"):
+                    params[name] = np.full(shape, "", dtype=object)
+                else:
+                    params[name] = np.zeros(shape)
+                offsets[name] = 0 if kind == "TABLE" else 1
+                continue
+            match = _PARAMETER_SET.match(line)
+            if not match:
+                continue
+            name = match.group(1).lower()
+            values = [_parameter_value(x) for x in
+                      _PARAMETER_VALUE.findall(match.group(3)) if x]
+            if match.group(2) is None:
+                params[name] = values[0]
+                continue
+            array = params[name]
+            index = [int(float(x)) - offsets[name]
+                     for x in match.group(2).split(",")]
+            index = (index + [0, 0])[:array.ndim]
+            # Several values fill the elements down the first dimension
+            for value in values:
+                array[tuple(index)] = value
+                index[0] += 1
+    return params
+
+
+def write_parameters(f, params):
+    """Function to write parameters as ansys commands
+
+    Writes a ``*SET`` command for every scalar parameter. Arrays of up to
+    3 dimensions are defined with ``*DIM`` and filled with ``*SET``
+    commands of up to 10 values each. Arrays of strings are written as
+    ``CHAR`` arrays. The output is the same as that of ansys ``PARSAV``,
+    and can be read back with :func:`read_parameters`.
+
+    Args:
+        f (file): The file object to write to
+        params (dict): The values by parameter name. Values can be numbers,
+            strings or array like.
+
+    Returns:
+        None
+
+    """
+    f.write("/NOPR\n")
+    for name, value in params.items():
+        if not _PARAMETER_NAME.match(name):
+            raise ValueError("{} is not a valid parameter name".format(name))
+        if isinstance(value, str):
+            f.write("*SET,{},'{}'\n".format(name, value))
+            continue
+        array = np.asarray(value)
+        if array.ndim == 0:
+            f.write("*SET,{},{!r}\n".format(name, float(array)))
+            continue
+        if array.ndim > 3 or array.size == 0:
+            raise ValueError("Parameter {} should have 1 to 3 dimensions"
+                             .format(name))
+        char = array.dtype.kind in "OSU"
+        shape = list(array.shape) + [1] * (3 - array.ndim)
+        array = array.reshape(shape)
+        f.write("*DEL,{},,NOPR\n".format(name))
+        f.write("*DIM,{},{},{},{},{}\n".format(
+            name, "CHAR" if char else "ARRAY", *shape))
+        for k in range(shape[2]):
+            for j in range(shape[1]):
+                for i in range(0, shape[0], 10):
+                    column = array[i:i + 10, j, k]
+                    values = ["'{}'".format(x) for x in column] if char \
+                        else [repr(float(x)) for x in column]
+                    f.write("*SET,{}({},{},{}),{}\n".format(
+                        name, i + 1, j + 1, k + 1, ",".join(values)))
+    f.write("/GO\n")
+
+
+def iter_list(f, chunksize, blocksize=4194304):
+    """Function to read the output of an ansys list command in chunks
+
+    Same as :func:`read_list`, but the file is read progressively and the
+    table is returned in pieces of at most ``chunksize`` rows. Only one piece
+    of the table is kept in memory at a time.
+
+    Args:
+        f (str): The file with the output of the list command
+        chunksize (int): Maximum number of rows in each piece
+        blocksize (int): Number of bytes read from the file at a time
+
+    Yields:
+        pandas.DataFrame: The next ``chunksize`` rows of the table. The
+            index continues from the previous piece.
+    """
+    parser = ListParser()
+    blocks = []
+    nrows = 0
+    start = 0
+    with open(f, "rb") as fh:
+        while not parser.finished:
+            data = fh.read(blocksize)
+            new = parser.feed(data) if data else parser.close()
+            blocks += new
+            nrows += sum(len(x) for x in new)
+            while nrows >= chunksize:
+                chunk, blocks = _split_blocks(blocks, chunksize)
+                yield parser.frame(chunk, start)
+                start += chunksize
+                nrows -= chunksize
+            if not data:
+                break
+    if nrows:
+        yield parser.frame(blocks, start)
+
+
+def _split_blocks(blocks, nrows):
+    """Splits a list of blocks after the first ``nrows`` rows"""
+    head = []
+    for i, block in enumerate(blocks):
+        if len(block) >= nrows:
+            head.append(block[:nrows])
+            rest = [block[nrows:]] if len(block) > nrows else []
+            return head, rest + blocks[i + 1:]
+        head.append(block)
+        nrows -= len(block)
+    return head, []
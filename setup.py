@@ -21,6 +21,9 @@ setuptools.setup(
         "Topic :: Scientific/Engineering",
     ),
     install_requires=[
-        "pexpect" ,"pandas"
-    ]
+        "pexpect" ,"pandas", "numpy"
+    ],
+    entry_points={
+        "console_scripts": ["pansys=pansys.__main__:main"],
+    },
 )
\ No newline at end of file